@@ -0,0 +1,261 @@
+import gc
+import time
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pygame
+
+from mario_game import Game, ParticleSystem, SCREEN_WIDTH, SCREEN_HEIGHT
+
+# 合成压力场景: 通过真实的 Game.update / Game.draw 运行固定帧数, 报告帧耗时分位数、关卡加载耗时和内存峰值,
+# 并与保存的基线比较, 超过阈值视为性能回退。
+#
+#   python benchmark.py                                 # 运行全部场景, 结果写入 benchmark_results.json
+#   python benchmark.py --save-baseline baseline.json   # 保存基线
+#   python benchmark.py --baseline baseline.json        # 与基线比较, 回退时返回码为 1
+
+SCENARIOS = {
+    'baseline': {'enemies': 10, 'coins': 30, 'particles': 0, 'platforms': 10, 'screens': 3},
+    'enemies': {'enemies': 400, 'coins': 30, 'particles': 0, 'platforms': 20, 'screens': 4},
+    'coins': {'enemies': 10, 'coins': 2000, 'particles': 0, 'platforms': 20, 'screens': 4},
+    'particles': {'enemies': 10, 'coins': 30, 'particles': 4000, 'platforms': 10, 'screens': 3},
+    'platforms': {'enemies': 10, 'coins': 30, 'particles': 0, 'platforms': 1500, 'screens': 4},
+    'horde': {'enemies': 4000, 'coins': 30, 'particles': 0, 'platforms': 60, 'screens': 6},
+    'wide': {'enemies': 300, 'coins': 1500, 'particles': 500, 'platforms': 600, 'screens': 60},
+}
+
+# 与基线比较的指标 (都是越小越好) 和判定回退所需的最小绝对变化, 避免亚毫秒级的抖动被当成回退
+METRICS = {'frame_p50_ms': 0.1, 'frame_p95_ms': 0.25, 'frame_p99_ms': 0.5, 'load_ms': 0.5, 'clone_ms': 0.25, 'peak_kb': 64}
+PARTICLE_COLORS = [(255, 200, 200), (200, 200, 255), (255, 255, 200)]
+GROUND_Y = SCREEN_HEIGHT - 50
+
+def build_level(enemies, coins, platforms, screens, seed=0, **_):
+    rng = random.Random(seed)
+    width = SCREEN_WIDTH * screens
+    data = {
+        'name': f'压力测试 {enemies}敌人/{coins}金币/{platforms}平台/{screens}屏',
+        'width': width,
+        'player': [50, GROUND_Y - 100],
+        'platforms': [[x, GROUND_Y, SCREEN_WIDTH, 50, 'ground'] for x in range(0, width, SCREEN_WIDTH)],
+        'coins': [],
+        'keys': [[width // 2, GROUND_Y - 120]],
+        'enemies': [],
+        'powerups': [],
+        'flags': [[width - 100, GROUND_Y - 150]],
+    }
+    for _ in range(platforms):
+        ptype = rng.choice(['brick', 'brick', 'brick', 'mystery'])
+        w, h = (40, 40) if ptype == 'mystery' else (rng.randrange(60, 160, 20), 20)
+        data['platforms'].append([rng.randrange(150, width - 200), rng.randrange(200, GROUND_Y - 80, 10), w, h, ptype])
+    for _ in range(coins):
+        data['coins'].append([rng.randrange(100, width - 100), rng.randrange(150, GROUND_Y - 40)])
+    for _ in range(enemies):
+        data['enemies'].append([rng.randrange(300, width - 100), GROUND_Y - 50, rng.choice(['goomba', 'koopa'])])
+    return data
+
+def script_input(game, frame):
+    # 一直向右跑, 周期性起跳, 让摄像机扫过整个关卡
+    keys = game.input.keys
+    keys[pygame.K_RIGHT] = True
+    keys[pygame.K_UP] = frame % 45 < 12
+
+def simulate(game, frames, particles, render_every, frame_times=None):
+    restarts = 0
+    max_sprites = 0
+    for frame in range(frames):
+        start = time.perf_counter()
+        script_input(game, frame)
+        if particles and len(game.particles) < particles:
+            # 粒子寿命有限, 每帧补足到目标数量
+            game.particles.emit(game.player.rect.centerx, game.player.rect.centery, PARTICLE_COLORS,
+                                particles - len(game.particles), spread_x=SCREEN_WIDTH // 2, spread_y=200)
+        game.update()
+        if game.game_state == 'game_over':
+            restarts += 1
+            game.start_run(1)
+        if render_every and frame % render_every == 0:
+            game.draw()
+        if frame_times is not None:
+            frame_times.append((time.perf_counter() - start) * 1000)
+        max_sprites = max(max_sprites, len(game.all_sprites))
+    return restarts, max_sprites
+
+class GcMonitor:
+    # 通过 gc.callbacks 统计计时期间的垃圾回收次数和最长停顿
+    def __init__(self):
+        self.collections = 0
+        self.pauses = []
+        self.start = 0.0
+    
+    def __enter__(self):
+        gc.callbacks.append(self.callback)
+        return self
+    
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self.callback)
+    
+    def callback(self, phase, info):
+        if phase == 'start':
+            self.start = time.perf_counter()
+        else:
+            self.collections += 1
+            self.pauses.append((time.perf_counter() - self.start) * 1000)
+
+def run_scenario(params, frames, render_every=1, dirty_rects=False, memory_frames=200, seed=1):
+    with tempfile.TemporaryDirectory() as level_dir:
+        with open(os.path.join(level_dir, 'level_1.json'), 'w', encoding='utf-8') as f:
+            json.dump(build_level(seed=seed, **params), f)
+
+        game = Game(headless=True, dirty_rects=dirty_rects, level_dir=level_dir, seed=seed)
+        game.particles = ParticleSystem(capacity=max(8192, params['particles']), seed=seed)
+        # 冷加载 (解析、校验、建立模板) 和从模板缓存复制分开计时; 冷加载前清掉缓存, 否则只测到了复制
+        loads = []
+        clones = []
+        for _ in range(3):
+            game.level_templates.clear()
+            game.start_run(1)
+            loads.append(game.level_load_ms)
+            game.start_run(1)
+            clones.append(game.level_load_ms)
+
+        frame_times = []
+        with GcMonitor() as gc_monitor:
+            restarts, max_sprites = simulate(game, frames, params['particles'], render_every, frame_times)
+        pools = {kind: pool.stats() for kind, pool in game.pools.items()}
+
+        # 内存峰值单独跑一遍: tracemalloc 会明显拖慢计时
+        tracemalloc.start()
+        game.start_run(1)
+        simulate(game, memory_frames, params['particles'], render_every)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    times = np.array(frame_times)
+    p50, p90, p95, p99 = np.percentile(times, [50, 90, 95, 99])
+    return {
+        'params': params,
+        'frames': frames,
+        'frame_mean_ms': float(times.mean()),
+        'frame_p50_ms': float(p50),
+        'frame_p90_ms': float(p90),
+        'frame_p95_ms': float(p95),
+        'frame_p99_ms': float(p99),
+        'frame_max_ms': float(times.max()),
+        'load_ms': float(min(loads)),
+        'clone_ms': float(min(clones)),
+        'peak_kb': peak / 1024,
+        'max_live_sprites': max_sprites,
+        'restarts': restarts,
+        'gc_collections': gc_monitor.collections,
+        'gc_max_ms': max(gc_monitor.pauses, default=0.0),
+        'pools': pools,
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        if old.get('params') != result['params']:
+            print(f"[跳过] {name}: 场景参数与基线不同")
+            continue
+        for metric, min_delta in METRICS.items():
+            before, after = old.get(metric), result[metric]
+            if not before:
+                continue
+            change = after / before - 1
+            significant = abs(after - before) >= min_delta
+            if significant and change > threshold:
+                flag = '回退'
+                regressions.append((name, metric, change))
+            elif significant and change < -threshold:
+                flag = '提升'
+            else:
+                flag = '持平'
+            print(f"  {name:<10} {metric:<14} {before:10.3f} -> {after:10.3f}  {change:+7.1%}  {flag}")
+    return regressions
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        if key not in SCENARIOS['baseline'] or not value.isdigit():
+            raise ValueError(f'无法解析 {pair!r}, 应为 {"/".join(SCENARIOS["baseline"])}=整数')
+        overrides[key] = int(value)
+    return overrides
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Super Kitten Adventure 压力测试')
+    parser.add_argument('scenarios', nargs='*', help=f'要运行的场景 (默认全部): {", ".join(SCENARIOS)}')
+    parser.add_argument('--frames', type=int, default=600, help='每个场景的计时帧数')
+    parser.add_argument('--memory-frames', type=int, default=200, help='统计内存峰值时运行的帧数')
+    parser.add_argument('--render-every', type=int, default=1, help='每 N 帧渲染一次 (0 表示不渲染)')
+    parser.add_argument('--dirty-rects', action='store_true', help='使用脏矩形渲染')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=N',
+                        help='覆盖场景参数, 例如 --set enemies=1000 --set screens=20')
+    parser.add_argument('--seed', type=int, default=1, help='生成场景和游戏随机数的种子')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果文件 (JSON)')
+    parser.add_argument('--baseline', help='与此基线文件比较')
+    parser.add_argument('--save-baseline', help='把本次结果另存为基线')
+    parser.add_argument('--threshold', type=float, default=0.15, help='回退阈值 (相对变化, 默认 0.15 即 15%%)')
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'未知场景: {", ".join(unknown)}')
+    try:
+        overrides = parse_overrides(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'render_every': args.render_every,
+        'dirty_rects': args.dirty_rects,
+        'scenarios': {},
+    }
+    for name in names:
+        params = dict(SCENARIOS[name], **overrides)
+        result = run_scenario(params, args.frames, args.render_every, args.dirty_rects,
+                              args.memory_frames, args.seed)
+        results['scenarios'][name] = result
+        print(f"{name:<10} p50 {result['frame_p50_ms']:6.2f} ms  p95 {result['frame_p95_ms']:6.2f} ms  "
+              f"p99 {result['frame_p99_ms']:6.2f} ms  加载 {result['load_ms']:6.2f} ms (缓存 {result['clone_ms']:5.2f} ms)  "
+              f"内存峰值 {result['peak_kb']:8.0f} KB  最多精灵 {result['max_live_sprites']}  "
+              f"GC {result['gc_collections']} 次 (最长 {result['gc_max_ms']:.2f} ms)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"基线已保存: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"与基线比较 ({args.baseline}, 阈值 {args.threshold:.0%}):")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回退")
+            pygame.quit()
+            sys.exit(1)
+        print("没有发现性能回退")
+    pygame.quit()
+
+if __name__ == '__main__':
+    main()
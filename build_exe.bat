@@ -12,6 +12,7 @@ pyinstaller --name="超级马里奥游戏" ^
     --windowed ^
     --icon=NONE ^
     --add-data "README.md;." ^
+    --add-data "levels;levels" ^
     mario_game.py
 
 echo.
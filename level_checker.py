@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+from mario_game import (Player, Platform, Key, Flag, SpatialGroup, ParticleSystem, LEVEL_DIR,
+                        GROUND_COLOR, BRICK_COLOR, list_level_files, load_level_file)
+
+# 关卡可通关性检查: 用真实的 Player 物理 (跳跃 -15, 重力 0.8, 速度 5) 对逐帧按键做广度优先搜索,
+# 证明能拿到所有钥匙、之后能到达旗帜, 并给出最短的按键序列。
+#
+# - 状态 (位置, 竖直速度, 是否着地, 已拿到的钥匙) 去重, 每个状态只展开一次
+# - 只考虑静态地形: 敌人、道具和金币不参与搜索
+# - 钥匙会上下浮动 ±6 像素, 检查时用上下各收缩 6 像素的矩形, 无论浮动到哪里都能碰到
+# - 多个关卡分配到多个进程并行检查
+#
+#   python level_checker.py                 # 检查 levels/ 下的所有关卡
+#   python level_checker.py pack/ --json out.json --workers 8
+
+ACTIONS = (
+    ('.', ()),
+    ('L', (pygame.K_LEFT,)),
+    ('R', (pygame.K_RIGHT,)),
+    ('J', (pygame.K_UP,)),
+    ('LJ', (pygame.K_LEFT, pygame.K_UP)),
+    ('RJ', (pygame.K_RIGHT, pygame.K_UP)),
+)
+KEY_FLOAT = 6
+
+class NoInput(dict):
+    def __missing__(self, key):
+        return False
+
+def action_keys():
+    keys = []
+    for _, pressed in ACTIONS:
+        state = NoInput()
+        for key in pressed:
+            state[key] = True
+        keys.append(state)
+    return keys
+
+def build_world(level):
+    # 问号砖块的贴图会用到字体
+    pygame.font.init()
+    platforms = SpatialGroup(moving=False)
+    for x, y, w, h, ptype in level['platforms']:
+        platforms.add(Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype))
+    key_rects = [Key(x, y).rect.inflate(0, -2 * KEY_FLOAT) for x, y in level['keys']]
+    flag_rects = [Flag(x, y).rect for x, y in level['flags']]
+    return platforms, key_rects, flag_rects
+
+def search(level, max_frames=3600, max_states=2000000):
+    platforms, key_rects, flag_rects = build_world(level)
+    all_keys = (1 << len(key_rects)) - 1
+    empty = SpatialGroup()
+    particles = ParticleSystem(capacity=0)
+    inputs = action_keys()
+
+    player = Player(*level['player'])
+    player.world_width = level['width']
+    start = (player.rect.x, player.rect.y, 0.0, False, 0)
+    parents = {start: None}
+    frontier = deque([(start, 0)])
+    key_frames = None
+    expanded = 0
+
+    while frontier:
+        state, frame = frontier.popleft()
+        if frame >= max_frames or len(parents) >= max_states:
+            break
+        expanded += 1
+        x, y, vel_y, on_ground, collected = state
+        for action, keys in enumerate(inputs):
+            player.rect.topleft = (x, y)
+            player.vel_y = vel_y
+            player.on_ground = on_ground
+            player.lives = 3
+            player.update(platforms, empty, empty, empty, particles, keys)
+            if player.lives < 3:
+                # 掉出屏幕
+                continue
+            rect = player.rect
+            got = collected
+            for index, key_rect in enumerate(key_rects):
+                if rect.colliderect(key_rect):
+                    got |= 1 << index
+            child = (rect.x, rect.y, player.vel_y, player.on_ground, got)
+            if child in parents:
+                continue
+            parents[child] = (state, action)
+            if got == all_keys and key_frames is None and all_keys:
+                key_frames = frame + 1
+            if got == all_keys and rect.collidelist(flag_rects) != -1:
+                return {
+                    'solved': True,
+                    'key_frames': key_frames if all_keys else 0,
+                    'flag_frames': frame + 1,
+                    'states': len(parents),
+                    'expanded': expanded,
+                    'inputs': trace(parents, child),
+                }
+            frontier.append((child, frame + 1))
+
+    return {
+        'solved': False,
+        'key_frames': key_frames,
+        'flag_frames': None,
+        'states': len(parents),
+        'expanded': expanded,
+        'exhausted': not frontier,
+        'inputs': None,
+    }
+
+def trace(parents, state):
+    actions = []
+    while parents[state] is not None:
+        state, action = parents[state]
+        actions.append(action)
+    actions.reverse()
+    return actions
+
+def encode_inputs(actions):
+    # 游程编码, 例如 "R*12 RJ*3 .*2"
+    runs = []
+    for action in actions:
+        if runs and runs[-1][0] == action:
+            runs[-1][1] += 1
+        else:
+            runs.append([action, 1])
+    return ' '.join(f'{ACTIONS[action][0]}*{count}' for action, count in runs)
+
+def check_file(path, max_frames, max_states):
+    start = time.perf_counter()
+    try:
+        level = load_level_file(path)
+    except ValueError as e:
+        return {'file': path, 'solved': False, 'error': str(e)}
+    result = search(level, max_frames, max_states)
+    result['file'] = path
+    result['name'] = level['name']
+    result['seconds'] = time.perf_counter() - start
+    if result['inputs'] is not None:
+        result['inputs'] = encode_inputs(result['inputs'])
+    return result
+
+def report(result):
+    name = os.path.basename(result['file'])
+    if 'error' in result:
+        print(f"[错误] {result['error']}")
+    elif result['solved']:
+        print(f"[可通关] {name} {result['name']}: 钥匙 {result['key_frames']} 帧, 旗帜 {result['flag_frames']} 帧 "
+              f"({result['flag_frames'] / 60:.1f} 秒)  状态 {result['states']}  耗时 {result['seconds']:.1f} 秒")
+        print(f"         按键: {result['inputs']}")
+    else:
+        if result['exhausted']:
+            reason = '所有可达状态已搜索完'
+        else:
+            reason = '达到搜索上限, 未能证明'
+        stage = '拿到钥匙后无法到达旗帜' if result['key_frames'] is not None else '无法拿到钥匙'
+        print(f"[不可通关] {name} {result['name']}: {stage} ({reason}, 状态 {result['states']})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Super Kitten Adventure 关卡可通关性检查')
+    parser.add_argument('paths', nargs='*', default=[LEVEL_DIR], help='关卡文件或目录 (默认 levels/)')
+    parser.add_argument('--workers', type=int, default=0, help='进程数 (默认 CPU 核数)')
+    parser.add_argument('--max-frames', type=int, default=3600, help='最长搜索帧数 (60 帧 = 1 秒)')
+    parser.add_argument('--max-states', type=int, default=2000000, help='每个关卡最多记录的状态数')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        files.extend(list_level_files(path) if os.path.isdir(path) else [path])
+    if not files:
+        parser.error('没有找到关卡文件')
+
+    workers = min(len(files), args.workers or mp.cpu_count())
+    if workers > 1:
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn')) as pool:
+            results = list(pool.map(check_file, files, [args.max_frames] * len(files), [args.max_states] * len(files)))
+    else:
+        results = [check_file(path, args.max_frames, args.max_states) for path in files]
+
+    for result in results:
+        report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    failed = sum(not result['solved'] for result in results)
+    print(f"共 {len(results)} 个关卡, 可通关 {len(results) - failed} 个")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
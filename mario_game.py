@@ -1,13 +1,34 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 import pygame
+import numpy as np
 import sys
+import os
+import re
+import json
 import random
 import math
-
-pygame.init()
+import argparse
+import csv
+import cProfile
+import pstats
+import struct
+import zlib
+import threading
+from collections import defaultdict, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
+# 固定步长模拟: 每步 1/60 秒, 与渲染帧率无关; 一帧最多追 5 步, 超过的积压时间直接丢弃
+SIM_STEP = 1 / FPS
+MAX_SIM_STEPS = 5
+# 两步之间位移超过这个距离视为瞬移 (重生/击退/换关), 不做插值
+TELEPORT_DISTANCE = 100
+# 双人合作时 2P 的毛色 (两只小猫出生在同一位置, 彼此不碰撞)
+PARTNER_COLOR = (255, 190, 120)
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -22,43 +43,561 @@ PURPLE = (147, 112, 219)
 PINK = (255, 192, 203)
 ORANGE = (255, 165, 0)
 
-class Particle(pygame.sprite.Sprite):
-    def __init__(self, x, y, color, vel_x=None, vel_y=None):
-        super().__init__()
-        self.size = random.randint(3, 8)
-        self.image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, color, (self.size//2, self.size//2), self.size//2)
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
-        self.vel_x = vel_x if vel_x is not None else random.uniform(-3, 3)
-        self.vel_y = vel_y if vel_y is not None else random.uniform(-5, -2)
-        self.life = random.randint(30, 60)
-        self.gravity = 0.3
-        
-    def update(self):
-        self.vel_y += self.gravity
-        self.rect.x += self.vel_x
-        self.rect.y += self.vel_y
-        self.life -= 1
-        
-        alpha = int(255 * (self.life / 60))
-        self.image.set_alpha(max(0, alpha))
+# 背景渐变 (顶部颜色, 底部颜色)
+SKY_GRADIENT = ((135, 206, 235), (200, 220, 255))
+START_GRADIENT = ((20, 20, 50), (135, 206, 235))
+
+PLATFORM_TYPES = ('ground', 'brick', 'mystery')
+# 每种敌人共享的尺寸 (宽, 高)
+ENEMY_TYPES = {'goomba': (35, 35), 'koopa': (40, 40)}
+POWERUP_TYPES = ('life', 'star')
+
+def resource_path(*parts):
+    # 打包后的资源位于 PyInstaller 的临时目录中
+    base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, *parts)
+
+LEVEL_DIR = resource_path('levels')
+
+# 中文字体候选, 按顺序尝试; 都不存在时交给 pygame 在系统字体中查找一次
+FONT_CANDIDATES = [
+    ('微软雅黑', 'C:/Windows/Fonts/msyh.ttc'),
+    ('黑体', 'C:/Windows/Fonts/simhei.ttf'),
+    ('宋体', 'C:/Windows/Fonts/simsun.ttc'),
+]
+SYSTEM_FONT_NAMES = 'simhei,microsoftyahei,simsun,microsoft yahei'
+
+def cache_dir():
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'super_kitten')
+
+FONT_CACHE_FILE = os.path.join(cache_dir(), 'font_cache.json')
+
+def resolve_font_path(cache_file=FONT_CACHE_FILE):
+    # 返回 (字体路径或 None, 是否命中磁盘缓存); None 表示使用 pygame 默认字体
+    cached = ''
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            cached = json.load(f).get('font_path', '')
+        if cached and os.path.exists(cached):
+            return cached, True
+    except (OSError, ValueError, AttributeError):
+        pass
+    
+    path = None
+    for _, candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            path = candidate
+            break
+    else:
+        if cached is None:
+            # 上次已确认系统中没有中文字体, 不再扫描系统字体列表
+            return None, True
+        path = pygame.font.match_font(SYSTEM_FONT_NAMES)
+    
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'font_path': path}, f)
+    except OSError:
+        pass
+    return path, False
+
+_fonts = {}
+
+# SDL_ttf 不是线程安全的: 后台预建关卡时也会渲染文字, 所有字体加载和渲染都要持有这把锁
+FONT_LOCK = threading.Lock()
+
+def get_font(path, size):
+    font = _fonts.get((path, size))
+    if font is None:
+        with FONT_LOCK:
+            font = pygame.font.Font(path, size)
+        _fonts[(path, size)] = font
+    return font
+
+CLOUDS = [
+    (100, 80, 60, 30),
+    (300, 100, 80, 40),
+    (550, 70, 70, 35),
+    (650, 120, 65, 32),
+]
+
+class ImageCache:
+    # 共享图像缓存: 同类实体按 (类型, 动画帧, 发光, 朝向...) 复用同一张 Surface, 缓存中的图像不可修改
+    def __init__(self):
+        self.images = {}
+    
+    def get(self, key, builder, *args):
+        image = self.images.get(key)
+        if image is None:
+            image = builder(*args)
+            self.images[key] = image
+        return image
+    
+    def clear(self):
+        self.images.clear()
+
+IMAGE_CACHE = ImageCache()
+
+class TextCache:
+    # 文字渲染缓存 (字体, 字号, 文本, 颜色) -> Surface, 超出容量时淘汰最久未使用的条目
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+    
+    def render(self, font, text, color, size=None):
+        if size == font.get_height():
+            size = None
+        key = (font, size, text, color)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            return surface
+        
+        if size is None:
+            with FONT_LOCK:
+                surface = font.render(text, True, color)
+        else:
+            # 缩放已缓存的原始字形, 而不是按新字号重新加载字体
+            base = self.render(font, text, color)
+            scale = size / font.get_height()
+            surface = pygame.transform.smoothscale(base, (round(base.get_width() * scale), round(base.get_height() * scale)))
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+class SpatialGroup(pygame.sprite.Group):
+    # 均匀网格空间哈希: 精灵按其矩形覆盖的格子登记, 碰撞查询只检查附近格子里的精灵
+    # linear_scan 为 True 时退回逐个遍历整组 (建立空间哈希之前的做法), 只供 check_broadphase 做对照
+    linear_scan = False
+    
+    def __init__(self, *sprites, cell_size=64, moving=True):
+        self.cell_size = cell_size
+        self.moving = moving
+        self.cells = defaultdict(set)
+        self.sprite_cells = {}
+        self.order = {}
+        self.next_order = 0
+        self.version = 0
+        self.rects_version = -1
+        super().__init__(*sprites)
+    
+    def cell_range(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size)
+    
+    def add_internal(self, sprite, *args):
+        super().add_internal(sprite, *args)
+        self.order[sprite] = self.next_order
+        self.next_order += 1
+        self.version += 1
+        self.insert_cells(sprite, self.cell_range(sprite.rect))
+    
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.remove_cells(sprite)
+        del self.order[sprite]
+        self.version += 1
+    
+    def empty(self):
+        # 整组清空时直接丢掉格子索引, 不逐个精灵更新
+        for sprite in self.spritedict:
+            sprite.remove_internal(self)
+        self.spritedict.clear()
+        self.lostsprites = []
+        self.cells.clear()
+        self.sprite_cells.clear()
+        self.order.clear()
+        self.version += 1
+    
+    def insert_cells(self, sprite, cells):
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells[(cx, cy)].add(sprite)
+        self.sprite_cells[sprite] = cells
+    
+    def remove_cells(self, sprite):
+        x0, y0, x1, y1 = self.sprite_cells.pop(sprite)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells[(cx, cy)]
+                bucket.discard(sprite)
+                if not bucket:
+                    del self.cells[(cx, cy)]
+    
+    def reindex(self, sprite):
+        cells = self.cell_range(sprite.rect)
+        if cells != self.sprite_cells[sprite]:
+            self.remove_cells(sprite)
+            self.insert_cells(sprite, cells)
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        if self.moving:
+            for sprite in self.sprites():
+                self.reindex(sprite)
+    
+    def near(self, cells):
+        x0, y0, x1, y1 = cells
+        buckets = self.cells
+        if x0 == x1 and y0 == y1:
+            return buckets.get((x0, y0), ())
+        candidates = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = buckets.get((cx, cy))
+                if bucket:
+                    candidates.update(bucket)
+        return candidates
+    
+    def query(self, rect):
+        candidates = list(self.order) if self.linear_scan else self.near(self.cell_range(rect))
+        hits = [sprite for sprite in candidates if rect.colliderect(sprite.rect)]
+        if len(hits) > 1:
+            hits.sort(key=self.order.__getitem__)
+        return hits
+    
+    def scan(self, rect):
+        # 供会推动 rect 的调用方 (平台推出) 使用: 按加入顺序逐个给出 rect 所在格子里的精灵, 相交检测由调用方用
+        # 当前的 rect 做, 与逐个遍历整组的结果一致。调用方把 rect 推进别的格子后, 按新位置重新收集排在后面的精灵
+        order = self.order
+        if self.linear_scan:
+            yield from list(order)
+            return
+        cells = self.cell_range(rect)
+        pending = sorted(self.near(cells), key=order.__getitem__)
+        index = 0
+        while index < len(pending):
+            sprite = pending[index]
+            index += 1
+            last = order[sprite]
+            yield sprite
+            moved = self.cell_range(rect)
+            if moved != cells:
+                cells = moved
+                pending = sorted((other for other in self.near(cells) if order.get(other, -1) > last),
+                                 key=order.__getitem__)
+                index = 0
+    
+    def collide(self, sprite, dokill=False):
+        hits = self.query(sprite.rect)
+        if dokill:
+            for hit in hits:
+                hit.kill()
+        return hits
+    
+    def rect_array(self):
+        # 按加入顺序排列的 (left, top, right, bottom), 成员不变时复用
+        if self.rects_version != self.version:
+            rects = [sprite.rect for sprite in self.order]
+            self.rects = np.array([(r.left, r.top, r.right, r.bottom) for r in rects if r.width > 0 and r.height > 0],
+                                  np.int64).reshape(-1, 4)
+            self.rects_version = self.version
+        return self.rects
+
+def round_half_away(values):
+    # 与 pygame.Rect 对浮点坐标的取整一致: 四舍五入, .5 远离零
+    whole = np.trunc(values)
+    return (whole + np.where(np.abs(values - whole) >= 0.5, np.sign(values), 0)).astype(np.int64)
+
+def first_contact(platforms, rect, old_x, old_y):
+    # 扫掠检测: rect 已沿一个轴从 (old_x, old_y) 移到终点。一步移动超过自身宽/高时起点和终点之间有空隙,
+    # 空隙里的平台逐个重叠检测看不到, 这时沿移动方向找最先碰到的平台 (距离相同时取先加入的)。
+    # 起点与终点相交时返回 None, 照常做重叠检测, 结果与原来逐帧检测完全一致
+    dx = rect.x - old_x
+    dy = rect.y - old_y
+    if abs(dx) <= rect.width and abs(dy) <= rect.height:
+        return None
+    first = None
+    nearest = None
+    for platform in platforms.query(rect.union(rect.move(-dx, -dy))):
+        target = platform.rect
+        if dx > 0:
+            distance = target.left - (old_x + rect.width)
+        elif dx < 0:
+            distance = old_x - target.right
+        elif dy > 0:
+            distance = target.top - (old_y + rect.height)
+        else:
+            distance = old_y - target.bottom
+        if distance >= 0 and (nearest is None or distance < nearest):
+            first = platform
+            nearest = distance
+    return first
+
+class EnemyGroup(SpatialGroup):
+    # 敌人状态以数组存储 (位置/尺寸/速度/所在格子), 每帧整体批量推进: 重力、移动、平台落地、边界反弹和掉出屏幕一次完成;
+    # Enemy 精灵仍负责绘制和被踩, 其 rect 每帧从数组写回, vel_x/vel_y 直接读写数组
+    # vectorized 为 False 时逐个调用 Enemy.update (批量推进之前的做法), 只供 check_enemy_batch 做对照
+    GRAVITY = 0.8
+    MAX_FALL = 15
+    LANDING_BLOCK = 1 << 18
+    vectorized = True
+    
+    def __init__(self, *sprites, cell_size=64, capacity=64):
+        self.members = []
+        self.pos = np.zeros((capacity, 2), np.int64)
+        self.size = np.zeros((capacity, 2), np.int64)
+        self.vel = np.zeros((capacity, 2), np.float64)
+        self.cell = np.zeros((capacity, 4), np.int64)
+        super().__init__(*sprites, cell_size=cell_size, moving=True)
+    
+    def add_internal(self, sprite, *args):
+        super().add_internal(sprite, *args)
+        slot = len(self.members)
+        if slot == len(self.pos):
+            for name in ('pos', 'size', 'vel', 'cell'):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        vel = (sprite.vel_x, sprite.vel_y)
+        self.members.append(sprite)
+        self.pos[slot] = sprite.rect.topleft
+        self.size[slot] = sprite.rect.size
+        self.vel[slot] = vel
+        self.cell[slot] = self.sprite_cells[sprite]
+        sprite.batch = self
+        sprite.slot = slot
+    
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        slot = sprite.slot
+        sprite.batch = None
+        sprite._vel_x, sprite._vel_y = self.vel[slot].tolist()
+        last = len(self.members) - 1
+        if slot != last:
+            moved = self.members[last]
+            self.members[slot] = moved
+            moved.slot = slot
+            for array in (self.pos, self.size, self.vel, self.cell):
+                array[slot] = array[last]
+        self.members.pop()
+    
+    def empty(self):
+        for slot, sprite in enumerate(self.members):
+            sprite.batch = None
+            sprite._vel_x, sprite._vel_y = self.vel[slot].tolist()
+        self.members = []
+        super().empty()
+    
+    def update(self, platforms, world_width=SCREEN_WIDTH, dt=1):
+        if not self.vectorized:
+            self.update_each(platforms, world_width, dt)
+            return
+        count = len(self.members)
+        if not count:
+            return
+        pos = self.pos[:count]
+        size = self.size[:count]
+        vel = self.vel[:count]
         
-        if self.life <= 0:
-            self.kill()
+        if dt == 1:
+            vel[:, 1] = np.minimum(vel[:, 1] + self.GRAVITY, self.MAX_FALL)
+            fall = vel[:, 1]
+        else:
+            # dt 帧的下落距离按逐帧累加: 每帧先加速 (不超过 MAX_FALL) 再移动, 跳过中间帧的取整
+            speeds = np.minimum(vel[:, 1, None] + self.GRAVITY * np.arange(1, dt + 1), self.MAX_FALL)
+            fall = speeds.sum(axis=1)
+            vel[:, 1] = speeds[:, -1]
+        pos[:, 0] = round_half_away(pos[:, 0] + vel[:, 0] * dt)
+        old_y = pos[:, 1].copy()
+        pos[:, 1] = round_half_away(pos[:, 1] + fall)
+        self.land(platforms.rect_array(), pos, size, vel, old_y)
+        
+        bounce = (pos[:, 0] + size[:, 0] > world_width) | (pos[:, 0] < 0)
+        vel[bounce, 0] *= -1
+        
+        members = self.members
+        for sprite, x, y in zip(members, pos[:, 0].tolist(), pos[:, 1].tolist()):
+            sprite.rect.topleft = (x, y)
+        
+        # 只为跨越格子的敌人更新空间哈希
+        size_cell = self.cell_size
+        cell = np.empty((count, 4), np.int64)
+        cell[:, :2] = pos // size_cell
+        cell[:, 2:] = (pos + size - 1) // size_cell
+        for slot in np.flatnonzero((cell != self.cell[:count]).any(axis=1)).tolist():
+            sprite = members[slot]
+            self.remove_cells(sprite)
+            self.insert_cells(sprite, tuple(cell[slot].tolist()))
+        self.cell[:count] = cell
+        
+        fallen = [members[slot] for slot in np.flatnonzero(pos[:, 1] > SCREEN_HEIGHT).tolist()]
+        for sprite in fallen:
+            sprite.kill()
+    
+    def update_each(self, platforms, world_width, dt):
+        for sprite in list(self.members):
+            sprite.update(platforms, world_width, dt)
+            if sprite.batch is self:
+                self.pos[sprite.slot] = sprite.rect.topleft
+                self.reindex(sprite)
+                self.cell[sprite.slot] = self.sprite_cells[sprite]
+    
+    def land(self, platforms, pos, size, vel, old_y):
+        # 每个下落中的敌人落在与其相交的第一个平台 (按平台加入顺序) 上, 与逐个调用 Enemy.update 的结果一致;
+        # 一步下落超过自身高度的敌人按扫掠检测落在最先碰到的平台上 (同 first_contact)
+        if not len(platforms):
+            return
+        falling = vel[:, 1] > 0
+        swept = falling & (pos[:, 1] - old_y > size[:, 1])
+        if swept.any():
+            falling &= ~swept
+            self.sweep(platforms, pos, size, vel, old_y, np.flatnonzero(swept))
+        falling = np.flatnonzero(falling)
+        step = max(1, self.LANDING_BLOCK // len(platforms))
+        for start in range(0, len(falling), step):
+            rows = falling[start:start + step]
+            left = pos[rows, 0:1]
+            top = pos[rows, 1:2]
+            right = left + size[rows, 0:1]
+            bottom = top + size[rows, 1:2]
+            hits = ((left < platforms[:, 2]) & (platforms[:, 0] < right) &
+                    (top < platforms[:, 3]) & (platforms[:, 1] < bottom))
+            landed = hits.any(axis=1)
+            if not landed.any():
+                continue
+            first = hits.argmax(axis=1)[landed]
+            rows = rows[landed]
+            pos[rows, 1] = platforms[first, 1] - size[rows, 1]
+            vel[rows, 1] = 0
+    
+    def sweep(self, platforms, pos, size, vel, old_y, rows):
+        left = pos[rows, 0:1]
+        right = left + size[rows, 0:1]
+        old_bottom = old_y[rows, None] + size[rows, 1:2]
+        bottom = pos[rows, 1:2] + size[rows, 1:2]
+        crossed = ((left < platforms[:, 2]) & (platforms[:, 0] < right) &
+                   (platforms[:, 1] >= old_bottom) & (platforms[:, 1] < bottom))
+        landed = crossed.any(axis=1)
+        if not landed.any():
+            return
+        first = np.where(crossed, platforms[:, 1], np.iinfo(np.int64).max).argmin(axis=1)[landed]
+        rows = rows[landed]
+        pos[rows, 1] = platforms[first, 1] - size[rows, 1]
+        vel[rows, 1] = 0
+
+class ParticleSystem:
+    # 粒子以结构数组存储 (位置/速度/寿命/大小/颜色), 每帧一次性向量化更新,
+    # 绘制时使用按 (颜色, 大小, 透明度档位) 预渲染的圆点纹理
+    GRAVITY = 0.3
+    MAX_LIFE = 60
+    MIN_SIZE = 3
+    MAX_SIZE = 8
+    ALPHA_LEVELS = 16
+    
+    def __init__(self, capacity=8192, seed=None):
+        self.capacity = capacity
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.int32)
+        self.size = np.zeros(capacity, np.int32)
+        self.color = np.zeros(capacity, np.int32)
+        self.palette = {}
+        self.palette_colors = []
+        self.textures = {}
+    
+    def __len__(self):
+        return self.count
+    
+    def clear(self):
+        self.count = 0
+    
+    def color_index(self, color):
+        index = self.palette.get(color)
+        if index is None:
+            index = len(self.palette_colors)
+            self.palette[color] = index
+            self.palette_colors.append(color)
+        return index
+    
+    def emit(self, x, y, colors, count=1, spread_x=0, spread_y=0, vel_x=(-3, 3), vel_y=(-5, -2)):
+        count = min(count, self.capacity - self.count)
+        if count <= 0:
+            return
+        start = self.count
+        end = start + count
+        rng = self.rng
+        
+        self.pos[start:end, 0] = x + rng.integers(-spread_x, spread_x + 1, count)
+        self.pos[start:end, 1] = y + rng.integers(-spread_y, spread_y + 1, count)
+        self.vel[start:end, 0] = rng.uniform(vel_x[0], vel_x[1], count)
+        self.vel[start:end, 1] = rng.uniform(vel_y[0], vel_y[1], count)
+        self.life[start:end] = rng.integers(30, self.MAX_LIFE + 1, count)
+        self.size[start:end] = rng.integers(self.MIN_SIZE, self.MAX_SIZE + 1, count)
+        color_ids = np.array([self.color_index(color) for color in colors], np.int32)
+        self.color[start:end] = color_ids[rng.integers(0, len(color_ids), count)]
+        self.count = end
+    
+    def update(self, dt=1):
+        n = self.count
+        if n == 0:
+            return
+        vel = self.vel[:n]
+        vel[:, 1] += self.GRAVITY * dt
+        self.pos[:n] += vel * dt
+        life = self.life[:n]
+        life -= dt
+        
+        alive = life > 0
+        if not alive.all():
+            keep = np.flatnonzero(alive)
+            k = len(keep)
+            for array in (self.pos, self.vel, self.life, self.size, self.color):
+                array[:k] = array[keep]
+            self.count = k
+    
+    def texture(self, texture_id):
+        surface = self.textures.get(texture_id)
+        if surface is None:
+            color_id, rest = divmod(texture_id, (self.MAX_SIZE + 1) * self.ALPHA_LEVELS)
+            size, level = divmod(rest, self.ALPHA_LEVELS)
+            color = self.palette_colors[color_id]
+            alpha = level * 255 // (self.ALPHA_LEVELS - 1)
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(surface, (*color[:3], alpha), (size // 2, size // 2), size // 2)
+            self.textures[texture_id] = surface
+        return surface
+    
+    def draw(self, surface, offset_x=0):
+        n = self.count
+        if n == 0:
+            return []
+        size = self.size[:n]
+        alpha = np.minimum(255, 255 * self.life[:n] // self.MAX_LIFE)
+        levels = (alpha * (self.ALPHA_LEVELS - 1) + 127) // 255
+        texture_ids = (self.color[:n] * (self.MAX_SIZE + 1) + size) * self.ALPHA_LEVELS + levels
+        topleft = (self.pos[:n] - (size // 2)[:, None]).astype(np.int32)
+        if offset_x:
+            topleft[:, 0] -= int(offset_x)
+        
+        textures = {texture_id: self.texture(texture_id) for texture_id in np.unique(texture_ids).tolist()}
+        # 坐标拆成两个整数列表再逐个配对: topleft.tolist() 会一次性生成上千个小列表, 绘制期间触发的
+        # 垃圾回收会把它们提升到老年代, 进而频繁引发耗时的完整回收
+        positions = zip(topleft[:, 0].tolist(), topleft[:, 1].tolist())
+        return surface.blits(zip(map(textures.__getitem__, texture_ids.tolist()), positions))
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, x, y):
+    BODY_COLOR = (255, 230, 200)
+    
+    def __init__(self, x, y, body_color=BODY_COLOR):
         super().__init__()
         self.width = 45
         self.height = 50
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        self.body_color = body_color
         self.facing_right = True
         self.animation_frame = 0
         self.draw_kitten()
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
+        self.spawn_x = x
+        self.spawn_y = y
+        self.path = [self.rect.copy()]
         self.vel_x = 0
         self.vel_y = 0
         self.on_ground = False
@@ -68,51 +607,57 @@ class Player(pygame.sprite.Sprite):
         self.lives = 3
         self.invincible = False
         self.invincible_timer = 0
+        self.blocks_hit = 0
+        self.world_width = SCREEN_WIDTH
         
     def draw_kitten(self):
-        self.image.fill((0, 0, 0, 0))
+        self.image = IMAGE_CACHE.get(('kitten', self.body_color, self.facing_right), Player.render_kitten,
+                                     self.width, self.height, self.facing_right, self.body_color)
+    
+    @staticmethod
+    def render_kitten(width, height, facing_right, body_color=BODY_COLOR):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
         
-        body_color = (255, 230, 200)
         dark_color = (200, 150, 100)
         
-        body_x = 22 if self.facing_right else 22
+        body_x = 22 if facing_right else 22
         
-        pygame.draw.ellipse(self.image, body_color, (body_x - 12, 25, 24, 20))
+        pygame.draw.ellipse(image, body_color, (body_x - 12, 25, 24, 20))
         
         head_x = body_x
-        pygame.draw.circle(self.image, body_color, (head_x, 15), 13)
+        pygame.draw.circle(image, body_color, (head_x, 15), 13)
         
-        ear_offset = 1 if self.facing_right else -1
+        ear_offset = 1 if facing_right else -1
         ear1_points = [(head_x - 8, 5), (head_x - 10, 2), (head_x - 5, 8)]
         ear2_points = [(head_x + 8, 5), (head_x + 10, 2), (head_x + 5, 8)]
-        pygame.draw.polygon(self.image, (255, 200, 180), ear1_points)
-        pygame.draw.polygon(self.image, (255, 200, 180), ear2_points)
+        pygame.draw.polygon(image, (255, 200, 180), ear1_points)
+        pygame.draw.polygon(image, (255, 200, 180), ear2_points)
         
-        eye_offset = 2 if self.facing_right else -2
-        pygame.draw.circle(self.image, BLACK, (head_x - 4 + eye_offset, 13), 2)
-        pygame.draw.circle(self.image, BLACK, (head_x + 4 + eye_offset, 13), 2)
-        pygame.draw.circle(self.image, WHITE, (head_x - 3 + eye_offset, 12), 1)
-        pygame.draw.circle(self.image, WHITE, (head_x + 5 + eye_offset, 12), 1)
+        eye_offset = 2 if facing_right else -2
+        pygame.draw.circle(image, BLACK, (head_x - 4 + eye_offset, 13), 2)
+        pygame.draw.circle(image, BLACK, (head_x + 4 + eye_offset, 13), 2)
+        pygame.draw.circle(image, WHITE, (head_x - 3 + eye_offset, 12), 1)
+        pygame.draw.circle(image, WHITE, (head_x + 5 + eye_offset, 12), 1)
         
-        pygame.draw.circle(self.image, (255, 150, 150), (head_x, 18), 2)
+        pygame.draw.circle(image, (255, 150, 150), (head_x, 18), 2)
         
-        pygame.draw.line(self.image, BLACK, (head_x, 18), (head_x - 3, 20), 1)
-        pygame.draw.line(self.image, BLACK, (head_x, 18), (head_x + 3, 20), 1)
+        pygame.draw.line(image, BLACK, (head_x, 18), (head_x - 3, 20), 1)
+        pygame.draw.line(image, BLACK, (head_x, 18), (head_x + 3, 20), 1)
         
-        whisker_start = head_x - 5 if self.facing_right else head_x + 5
+        whisker_start = head_x - 5 if facing_right else head_x + 5
         for i in range(3):
             y_offset = 15 + i * 2
-            if self.facing_right:
-                pygame.draw.line(self.image, (100, 100, 100), (whisker_start, y_offset), (whisker_start - 8, y_offset - 1 + i), 1)
-                pygame.draw.line(self.image, (100, 100, 100), (whisker_start + 10, y_offset), (whisker_start + 18, y_offset - 1 + i), 1)
+            if facing_right:
+                pygame.draw.line(image, (100, 100, 100), (whisker_start, y_offset), (whisker_start - 8, y_offset - 1 + i), 1)
+                pygame.draw.line(image, (100, 100, 100), (whisker_start + 10, y_offset), (whisker_start + 18, y_offset - 1 + i), 1)
             else:
-                pygame.draw.line(self.image, (100, 100, 100), (whisker_start, y_offset), (whisker_start + 8, y_offset - 1 + i), 1)
-                pygame.draw.line(self.image, (100, 100, 100), (whisker_start - 10, y_offset), (whisker_start - 18, y_offset - 1 + i), 1)
+                pygame.draw.line(image, (100, 100, 100), (whisker_start, y_offset), (whisker_start + 8, y_offset - 1 + i), 1)
+                pygame.draw.line(image, (100, 100, 100), (whisker_start - 10, y_offset), (whisker_start - 18, y_offset - 1 + i), 1)
         
         leg_x1 = body_x - 6
         leg_x2 = body_x + 6
-        pygame.draw.rect(self.image, body_color, (leg_x1, 42, 5, 8))
-        pygame.draw.rect(self.image, body_color, (leg_x2, 42, 5, 8))
+        pygame.draw.rect(image, body_color, (leg_x1, 42, 5, 8))
+        pygame.draw.rect(image, body_color, (leg_x2, 42, 5, 8))
         
         tail_points = []
         for i in range(8):
@@ -122,9 +667,23 @@ class Player(pygame.sprite.Sprite):
             y = 30 + radius * math.sin(math.radians(angle))
             tail_points.append((x, y))
         if len(tail_points) > 1:
-            pygame.draw.lines(self.image, dark_color, False, tail_points, 3)
-        
-    def update(self, platforms, enemies, coins, powerups, particles):
+            pygame.draw.lines(image, dark_color, False, tail_points, 3)
+        return image
+        
+    def update(self, platforms, enemies, coins, powerups, particles, keys=None, dt=1):
+        # dt: 这一步推进的帧数。大于 1 时按同样的按键逐帧重复单帧的移动、碰撞和拾取, 跳跃高度、吃到的金币和碰到的敌人
+        # 都与逐帧模拟相同; 玩家只有一两个, 逐帧推进的开销很小
+        # path 记下每一帧结束时的位置, 钥匙和旗帜按整条路径检测
+        if keys is None:
+            keys = pygame.key.get_pressed()
+        collected = 0
+        self.path = []
+        for _ in range(dt):
+            collected += self.step(platforms, enemies, coins, powerups, particles, keys)
+            self.path.append(self.rect.copy())
+        return collected
+    
+    def step(self, platforms, enemies, coins, powerups, particles, keys):
         if self.invincible:
             self.invincible_timer -= 1
             if self.invincible_timer <= 0:
@@ -133,7 +692,6 @@ class Player(pygame.sprite.Sprite):
         self.animation_frame += 1
         
         self.vel_x = 0
-        keys = pygame.key.get_pressed()
         
         if keys[pygame.K_LEFT]:
             self.vel_x = -self.speed
@@ -148,94 +706,81 @@ class Player(pygame.sprite.Sprite):
         if keys[pygame.K_UP] and self.on_ground:
             self.vel_y = self.jump_power
             self.on_ground = False
-            for _ in range(8):
-                particles.add(Particle(
-                    self.rect.centerx + random.randint(-10, 10),
-                    self.rect.bottom,
-                    random.choice([WHITE, (200, 200, 255), (150, 150, 255)]),
-                    vel_x=random.uniform(-2, 2),
-                    vel_y=random.uniform(-1, 1)
-                ))
+            particles.emit(self.rect.centerx, self.rect.bottom,
+                           [WHITE, (200, 200, 255), (150, 150, 255)], 8,
+                           spread_x=10, vel_x=(-2, 2), vel_y=(-1, 1))
         
         self.vel_y += self.gravity
         if self.vel_y > 15:
             self.vel_y = 15
         
+        x, y = self.rect.topleft
         self.rect.x += self.vel_x
-        self.check_collision_x(platforms)
+        platform = first_contact(platforms, self.rect, x, y)
+        if platform is None:
+            self.check_collision_x(platforms)
+        elif self.vel_x > 0:
+            self.rect.right = platform.rect.left
+        else:
+            self.rect.left = platform.rect.right
         
+        x = self.rect.x
         self.rect.y += self.vel_y
         self.on_ground = False
-        self.check_collision_y(platforms)
+        platform = first_contact(platforms, self.rect, x, y)
+        if platform is None:
+            self.check_collision_y(platforms)
+        elif self.vel_y > 0:
+            self.land(platform)
+        else:
+            self.bump(platform)
         
         if self.rect.bottom > SCREEN_HEIGHT:
             self.lives -= 1
-            self.rect.x = 50
-            self.rect.y = SCREEN_HEIGHT - 150
+            self.rect.x = self.spawn_x
+            self.rect.y = self.spawn_y
             self.vel_y = 0
-            for _ in range(20):
-                particles.add(Particle(
-                    self.rect.centerx + random.randint(-15, 15),
-                    self.rect.centery + random.randint(-15, 15),
-                    RED
-                ))
+            particles.emit(self.rect.centerx, self.rect.centery, [RED], 20, spread_x=15, spread_y=15)
         
         if self.rect.left < 0:
             self.rect.left = 0
-        if self.rect.right > SCREEN_WIDTH:
-            self.rect.right = SCREEN_WIDTH
+        if self.rect.right > self.world_width:
+            self.rect.right = self.world_width
         
-        coin_hits = pygame.sprite.spritecollide(self, coins, True)
+        coin_hits = coins.collide(self, True)
         for coin in coin_hits:
-            for _ in range(15):
-                particles.add(Particle(
-                    coin.rect.centerx + random.randint(-5, 5),
-                    coin.rect.centery + random.randint(-5, 5),
-                    random.choice([COIN_COLOR, (255, 255, 100), ORANGE])
-                ))
+            particles.emit(coin.rect.centerx, coin.rect.centery,
+                           [COIN_COLOR, (255, 255, 100), ORANGE], 15, spread_x=5, spread_y=5)
         
         if not self.invincible:
-            enemy_hits = pygame.sprite.spritecollide(self, enemies, False)
+            enemy_hits = enemies.collide(self)
             for enemy in enemy_hits:
                 if self.vel_y > 0 and self.rect.bottom - 10 < enemy.rect.top:
                     enemy.kill()
                     self.vel_y = -8
-                    for _ in range(20):
-                        particles.add(Particle(
-                            enemy.rect.centerx + random.randint(-10, 10),
-                            enemy.rect.centery + random.randint(-10, 10),
-                            random.choice([GREEN, (100, 200, 100), (150, 255, 150)])
-                        ))
+                    particles.emit(enemy.rect.centerx, enemy.rect.centery,
+                                   [GREEN, (100, 200, 100), (150, 255, 150)], 20, spread_x=10, spread_y=10)
                 else:
                     self.lives -= 1
                     self.invincible = True
                     self.invincible_timer = 60
                     self.rect.x -= 50 if self.facing_right else -50
-                    for _ in range(15):
-                        particles.add(Particle(
-                            self.rect.centerx + random.randint(-10, 10),
-                            self.rect.centery + random.randint(-10, 10),
-                            RED
-                        ))
-        
-        powerup_hits = pygame.sprite.spritecollide(self, powerups, True)
+                    particles.emit(self.rect.centerx, self.rect.centery, [RED], 15, spread_x=10, spread_y=10)
+        
+        powerup_hits = powerups.collide(self, True)
         for powerup in powerup_hits:
             if powerup.type == 'life':
                 self.lives += 1
             elif powerup.type == 'star':
                 self.invincible = True
                 self.invincible_timer = 300
-            for _ in range(20):
-                particles.add(Particle(
-                    powerup.rect.centerx + random.randint(-8, 8),
-                    powerup.rect.centery + random.randint(-8, 8),
-                    random.choice([PURPLE, PINK, (255, 100, 255)])
-                ))
+            particles.emit(powerup.rect.centerx, powerup.rect.centery,
+                           [PURPLE, PINK, (255, 100, 255)], 20, spread_x=8, spread_y=8)
         
         return len(coin_hits)
     
     def check_collision_x(self, platforms):
-        for platform in platforms:
+        for platform in platforms.scan(self.rect):
             if self.rect.colliderect(platform.rect):
                 if self.vel_x > 0:
                     self.rect.right = platform.rect.left
@@ -243,252 +788,364 @@ class Player(pygame.sprite.Sprite):
                     self.rect.left = platform.rect.right
     
     def check_collision_y(self, platforms):
-        for platform in platforms:
+        for platform in platforms.scan(self.rect):
             if self.rect.colliderect(platform.rect):
                 if self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
-                    self.vel_y = 0
-                    self.on_ground = True
+                    self.land(platform)
                 elif self.vel_y < 0:
-                    self.rect.top = platform.rect.bottom
-                    self.vel_y = 0
-                    if hasattr(platform, 'hit'):
-                        platform.hit()
+                    self.bump(platform)
+    
+    def land(self, platform):
+        self.rect.bottom = platform.rect.top
+        self.vel_y = 0
+        self.on_ground = True
+    
+    def bump(self, platform):
+        self.rect.top = platform.rect.bottom
+        self.vel_y = 0
+        if hasattr(platform, 'hit') and platform.hit():
+            self.blocks_hit += 1
+
+class Entity(pygame.sprite.Sprite):
+    # 关卡实体 (平台/敌人/金币/钥匙/道具/旗帜) 的基类。pygame 的 Sprite 用 set 记录所在的组, 空 set 就占 216 字节,
+    # 而实体同时只在两三个组里; 这里改用列表记录, 每个实体省下约 150 字节。
+    # 同类实体共用的常量 (尺寸、重力) 放在类属性或 ENEMY_TYPES 里, 实例只保存自身状态
+    def __init__(self):
+        self.memberships = []
+    
+    def add(self, *groups):
+        for group in groups:
+            if hasattr(group, '_spritegroup'):
+                if group not in self.memberships:
+                    group.add_internal(self)
+                    self.add_internal(group)
+            else:
+                self.add(*group)
+    
+    def remove(self, *groups):
+        for group in groups:
+            if hasattr(group, '_spritegroup'):
+                if group in self.memberships:
+                    group.remove_internal(self)
+                    self.remove_internal(group)
+            else:
+                self.remove(*group)
+    
+    def add_internal(self, group):
+        self.memberships.append(group)
+    
+    def remove_internal(self, group):
+        self.memberships.remove(group)
+    
+    def kill(self):
+        for group in self.memberships:
+            group.remove_internal(self)
+        self.memberships.clear()
+    
+    def groups(self):
+        return list(self.memberships)
+    
+    def alive(self):
+        return bool(self.memberships)
+    
+    def __repr__(self):
+        return f'<{self.__class__.__name__} Entity(in {len(self.memberships)} groups)>'
 
-class Platform(pygame.sprite.Sprite):
+class Platform(Entity):
     def __init__(self, x, y, width, height, color=GROUND_COLOR, platform_type='ground'):
         super().__init__()
-        self.width = width
-        self.height = height
-        self.image = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.type = platform_type
+        self.image = IMAGE_CACHE.get(('platform', platform_type, width, height, color), Platform.render_platform, width, height, color, platform_type)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
-        self.type = platform_type
-        self.draw_platform(color, platform_type)
+        if platform_type == 'mystery':
+            self.has_item = True
         
-    def draw_platform(self, color, platform_type):
+    @staticmethod
+    def render_platform(width, height, color, platform_type):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
         if platform_type == 'brick':
             brick_width = 40
             brick_height = 20
-            for i in range(0, self.width, brick_width):
-                for j in range(0, self.height, brick_height):
+            for i in range(0, width, brick_width):
+                for j in range(0, height, brick_height):
                     base_color = BRICK_COLOR
                     highlight = (min(255, base_color[0] + 30), min(255, base_color[1] + 30), min(255, base_color[2] + 30))
                     shadow = (max(0, base_color[0] - 30), max(0, base_color[1] - 30), max(0, base_color[2] - 30))
                     
-                    pygame.draw.rect(self.image, base_color, (i, j, brick_width-2, brick_height-2))
-                    pygame.draw.rect(self.image, highlight, (i, j, brick_width-2, brick_height-2), 2)
-                    pygame.draw.line(self.image, shadow, (i, j + brick_height-2), (i + brick_width-2, j + brick_height-2), 2)
-                    pygame.draw.line(self.image, shadow, (i + brick_width-2, j), (i + brick_width-2, j + brick_height-2), 2)
+                    pygame.draw.rect(image, base_color, (i, j, brick_width-2, brick_height-2))
+                    pygame.draw.rect(image, highlight, (i, j, brick_width-2, brick_height-2), 2)
+                    pygame.draw.line(image, shadow, (i, j + brick_height-2), (i + brick_width-2, j + brick_height-2), 2)
+                    pygame.draw.line(image, shadow, (i + brick_width-2, j), (i + brick_width-2, j + brick_height-2), 2)
                     
         elif platform_type == 'mystery':
             gradient_colors = [(255, 215, 0), (255, 235, 100), (255, 215, 0)]
-            for i in range(self.height):
-                ratio = i / self.height
+            for i in range(height):
+                ratio = i / height
                 if ratio < 0.5:
-                    color = self.interpolate_color(gradient_colors[0], gradient_colors[1], ratio * 2)
+                    color = Platform.interpolate_color(gradient_colors[0], gradient_colors[1], ratio * 2)
                 else:
-                    color = self.interpolate_color(gradient_colors[1], gradient_colors[2], (ratio - 0.5) * 2)
-                pygame.draw.line(self.image, color, (0, i), (self.width, i))
+                    color = Platform.interpolate_color(gradient_colors[1], gradient_colors[2], (ratio - 0.5) * 2)
+                pygame.draw.line(image, color, (0, i), (width, i))
             
-            pygame.draw.rect(self.image, (200, 170, 0), (0, 0, self.width, self.height), 3)
-            font = pygame.font.Font(None, 36)
-            text = font.render('?', True, (255, 100, 0))
-            text_rect = text.get_rect(center=(self.width//2, self.height//2))
-            self.image.blit(text, text_rect)
-            self.has_item = True
+            pygame.draw.rect(image, (200, 170, 0), (0, 0, width, height), 3)
+            font = get_font(None, 36)
+            with FONT_LOCK:
+                text = font.render('?', True, (255, 100, 0))
+            text_rect = text.get_rect(center=(width//2, height//2))
+            image.blit(text, text_rect)
         else:
-            for i in range(self.height):
-                ratio = i / self.height
+            for i in range(height):
+                ratio = i / height
                 r = int(color[0] * (1 - ratio * 0.3))
                 g = int(color[1] * (1 - ratio * 0.3))
                 b = int(color[2] * (1 - ratio * 0.3))
-                pygame.draw.line(self.image, (r, g, b), (0, i), (self.width, i))
+                pygame.draw.line(image, (r, g, b), (0, i), (width, i))
             
-            for i in range(0, self.width, 30):
-                pygame.draw.line(self.image, (100, 50, 20), (i, 0), (i, self.height), 2)
+            for i in range(0, width, 30):
+                pygame.draw.line(image, (100, 50, 20), (i, 0), (i, height), 2)
+        return image
     
-    def interpolate_color(self, color1, color2, ratio):
+    @staticmethod
+    def interpolate_color(color1, color2, ratio):
         return tuple(int(color1[i] + (color2[i] - color1[i]) * ratio) for i in range(3))
     
     def hit(self):
         if self.type == 'mystery' and self.has_item:
             self.has_item = False
-            self.image.fill((150, 150, 150))
-            pygame.draw.rect(self.image, (100, 100, 100), (0, 0, self.width, self.height), 3)
+            width, height = self.rect.size
+            self.image = IMAGE_CACHE.get(('platform', 'mystery_used', width, height), Platform.render_used_block, width, height)
             return True
         return False
+    
+    @staticmethod
+    def render_used_block(width, height):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
+        image.fill((150, 150, 150))
+        pygame.draw.rect(image, (100, 100, 100), (0, 0, width, height), 3)
+        return image
 
-class Enemy(pygame.sprite.Sprite):
-    def __init__(self, x, y, enemy_type='goomba'):
+class Enemy(Entity):
+    gravity = EnemyGroup.GRAVITY
+    
+    def __init__(self, x, y, enemy_type='goomba', shell_color=None, rng=random):
         super().__init__()
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.batch = None
+        self.slot = 0
+        self.reset(x, y, enemy_type, shell_color, rng)
+    
+    def reset(self, x, y, enemy_type='goomba', shell_color=None, rng=random):
+        # 对象池复用时重新初始化, 与新建的精灵状态一致 (随机数的消耗也相同)
         self.type = enemy_type
-        if enemy_type == 'goomba':
-            self.width = 35
-            self.height = 35
-        else:
-            self.width = 40
-            self.height = 40
-        
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        self.draw_enemy()
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+        self.shell_color = shell_color
+        self.rect.update(x, y, *ENEMY_TYPES[enemy_type])
+        self.draw_enemy(rng)
         self.vel_x = -2
         self.vel_y = 0
-        self.gravity = 0.8
+    
+    # 加入 EnemyGroup 后速度保存在组的数组里
+    @property
+    def vel_x(self):
+        return float(self.batch.vel[self.slot, 0]) if self.batch is not None else self._vel_x
+    
+    @vel_x.setter
+    def vel_x(self, value):
+        if self.batch is not None:
+            self.batch.vel[self.slot, 0] = value
+        else:
+            self._vel_x = value
+    
+    @property
+    def vel_y(self):
+        return float(self.batch.vel[self.slot, 1]) if self.batch is not None else self._vel_y
+    
+    @vel_y.setter
+    def vel_y(self, value):
+        if self.batch is not None:
+            self.batch.vel[self.slot, 1] = value
+        else:
+            self._vel_y = value
         
-    def draw_enemy(self):
-        self.image.fill((0, 0, 0, 0))
+    def draw_enemy(self, rng=random):
+        if self.type != 'goomba' and self.shell_color is None:
+            self.shell_color = GREEN if rng.random() > 0.5 else RED
+        width, height = self.rect.size
+        self.image = IMAGE_CACHE.get(('enemy', self.type, self.shell_color), Enemy.render_enemy, width, height, self.type, self.shell_color)
+    
+    @staticmethod
+    def render_enemy(width, height, enemy_type, shell_color):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
         
-        if self.type == 'goomba':
+        if enemy_type == 'goomba':
             base_color = (139, 69, 19)
             for i in range(25):
                 ratio = i / 25
                 color = tuple(int(base_color[j] * (1 + ratio * 0.3)) for j in range(3))
-                pygame.draw.ellipse(self.image, color, (5, 10 + i, 25, 1))
+                pygame.draw.ellipse(image, color, (5, 10 + i, 25, 1))
             
-            pygame.draw.circle(self.image, WHITE, (12, 15), 4)
-            pygame.draw.circle(self.image, WHITE, (22, 15), 4)
-            pygame.draw.circle(self.image, BLACK, (12, 15), 2)
-            pygame.draw.circle(self.image, BLACK, (22, 15), 2)
+            pygame.draw.circle(image, WHITE, (12, 15), 4)
+            pygame.draw.circle(image, WHITE, (22, 15), 4)
+            pygame.draw.circle(image, BLACK, (12, 15), 2)
+            pygame.draw.circle(image, BLACK, (22, 15), 2)
             
-            pygame.draw.rect(self.image, (101, 67, 33), (8, 28, 8, 7))
-            pygame.draw.rect(self.image, (101, 67, 33), (19, 28, 8, 7))
+            pygame.draw.rect(image, (101, 67, 33), (8, 28, 8, 7))
+            pygame.draw.rect(image, (101, 67, 33), (19, 28, 8, 7))
         else:
-            shell_color = GREEN if random.random() > 0.5 else RED
             for i in range(30):
                 ratio = i / 30
                 color = tuple(int(shell_color[j] * (1 - ratio * 0.3)) for j in range(3))
-                pygame.draw.ellipse(self.image, color, (0, 10 + i, 40, 1))
+                pygame.draw.ellipse(image, color, (0, 10 + i, 40, 1))
             
-            pygame.draw.ellipse(self.image, (100, 200, 100), (5, 15, 30, 20))
+            pygame.draw.ellipse(image, (100, 200, 100), (5, 15, 30, 20))
             
-            pygame.draw.circle(self.image, (150, 255, 150), (20, 8), 8)
-            pygame.draw.circle(self.image, BLACK, (18, 6), 2)
-            pygame.draw.circle(self.image, BLACK, (22, 6), 2)
+            pygame.draw.circle(image, (150, 255, 150), (20, 8), 8)
+            pygame.draw.circle(image, BLACK, (18, 6), 2)
+            pygame.draw.circle(image, BLACK, (22, 6), 2)
+        return image
     
-    def update(self, platforms):
-        self.vel_y += self.gravity
-        if self.vel_y > 15:
-            self.vel_y = 15
-        
-        self.rect.x += self.vel_x
-        self.rect.y += self.vel_y
-        
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
-                    self.vel_y = 0
+    def update(self, platforms, world_width=SCREEN_WIDTH, dt=1):
+        # dt 帧的下落距离按逐帧累加: 每帧先加速 (不超过 15) 再移动
+        fall = 0
+        for _ in range(dt):
+            self.vel_y += self.gravity
+            if self.vel_y > 15:
+                self.vel_y = 15
+            fall += self.vel_y
+        
+        self.rect.x += self.vel_x * dt
+        y = self.rect.y
+        self.rect.y += fall
+        
+        platform = first_contact(platforms, self.rect, self.rect.x, y)
+        if platform is not None:
+            if self.vel_y > 0:
+                self.rect.bottom = platform.rect.top
+                self.vel_y = 0
+        else:
+            for platform in platforms.scan(self.rect):
+                if self.rect.colliderect(platform.rect):
+                    if self.vel_y > 0:
+                        self.rect.bottom = platform.rect.top
+                        self.vel_y = 0
         
-        if self.rect.right > SCREEN_WIDTH or self.rect.left < 0:
+        if self.rect.right > world_width or self.rect.left < 0:
             self.vel_x *= -1
         
         if self.rect.top > SCREEN_HEIGHT:
             self.kill()
 
-class Coin(pygame.sprite.Sprite):
+class Coin(Entity):
+    width = 20
+    height = 25
+    
     def __init__(self, x, y):
         super().__init__()
-        self.width = 20
-        self.height = 25
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        self.draw_coin()
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.animation_timer = 0
-        self.glow_timer = 0
-        
-    def draw_coin(self, glow=False):
-        self.image.fill((0, 0, 0, 0))
-        
-        if glow:
-            pygame.draw.ellipse(self.image, (255, 255, 100, 128), (0, 0, 20, 25))
-        
-        pygame.draw.ellipse(self.image, COIN_COLOR, (2, 2, 16, 21))
-        pygame.draw.ellipse(self.image, (255, 255, 0), (5, 5, 10, 15))
-        highlight = (255, 255, 200)
-        pygame.draw.ellipse(self.image, highlight, (6, 6, 5, 8))
-        
-    def update(self):
-        self.animation_timer += 1
-        self.glow_timer += 1
-        
-        glow = (self.glow_timer // 10) % 2 == 0
+        self.rect = pygame.Rect(0, 0, self.width, self.height)
+        self.reset(x, y)
+    
+    def reset(self, x, y):
+        self.draw_coin(False, False)
+        self.rect.topleft = (x, y)
+        self.timer = 0
         
-        if self.animation_timer % 20 < 10:
-            self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-            self.draw_coin(glow)
+    def draw_coin(self, spinning, glow):
+        self.image = IMAGE_CACHE.get(('coin', spinning, glow), Coin.render_coin, self.width, self.height, spinning, glow)
+    
+    @staticmethod
+    def render_coin(width, height, spinning, glow):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
+        if spinning:
+            # 侧面帧: 金币转到侧面时变窄
+            if glow:
+                pygame.draw.ellipse(image, (255, 255, 100, 128), (5, 0, 10, 25))
+            pygame.draw.ellipse(image, COIN_COLOR, (7, 2, 6, 21))
+            pygame.draw.ellipse(image, (255, 255, 0), (8, 5, 4, 15))
         else:
-            self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-            self.image.fill((0, 0, 0, 0))
             if glow:
-                pygame.draw.ellipse(self.image, (255, 255, 100, 128), (5, 0, 10, 25))
-            pygame.draw.ellipse(self.image, COIN_COLOR, (7, 2, 6, 21))
-            pygame.draw.ellipse(self.image, (255, 255, 0), (8, 5, 4, 15))
+                pygame.draw.ellipse(image, (255, 255, 100, 128), (0, 0, 20, 25))
+            pygame.draw.ellipse(image, COIN_COLOR, (2, 2, 16, 21))
+            pygame.draw.ellipse(image, (255, 255, 0), (5, 5, 10, 15))
+            highlight = (255, 255, 200)
+            pygame.draw.ellipse(image, highlight, (6, 6, 5, 8))
+        return image
+        
+    def update(self, dt=1):
+        # 旋转和闪光共用一个计时器
+        self.timer += dt
+        glow = (self.timer // 10) % 2 == 0
+        self.draw_coin(self.timer % 20 >= 10, glow)
 
-class Key(pygame.sprite.Sprite):
-    def __init__(self, x, y):
+class Key(Entity):
+    width = 26
+    height = 48
+    
+    def __init__(self, x, y, rng=random):
         super().__init__()
-        self.width = 26
-        self.height = 48
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        self.draw_key()
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
         self.base_y = y
-        self.float_wave = random.uniform(0, math.pi * 2)
-        self.glow_timer = random.randint(0, 50)
-        self.draw_key()
+        self.float_wave = rng.uniform(0, math.pi * 2)
+        self.glow_timer = rng.randint(0, 50)
 
     def draw_key(self, glow=False):
-        self.image.fill((0, 0, 0, 0))
+        self.image = IMAGE_CACHE.get(('key', glow), Key.render_key, self.width, self.height, glow)
+    
+    @staticmethod
+    def render_key(width, height, glow):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
         if glow:
-            glow_surface = pygame.Surface((self.width + 12, self.height + 12), pygame.SRCALPHA)
-            pygame.draw.ellipse(glow_surface, (255, 240, 150, 120), (0, 6, self.width + 12, self.height))
-            self.image.blit(glow_surface, (-6, -6))
-        pygame.draw.circle(self.image, (255, 220, 120), (self.width // 2, 14), 12)
-        pygame.draw.circle(self.image, (160, 120, 40), (self.width // 2, 14), 12, 3)
-        pygame.draw.circle(self.image, (255, 245, 200), (self.width // 2, 14), 5)
-        pygame.draw.rect(self.image, (245, 190, 60), (11, 24, 6, 14))
-        pygame.draw.rect(self.image, (245, 190, 60), (8, 34, 12, 6), border_radius=2)
-        pygame.draw.rect(self.image, (245, 190, 60), (8, 40, 12, 6), border_radius=2)
-        pygame.draw.rect(self.image, (210, 150, 40), (8, 34, 12, 2), border_radius=2)
-        pygame.draw.rect(self.image, (210, 150, 40), (8, 40, 12, 2), border_radius=2)
+            glow_surface = pygame.Surface((width + 12, height + 12), pygame.SRCALPHA)
+            pygame.draw.ellipse(glow_surface, (255, 240, 150, 120), (0, 6, width + 12, height))
+            image.blit(glow_surface, (-6, -6))
+        pygame.draw.circle(image, (255, 220, 120), (width // 2, 14), 12)
+        pygame.draw.circle(image, (160, 120, 40), (width // 2, 14), 12, 3)
+        pygame.draw.circle(image, (255, 245, 200), (width // 2, 14), 5)
+        pygame.draw.rect(image, (245, 190, 60), (11, 24, 6, 14))
+        pygame.draw.rect(image, (245, 190, 60), (8, 34, 12, 6), border_radius=2)
+        pygame.draw.rect(image, (245, 190, 60), (8, 40, 12, 6), border_radius=2)
+        pygame.draw.rect(image, (210, 150, 40), (8, 34, 12, 2), border_radius=2)
+        pygame.draw.rect(image, (210, 150, 40), (8, 40, 12, 2), border_radius=2)
+        return image
 
-    def update(self):
-        self.float_wave += 0.05
-        self.glow_timer = (self.glow_timer + 1) % 60
+    def update(self, dt=1):
+        self.float_wave += 0.05 * dt
+        self.glow_timer = (self.glow_timer + dt) % 60
         glow = self.glow_timer < 25
         self.draw_key(glow)
         self.rect.y = self.base_y + math.sin(self.float_wave) * 6
 
-class PowerUp(pygame.sprite.Sprite):
-    def __init__(self, x, y, powerup_type='life'):
+class PowerUp(Entity):
+    width = 30
+    height = 30
+    
+    def __init__(self, x, y, powerup_type='life', rng=random):
         super().__init__()
+        self.rect = pygame.Rect(0, 0, self.width, self.height)
+        self.reset(x, y, powerup_type, rng)
+    
+    def reset(self, x, y, powerup_type='life', rng=random):
         self.type = powerup_type
-        self.width = 30
-        self.height = 30
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
         self.draw_powerup()
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+        self.rect.topleft = (x, y)
         self.base_y = y
-        self.float_wave = random.uniform(0, math.pi * 2)
+        self.float_wave = rng.uniform(0, math.pi * 2)
         
     def draw_powerup(self):
-        self.image.fill((0, 0, 0, 0))
+        self.image = IMAGE_CACHE.get(('powerup', self.type), PowerUp.render_powerup, self.width, self.height, self.type)
+    
+    @staticmethod
+    def render_powerup(width, height, powerup_type):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
         
-        if self.type == 'life':
-            pygame.draw.polygon(self.image, (255, 0, 100), [
+        if powerup_type == 'life':
+            pygame.draw.polygon(image, (255, 0, 100), [
                 (15, 8), (20, 3), (25, 8), (15, 20), (5, 8), (10, 3)
             ])
-            pygame.draw.polygon(self.image, (255, 100, 150), [
+            pygame.draw.polygon(image, (255, 100, 150), [
                 (15, 10), (18, 7), (21, 10), (15, 17), (9, 10), (12, 7)
             ])
         else:
@@ -498,19 +1155,20 @@ class PowerUp(pygame.sprite.Sprite):
                 x = 15 + 12 * math.cos(math.radians(angle))
                 y = 15 + 12 * math.sin(math.radians(angle))
                 points.append((x, y))
-            pygame.draw.polygon(self.image, (255, 255, 100), points)
-            pygame.draw.circle(self.image, (255, 255, 200), (15, 15), 6)
+            pygame.draw.polygon(image, (255, 255, 100), points)
+            pygame.draw.circle(image, (255, 255, 200), (15, 15), 6)
+        return image
     
-    def update(self):
-        self.float_wave += 0.05
+    def update(self, dt=1):
+        self.float_wave += 0.05 * dt
         self.rect.y = self.base_y + math.sin(self.float_wave) * 5
 
-class Flag(pygame.sprite.Sprite):
+class Flag(Entity):
+    width = 50
+    height = 200
+    
     def __init__(self, x, y):
         super().__init__()
-        self.width = 50
-        self.height = 200
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
         self.draw_flag()
         self.rect = self.image.get_rect()
         self.rect.x = x
@@ -518,19 +1176,1214 @@ class Flag(pygame.sprite.Sprite):
         self.wave_offset = 0
         
     def draw_flag(self):
-        self.image.fill((0, 0, 0, 0))
+        self.image = IMAGE_CACHE.get(('flag',), Flag.render_flag, self.width, self.height)
+    
+    @staticmethod
+    def render_flag(width, height):
+        image = pygame.Surface((width, height), pygame.SRCALPHA)
         
-        pygame.draw.rect(self.image, BLACK, (5, 0, 5, 200))
+        pygame.draw.rect(image, BLACK, (5, 0, 5, 200))
         
         flag_points = [(10, 10), (45, 25), (10, 40)]
-        pygame.draw.polygon(self.image, GREEN, flag_points)
-        pygame.draw.polygon(self.image, (0, 200, 0), [(10, 10), (45, 25), (40, 27), (10, 15)])
+        pygame.draw.polygon(image, GREEN, flag_points)
+        pygame.draw.polygon(image, (0, 200, 0), [(10, 10), (45, 25), (40, 27), (10, 15)])
+        return image
 
-class Game:
+def list_level_files(directory=LEVEL_DIR):
+    names = [name for name in os.listdir(directory) if re.fullmatch(r'level_\d+\.json', name)]
+    names.sort(key=lambda name: int(re.search(r'\d+', name).group()))
+    return [os.path.join(directory, name) for name in names]
+
+def validate_level(data, source='<level>'):
+    def fail(message):
+        raise ValueError(f'{source}: {message}')
+    
+    def check_rows(field, fields, types=None):
+        rows = data.get(field, [])
+        if not isinstance(rows, list):
+            fail(f'"{field}" 必须是列表')
+        for i, row in enumerate(rows):
+            if not isinstance(row, list) or len(row) != len(fields):
+                fail(f'"{field}"[{i}] 应为 {fields}')
+            for value, name in zip(row, fields):
+                if name == 'type':
+                    if value not in types:
+                        fail(f'"{field}"[{i}] 未知类型 {value!r}, 可选: {", ".join(types)}')
+                elif not isinstance(value, int) or isinstance(value, bool):
+                    fail(f'"{field}"[{i}] 的 {name} 必须是整数')
+        return rows
+    
+    if not isinstance(data, dict):
+        fail('关卡文件的顶层必须是对象')
+    width = data.get('width', SCREEN_WIDTH)
+    if not isinstance(width, int) or width < SCREEN_WIDTH:
+        fail(f'"width" 必须是不小于 {SCREEN_WIDTH} 的整数')
+    player = data.get('player', [50, SCREEN_HEIGHT - 150])
+    if not (isinstance(player, list) and len(player) == 2 and all(isinstance(v, int) for v in player)):
+        fail('"player" 应为 [x, y]')
+    
+    level = {
+        'name': str(data.get('name', '')),
+        'width': width,
+        'player': tuple(player),
+        'platforms': check_rows('platforms', ('x', 'y', 'width', 'height', 'type'), PLATFORM_TYPES),
+        'coins': check_rows('coins', ('x', 'y')),
+        'keys': check_rows('keys', ('x', 'y')),
+        'enemies': check_rows('enemies', ('x', 'y', 'type'), ENEMY_TYPES),
+        'powerups': check_rows('powerups', ('x', 'y', 'type'), POWERUP_TYPES),
+        'flags': check_rows('flags', ('x', 'y')),
+    }
+    for field, rows in level.items():
+        if isinstance(rows, list):
+            level[field] = [tuple(row) for row in rows]
+    if not level['flags']:
+        fail('关卡至少需要一面旗帜')
+    return level
+
+def load_level_file(path):
+    with open(path, encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'{path}: JSON 格式错误: {e}') from e
+    return validate_level(data, path)
+
+class SpritePool:
+    # 同类精灵的对象池: 精灵被收集/消灭、移出视野或换关后放回池中, 再次创建时调用 reset 重新初始化,
+    # 避免反复分配精灵对象 (及其 Rect 和组字典), 减少垃圾回收; 池中最多保留 max_size 个, 多出的直接丢弃
+    def __init__(self, factory, max_size=1024):
+        self.factory = factory
+        self.max_size = max_size
+        self.free = []
+        self.created = 0
+        self.reused = 0
+        self.dropped = 0
+    
+    def __len__(self):
+        return len(self.free)
+    
+    def acquire(self, *args):
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            self.reused += 1
+            return sprite
+        self.created += 1
+        return self.factory(*args)
+    
+    def release(self, sprite):
+        sprite.kill()
+        if len(self.free) < self.max_size:
+            self.free.append(sprite)
+        else:
+            self.dropped += 1
+    
+    def stats(self):
+        total = self.created + self.reused
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'dropped': self.dropped,
+            'free': len(self.free),
+            'reuse_rate': self.reused / total if total else 0.0,
+        }
+
+class Camera:
+    # 水平卷轴摄像机, 以玩家为中心并限制在关卡范围内
+    def __init__(self, world_width, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        self.world_width = world_width
+        self.x = 0
+        self.view = pygame.Rect(0, 0, width, height)
+    
+    def follow(self, rect):
+        x = rect.centerx - self.view.width // 2
+        self.x = max(0, min(x, self.world_width - self.view.width))
+        self.view.x = self.x
+    
+    def apply(self, rect):
+        return rect.move(-self.x, 0)
+
+class LevelTemplate:
+    # 关卡的初始状态: 校验过的数据和流式加载用的记录/区块索引; 换关和重开时复制一份, 不再重新解析
+    def __init__(self, path):
+        self.path = path
+        self.data = load_level_file(path)
+        self.records, self.chunks = LevelStreamer.index(self.data)
+        # 快照校验用的坐标范围 (left, top, right, bottom): 关卡区域和所有实体的初始位置, 四周再留出一屏
+        xs = [0, self.data['width'], self.data['player'][0]] + [record[1] for record in self.records.values()]
+        ys = [0, SCREEN_HEIGHT, self.data['player'][1]] + [record[2] for record in self.records.values()]
+        self.bounds = (min(xs) - SCREEN_WIDTH, min(ys) - SCREEN_HEIGHT, max(xs) + SCREEN_WIDTH, max(ys) + SCREEN_HEIGHT)
+    
+    def clone(self):
+        # 只有平台和敌人的记录会改变 (列表), 其余记录是元组, 各次加载共用同一份
+        records = {record_id: list(record) if isinstance(record, list) else record
+                   for record_id, record in self.records.items()}
+        chunks = defaultdict(set, {chunk: set(ids) for chunk, ids in self.chunks.items()})
+        return records, chunks
+    
+    def warm_images(self):
+        # 预先渲染本关卡会用到的所有贴图, 换关时精灵只需从 IMAGE_CACHE 取图
+        for w, h, ptype in {(w, h, ptype) for _, _, w, h, ptype in self.data['platforms']}:
+            platform = Platform(0, 0, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
+            platform.hit()
+        if self.data['coins']:
+            coin = Coin(0, 0)
+            for spinning in (False, True):
+                for glow in (False, True):
+                    coin.draw_coin(spinning, glow)
+        if self.data['keys']:
+            Key(0, 0).draw_key(True)
+        for etype in {etype for _, _, etype in self.data['enemies']}:
+            for shell_color in ((None,) if etype == 'goomba' else (GREEN, RED)):
+                Enemy(0, 0, etype, shell_color)
+        for ptype in {ptype for _, _, ptype in self.data['powerups']}:
+            PowerUp(0, 0, ptype)
+        Flag(0, 0)
+    
+    @classmethod
+    def prepare(cls, path):
+        template = cls(path)
+        template.warm_images()
+        return template
+
+class LevelStreamer:
+    # 关卡按固定宽度切分为区块, 区块进入视野附近时创建精灵, 远离时释放精灵并只保留紧凑的记录
+    CHUNK_WIDTH = 400
+    ENEMY_SWEEP_INTERVAL = 30
+    # 视野外的金币分几帧陆续创建, 换关时不必一次创建上千个精灵; 金币不消耗随机数, 晚几帧创建不影响玩法
+    SPAWN_BUDGET = 200
+    NEAR_VIEW = 64
+    
+    def __init__(self, game, template, margin=CHUNK_WIDTH):
+        self.game = game
+        self.template = template
+        self.margin = margin
+        self.records, self.chunks = template.clone()
+        self.live = {}
+        self.enemy_ids = {}
+        self.pending = set()
+        self.active = set()
+        self.frame = 0
+    
+    @classmethod
+    def index(cls, data):
+        records = {}
+        chunks = defaultdict(set)
+        rows = []
+        rows += [['platform', x, y, w, h, ptype, True] for x, y, w, h, ptype in data['platforms']]
+        rows += [('coin', x, y) for x, y in data['coins']]
+        rows += [('key', x, y) for x, y in data['keys']]
+        rows += [['enemy', x, y, etype, -2, 0, None] for x, y, etype in data['enemies']]
+        rows += [('powerup', x, y, ptype) for x, y, ptype in data['powerups']]
+        rows += [('flag', x, y) for x, y in data['flags']]
+        for record_id, record in enumerate(rows):
+            records[record_id] = record
+            for chunk in cls.record_chunks(record):
+                chunks[chunk].add(record_id)
+        return records, chunks
+    
+    @classmethod
+    def record_chunks(cls, record):
+        first = record[1] // cls.CHUNK_WIDTH
+        last = (record[1] + record[3] - 1) // cls.CHUNK_WIDTH if record[0] == 'platform' else first
+        return range(first, last + 1)
+    
+    def update(self, view):
+        self.frame += 1
+        first = (view.left - self.margin) // self.CHUNK_WIDTH
+        last = (view.right + self.margin - 1) // self.CHUNK_WIDTH
+        active = set(range(first, last + 1))
+        if active != self.active:
+            released = self.active - active
+            self.active = active
+            for chunk in released:
+                for record_id in list(self.chunks.get(chunk, ())):
+                    record = self.records.get(record_id)
+                    if record is None or record[0] == 'enemy' or record_id not in self.live:
+                        continue
+                    if not any(c in active for c in self.record_chunks(record)):
+                        self.release(record_id)
+            loading = set()
+            for chunk in active:
+                loading.update(self.chunks.get(chunk, ()))
+            loading.difference_update(self.live)
+            for record_id in sorted(loading):
+                record = self.records[record_id]
+                if record[0] == 'coin' and not self.near_view(view, record):
+                    self.pending.add(record_id)
+                else:
+                    self.spawn(record_id)
+            self.sweep_enemies()
+        elif self.frame % self.ENEMY_SWEEP_INTERVAL == 0:
+            self.sweep_enemies()
+        else:
+            self.release_strays()
+        if self.pending:
+            self.spawn_pending(view)
+    
+    def near_view(self, view, record):
+        return view.left - self.NEAR_VIEW <= record[1] <= view.right + self.NEAR_VIEW
+    
+    def spawn_pending(self, view):
+        # 靠近视野的立即创建, 其余每帧最多创建 SPAWN_BUDGET 个
+        budget = self.SPAWN_BUDGET
+        for record_id in sorted(self.pending):
+            record = self.records.get(record_id)
+            if record is None or record_id in self.live or not any(c in self.active for c in self.record_chunks(record)):
+                self.pending.discard(record_id)
+                continue
+            if budget <= 0 and not self.near_view(view, record):
+                continue
+            self.pending.discard(record_id)
+            self.spawn(record_id)
+            budget -= 1
+    
+    def loaded_range(self):
+        return min(self.active) * self.CHUNK_WIDTH, (max(self.active) + 1) * self.CHUNK_WIDTH
+    
+    def sweep_enemies(self):
+        # 敌人会走动, 按当前位置决定是否释放; 已被消灭的也在这里释放
+        left, right = self.loaded_range()
+        for sprite, record_id in list(self.enemy_ids.items()):
+            if not sprite.alive() or sprite.rect.left < left or sprite.rect.right > right:
+                self.release(record_id)
+    
+    def release_strays(self):
+        # 每帧检查场上的敌人: 走出已加载区块的立即释放 (记录保留位置和速度, 区块再次加载时原样出现)。
+        # 否则它脚下的平台没有加载, 会一直掉出屏幕, 被当成消灭
+        enemies = self.game.enemies
+        count = len(enemies.members)
+        if not count:
+            return
+        left, right = self.loaded_range()
+        pos = enemies.pos[:count, 0]
+        strays = np.flatnonzero((pos < left) | (pos + enemies.size[:count, 0] > right))
+        if len(strays):
+            members = enemies.members
+            for sprite in [members[slot] for slot in strays.tolist()]:
+                self.release(self.enemy_ids[sprite])
+    
+    def spawn(self, record_id, alive=True):
+        record = self.records[record_id]
+        kind = record[0]
+        game = self.game
+        if kind == 'platform':
+            _, x, y, w, h, ptype, has_item = record
+            sprite = Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
+            if ptype == 'mystery' and not has_item:
+                sprite.hit()
+            group = game.platforms
+        elif kind == 'coin':
+            sprite = game.pools['coin'].acquire(record[1], record[2])
+            group = game.coins
+        elif kind == 'key':
+            sprite = Key(record[1], record[2], game.rng)
+            group = game.keys
+        elif kind == 'enemy':
+            _, x, y, etype, vel_x, vel_y, shell_color = record
+            sprite = game.pools['enemy'].acquire(x, y, etype, shell_color, game.rng)
+            sprite.vel_x = vel_x
+            sprite.vel_y = vel_y
+            group = game.enemies
+            self.enemy_ids[sprite] = record_id
+        elif kind == 'powerup':
+            sprite = game.pools['powerup'].acquire(record[1], record[2], record[3], game.rng)
+            group = game.powerups
+        else:
+            sprite = Flag(record[1], record[2])
+            group = game.flags
+        if alive:
+            # 新建或取自对象池的精灵不在任何组里, 直接登记, 省去 Group.add 的检查
+            for target in (group, game.all_sprites):
+                target.add_internal(sprite)
+                sprite.add_internal(target)
+        self.live[record_id] = sprite
+        return sprite
+    
+    def release(self, record_id):
+        sprite = self.live.pop(record_id)
+        record = self.records[record_id]
+        if record[0] == 'enemy':
+            del self.enemy_ids[sprite]
+        for chunk in self.record_chunks(record):
+            self.chunks[chunk].discard(record_id)
+        pool = self.game.pools.get(record[0])
+        if not sprite.alive():
+            # 已被收集或消灭, 不再保留
+            del self.records[record_id]
+        else:
+            if record[0] == 'platform':
+                record[6] = getattr(sprite, 'has_item', True)
+            elif record[0] == 'enemy':
+                record[1:3] = sprite.rect.topleft
+                record[4:7] = [sprite.vel_x, sprite.vel_y, sprite.shell_color]
+            for chunk in self.record_chunks(record):
+                self.chunks[chunk].add(record_id)
+            sprite.kill()
+        if pool is not None:
+            pool.release(sprite)
+    
+    def remove_record(self, record_id):
+        for chunk in self.record_chunks(self.records.pop(record_id)):
+            self.chunks[chunk].discard(record_id)
+    
+    def move_record(self, record_id, x, y, state):
+        # 更新敌人记录的位置和速度/颜色, 并同步区块索引
+        record = self.records[record_id]
+        for chunk in self.record_chunks(record):
+            self.chunks[chunk].discard(record_id)
+        record[1:3] = [x, y]
+        record[4:7] = state
+        for chunk in self.record_chunks(record):
+            self.chunks[chunk].add(record_id)
+    
+    def recycle(self):
+        # 换关时把仍在场上的和已被收集/消灭的精灵都放回对象池; 各精灵组随后整体丢弃, 先一次性清空
+        game = self.game
+        for group in (game.all_sprites, game.platforms, game.enemies, game.coins, game.powerups, game.keys, game.flags):
+            group.empty()
+        pools = game.pools
+        for record_id, sprite in self.live.items():
+            pool = pools.get(self.records[record_id][0])
+            if pool is not None:
+                pool.release(sprite)
+        self.live = {}
+        self.enemy_ids = {}
+
+class InputSource:
+    # 每帧提供一次按键状态, 返回值支持 keys[pygame.K_xxx] 索引
+    def poll(self):
+        raise NotImplementedError
+
+class KeyboardInput(InputSource):
+    def poll(self):
+        return pygame.key.get_pressed()
+
+class ScriptedInput(InputSource):
+    # 无窗口模式下由外部(机器人/测试)写入按键状态
     def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Super Kitten Adventure - 超级小猫冒险")
+        self.keys = defaultdict(bool)
+    
+    def poll(self):
+        return self.keys
+
+class ReplayInput(InputSource):
+    # 按录像逐帧回放按键
+    def __init__(self, log):
+        self.log = log
+        self.index = 0
+    
+    @property
+    def finished(self):
+        return self.index >= len(self.log.frames)
+    
+    def poll(self):
+        mask = self.log.frames[self.index] if not self.finished else 0
+        self.index += 1
+        return InputLog.decode(mask)
+    
+    def take_restart(self):
+        if not self.finished and self.log.frames[self.index] == InputLog.RESTART:
+            self.index += 1
+            return True
+        return False
+
+class InputLog:
+    # 录像: 每个游戏帧一个字节的按键位掩码, zlib 压缩后存盘; 文件头记录随机种子、起始关卡和结束时的状态校验值
+    MAGIC = b'KRPL'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHIHI')
+    KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP)
+    RESTART = 0xFF
+    
+    def __init__(self, seed, level, frames=None, checksum=0):
+        self.seed = seed
+        self.level = level
+        self.frames = bytearray(frames or b'')
+        self.checksum = checksum
+    
+    @classmethod
+    def encode(cls, keys):
+        mask = 0
+        for bit, key in enumerate(cls.KEYS):
+            if keys[key]:
+                mask |= 1 << bit
+        return mask
+    
+    @classmethod
+    def decode(cls, mask):
+        keys = defaultdict(bool)
+        for bit, key in enumerate(cls.KEYS):
+            keys[key] = bool(mask >> bit & 1)
+        return keys
+    
+    def record(self, keys):
+        self.frames.append(self.encode(keys))
+    
+    def mark_restart(self):
+        self.frames.append(self.RESTART)
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.level, self.checksum))
+            f.write(zlib.compress(bytes(self.frames), 9))
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            blob = f.read()
+        if len(blob) < cls.HEADER.size:
+            raise ValueError(f'{path}: 录像文件不完整')
+        magic, version, seed, level, checksum = cls.HEADER.unpack_from(blob)
+        if magic != cls.MAGIC:
+            raise ValueError(f'{path}: 不是录像文件')
+        if version != cls.VERSION:
+            raise ValueError(f'{path}: 不支持的录像版本 {version}')
+        try:
+            frames = zlib.decompress(blob[cls.HEADER.size:])
+        except zlib.error as e:
+            raise ValueError(f'{path}: 录像数据损坏 ({e})') from e
+        return cls(seed, level, frames, checksum)
+
+class Snapshot:
+    # 完整模拟状态的二进制快照: 玩家、镜头、得分与钥匙进度、流式加载的记录 (已移除的、改变过的、待创建的)、
+    # 场上每个实体的状态 (按创建顺序, 保证碰撞顺序一致) 和玩法随机数; 粒子和装饰随机数不影响玩法, 不保存。
+    # 双人合作时 1P 之后紧跟 2P 的状态
+    MAGIC = b'KSNP'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHBiHBHiB')
+    PLAYER = struct.Struct('<iiddBBIiBiI')
+    STREAMER = struct.Struct('<IiiIIIII')
+    ENTRY = struct.Struct('<IB')
+    ENEMY = struct.Struct('<IiiddB')
+    STATES = {
+        'platform': struct.Struct('<B'),
+        'coin': struct.Struct('<i'),
+        'key': struct.Struct('<idi'),
+        'enemy': struct.Struct('<iiddB'),
+        'powerup': struct.Struct('<id'),
+        'flag': struct.Struct('<'),
+    }
+    RNG = struct.Struct('<625IBd')
+    GAME_STATES = ('start', 'playing', 'game_over')
+    SHELL_COLORS = (None, GREEN, RED)
+    # 速度的合理上限, 远大于游戏里出现的速度 (跳跃 15, 下落 15, 行走 5)
+    MAX_SPEED = 100
+    
+    @classmethod
+    def ids(cls, values):
+        return struct.pack(f'<{len(values)}I', *values)
+    
+    @classmethod
+    def capture(cls, game):
+        if game.game_state == 'start':
+            raise ValueError('游戏还没有开始, 无法保存快照')
+        streamer = game.streamer
+        template = streamer.template
+        records = streamer.records
+        live = streamer.live
+        shells = cls.SHELL_COLORS
+        
+        removed = [record_id for record_id in template.records if record_id not in records]
+        used_blocks = []
+        enemies = []
+        for record_id, record in records.items():
+            if record_id in live or not isinstance(record, list):
+                continue
+            if record[0] == 'platform':
+                if not record[6]:
+                    used_blocks.append(record_id)
+            elif record != template.records[record_id]:
+                _, x, y, _, vel_x, vel_y, shell_color = record
+                enemies.append(cls.ENEMY.pack(record_id, x, y, vel_x, vel_y, shells.index(shell_color)))
+        
+        entries = []
+        for record_id, sprite in live.items():
+            kind = records[record_id][0]
+            entries.append(cls.ENTRY.pack(record_id, sprite.alive()))
+            if kind == 'platform':
+                state = (getattr(sprite, 'has_item', True),)
+            elif kind == 'coin':
+                state = (sprite.timer,)
+            elif kind == 'key':
+                state = (sprite.rect.y, sprite.float_wave, sprite.glow_timer)
+            elif kind == 'enemy':
+                state = (*sprite.rect.topleft, sprite.vel_x, sprite.vel_y, shells.index(sprite.shell_color))
+            elif kind == 'powerup':
+                state = (sprite.rect.y, sprite.float_wave)
+            else:
+                state = ()
+            entries.append(cls.STATES[kind].pack(*state))
+        
+        active = sorted(streamer.active)
+        first, last = (active[0], active[-1]) if active else (0, -1)
+        _, mt_state, gauss = game.rng.getstate()
+        return b''.join([
+            cls.HEADER.pack(cls.MAGIC, cls.VERSION, game.current_level, cls.GAME_STATES.index(game.game_state),
+                            game.score, game.keys_collected, game.key_obtained, game.key_warning_timer, game.camera.x,
+                            len(game.players)),
+            *[cls.PLAYER.pack(*player.rect.topleft, player.vel_x, player.vel_y, player.on_ground, player.facing_right,
+                              player.animation_frame, player.lives, player.invincible, player.invincible_timer,
+                              player.blocks_hit) for player in game.players],
+            cls.STREAMER.pack(streamer.frame, first, last, len(removed), len(used_blocks), len(enemies),
+                              len(streamer.pending), len(live)),
+            cls.ids(removed), cls.ids(used_blocks), b''.join(enemies), cls.ids(sorted(streamer.pending)),
+            b''.join(entries),
+            cls.RNG.pack(*mt_state, gauss is not None, gauss or 0.0),
+        ])
+    
+    @classmethod
+    def restore(cls, game, blob):
+        # 先完整解码并校验整个快照, 全部通过后才改动游戏状态; 数据有误时游戏保持原样
+        try:
+            snapshot = cls.decode(game, blob)
+        except (struct.error, KeyError, IndexError) as e:
+            raise ValueError(f'快照数据损坏 ({e})') from e
+        cls.apply(game, snapshot)
+    
+    @classmethod
+    def decode(cls, game, blob):
+        if len(blob) < cls.HEADER.size:
+            raise ValueError('快照数据不完整')
+        magic, version, level, state, score, keys_collected, key_obtained, key_warning_timer, camera_x, players = \
+            cls.HEADER.unpack_from(blob)
+        if magic != cls.MAGIC:
+            raise ValueError('不是快照数据')
+        if version != cls.VERSION:
+            raise ValueError(f'不支持的快照版本 {version}')
+        if not 1 <= level <= len(game.level_files):
+            raise ValueError(f'快照中的关卡 {level} 不存在')
+        if players != 1 + game.coop:
+            raise ValueError(f'快照是 {players} 人游戏, 与当前模式不符')
+        if state >= len(cls.GAME_STATES):
+            raise ValueError(f'快照中的游戏状态 {state} 无效')
+        template = game.level_template(level)
+        shells = cls.SHELL_COLORS
+        left, top, right, bottom = template.bounds
+        
+        def position(x, y, what):
+            if not (left <= x <= right and top <= y <= bottom):
+                raise ValueError(f'快照中{what}的位置 ({x}, {y}) 超出关卡范围')
+        
+        def speeds(values, what):
+            for value in values:
+                if not math.isfinite(value) or abs(value) > cls.MAX_SPEED:
+                    raise ValueError(f'快照中{what}的速度 {value} 无效')
+        
+        def finite(value, what):
+            if not math.isfinite(value):
+                raise ValueError(f'快照中{what} {value} 无效')
+        
+        if not left <= camera_x <= right:
+            raise ValueError(f'快照中的镜头位置 {camera_x} 超出关卡范围')
+        offset = cls.HEADER.size
+        player_states = []
+        for _ in range(players):
+            player_state = cls.PLAYER.unpack_from(blob, offset)
+            offset += cls.PLAYER.size
+            position(*player_state[:2], '玩家')
+            speeds(player_state[2:4], '玩家')
+            player_states.append(player_state)
+        frame, first, last, n_removed, n_used, n_enemies, n_pending, n_live = cls.STREAMER.unpack_from(blob, offset)
+        offset += cls.STREAMER.size
+        # 已加载的区块最多覆盖视野加两侧余量
+        if last - first > (SCREEN_WIDTH + 2 * LevelStreamer.CHUNK_WIDTH) // LevelStreamer.CHUNK_WIDTH + 1:
+            raise ValueError(f'快照中的区块范围 {first}..{last} 无效')
+        gone = set()
+        
+        def read_ids(count, kind=None):
+            nonlocal offset
+            values = struct.unpack_from(f'<{count}I', blob, offset)
+            offset += 4 * count
+            for record_id in values:
+                record_kind(record_id, kind)
+            return values
+        
+        def record_kind(record_id, kind=None):
+            record = template.records.get(record_id)
+            if record is None or record_id in gone:
+                raise ValueError(f'快照中的记录 {record_id} 不在关卡 {level} 中')
+            if kind is not None and record[0] != kind:
+                raise ValueError(f'快照中的记录 {record_id} 不是 {kind}')
+            return record[0]
+        
+        def shell_color(index):
+            if index >= len(shells):
+                raise ValueError(f'快照中的龟壳颜色 {index} 无效')
+            return shells[index]
+        
+        removed = read_ids(n_removed)
+        gone.update(removed)
+        if len(gone) != len(removed):
+            raise ValueError('快照中的已移除记录有重复')
+        used_blocks = read_ids(n_used, 'platform')
+        enemies = []
+        for _ in range(n_enemies):
+            record_id, x, y, vel_x, vel_y, shell = cls.ENEMY.unpack_from(blob, offset)
+            offset += cls.ENEMY.size
+            record_kind(record_id, 'enemy')
+            position(x, y, '敌人')
+            speeds((vel_x, vel_y), '敌人')
+            enemies.append((record_id, x, y, [vel_x, vel_y, shell_color(shell)]))
+        pending = read_ids(n_pending)
+        
+        live = []
+        for _ in range(n_live):
+            record_id, alive = cls.ENTRY.unpack_from(blob, offset)
+            offset += cls.ENTRY.size
+            kind = record_kind(record_id)
+            layout = cls.STATES[kind]
+            values = layout.unpack_from(blob, offset)
+            offset += layout.size
+            if kind == 'enemy':
+                x, y, vel_x, vel_y, shell = values
+                position(x, y, '敌人')
+                speeds((vel_x, vel_y), '敌人')
+                values = (x, y, [vel_x, vel_y, shell_color(shell)])
+            elif kind in ('key', 'powerup'):
+                position(template.records[record_id][1], values[0], '钥匙' if kind == 'key' else '道具')
+                finite(values[1], '浮动相位')
+            live.append((record_id, kind, alive, values))
+        if len({record_id for record_id, *_ in live}) != len(live):
+            raise ValueError('快照中的实体有重复')
+        
+        *mt_state, has_gauss, gauss = cls.RNG.unpack_from(blob, offset)
+        offset += cls.RNG.size
+        if offset != len(blob):
+            raise ValueError('快照数据长度不符')
+        if mt_state[-1] > len(mt_state) - 1:
+            raise ValueError('快照中的随机数状态无效')
+        finite(gauss, '随机数状态')
+        return {
+            'level': level, 'state': cls.GAME_STATES[state], 'template': template, 'score': score,
+            'keys_collected': keys_collected, 'key_obtained': bool(key_obtained),
+            'key_warning_timer': key_warning_timer, 'camera_x': camera_x, 'players': player_states,
+            'frame': frame, 'active': range(first, last + 1), 'removed': removed, 'used_blocks': used_blocks,
+            'enemies': enemies, 'pending': pending, 'live': live,
+            'rng': (3, tuple(mt_state), gauss if has_gauss else None),
+        }
+    
+    @classmethod
+    def apply(cls, game, snapshot):
+        game.current_level = snapshot['level']
+        game.game_state = snapshot['state']
+        game.begin_level(snapshot['template'])
+        streamer = game.streamer
+        records = streamer.records
+        for record_id in snapshot['removed']:
+            streamer.remove_record(record_id)
+        for record_id in snapshot['used_blocks']:
+            records[record_id][6] = False
+        for record_id, x, y, state in snapshot['enemies']:
+            streamer.move_record(record_id, x, y, state)
+        streamer.frame = snapshot['frame']
+        streamer.active = set(snapshot['active'])
+        streamer.pending = set(snapshot['pending'])
+        
+        for record_id, kind, alive, values in snapshot['live']:
+            # 平台和敌人的状态先写进记录, 创建出的精灵就是快照时的样子
+            if kind == 'platform':
+                records[record_id][6] = bool(values[0])
+            elif kind == 'enemy':
+                streamer.move_record(record_id, *values)
+            # 已被收集或消灭、尚未释放的精灵只占位, 不加入精灵组
+            sprite = streamer.spawn(record_id, alive)
+            if kind == 'coin':
+                sprite.timer = values[0]
+                sprite.draw_coin(sprite.timer % 20 >= 10, (sprite.timer // 10) % 2 == 0)
+            elif kind == 'key':
+                sprite.rect.y, sprite.float_wave, sprite.glow_timer = values
+                sprite.draw_key(sprite.glow_timer < 25)
+                if alive:
+                    game.keys.reindex(sprite)
+            elif kind == 'powerup':
+                sprite.rect.y, sprite.float_wave = values
+                if alive:
+                    game.powerups.reindex(sprite)
+        
+        for player, player_state in zip(game.players, snapshot['players']):
+            (x, y, player.vel_x, player.vel_y, on_ground, facing_right, player.animation_frame, player.lives,
+             invincible, player.invincible_timer, player.blocks_hit) = player_state
+            player.rect.topleft = (x, y)
+            player.on_ground = bool(on_ground)
+            player.invincible = bool(invincible)
+            if player.facing_right != bool(facing_right):
+                player.facing_right = bool(facing_right)
+                player.draw_kitten()
+        
+        game.rng.setstate(snapshot['rng'])
+        game.score = snapshot['score']
+        game.keys_collected = snapshot['keys_collected']
+        game.key_obtained = snapshot['key_obtained']
+        game.key_warning_timer = snapshot['key_warning_timer']
+        game.camera.x = game.camera.view.x = snapshot['camera_x']
+
+class FramePacing:
+    # 帧节奏统计: 实际帧间隔的平均值/抖动 (标准差)/分位数, 以及每帧推进的模拟步数和被丢弃的积压时间
+    def __init__(self, history=600):
+        self.intervals = deque(maxlen=history)
+        self.steps = deque(maxlen=history)
+        self.frames = 0
+        self.catch_up_frames = 0
+        self.idle_frames = 0
+        self.dropped_ms = 0.0
+    
+    def record(self, interval_ms, steps, dropped_ms):
+        self.frames += 1
+        self.intervals.append(interval_ms)
+        self.steps.append(steps)
+        if steps > 1:
+            self.catch_up_frames += 1
+        elif steps == 0:
+            self.idle_frames += 1
+        self.dropped_ms += dropped_ms
+    
+    def summary(self):
+        intervals = np.array(self.intervals) if self.intervals else np.zeros(1)
+        return {
+            'frames': self.frames,
+            'interval_ms': float(intervals.mean()),
+            'jitter_ms': float(intervals.std()),
+            'p99_ms': float(np.percentile(intervals, 99)),
+            'max_ms': float(intervals.max()),
+            'catch_up_frames': self.catch_up_frames,
+            'idle_frames': self.idle_frames,
+            'dropped_ms': self.dropped_ms,
+        }
+    
+    def report(self):
+        stats = self.summary()
+        print(f"帧节奏: 平均间隔 {stats['interval_ms']:.2f} ms  抖动 {stats['jitter_ms']:.2f} ms  "
+              f"p99 {stats['p99_ms']:.2f} ms  最长 {stats['max_ms']:.2f} ms | "
+              f"{stats['frames']} 帧中追帧 {stats['catch_up_frames']} 帧, 无模拟步 {stats['idle_frames']} 帧, "
+              f"丢弃 {stats['dropped_ms']:.0f} ms")
+
+class FrameProfiler:
+    # 逐帧分阶段计时: F3 开关并显示曲线, F4 导出 CSV/JSON, F5 开始/停止 cProfile 采样
+    PHASE_COLORS = {
+        'idle': (90, 90, 90),
+        'events': (200, 200, 200),
+        'player': (255, 120, 120),
+        'streaming': (255, 180, 80),
+        'enemies': (255, 230, 90),
+        'coins': (230, 200, 60),
+        'powerups': (255, 120, 220),
+        'keys': (255, 210, 150),
+        'particles': (150, 220, 255),
+        'pickups': (200, 160, 255),
+        'background': (120, 200, 120),
+        'sprites': (80, 160, 255),
+        'particles_draw': (100, 240, 240),
+        'hud': (240, 240, 140),
+        'capture': (255, 150, 60),
+        'flip': (255, 255, 255),
+    }
+    
+    def __init__(self, history=300, capture_frames=300):
+        self.enabled = False
+        self.frames = deque(maxlen=history)
+        self.current = {}
+        self.last = 0.0
+        self.frame_start = 0.0
+        self.frame_index = 0
+        self.capture_frames = capture_frames
+        self.capture = None
+        self.capture_left = 0
+    
+    def begin_frame(self):
+        self.frame_index += 1
+        if self.enabled:
+            self.current = {}
+            self.frame_start = self.last = time.perf_counter()
+        if self.capture is not None:
+            self.capture_left -= 1
+            if self.capture_left < 0:
+                self.stop_capture()
+    
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+    
+    def end_frame(self, counts):
+        if not self.enabled:
+            return
+        record = {'frame': self.frame_index, 'total': (time.perf_counter() - self.frame_start) * 1000}
+        record.update(self.current)
+        record.update(counts)
+        self.frames.append(record)
+    
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frames.clear()
+    
+    def averages(self):
+        totals = defaultdict(float)
+        for record in self.frames:
+            for phase in self.PHASE_COLORS:
+                totals[phase] += record.get(phase, 0.0)
+        count = max(1, len(self.frames))
+        return {phase: total / count for phase, total in totals.items()}
+    
+    def export(self, path):
+        records = list(self.frames)
+        if path.endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, indent=1)
+        else:
+            fields = []
+            for record in records:
+                fields.extend(field for field in record if field not in fields)
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fields, restval=0)
+                writer.writeheader()
+                writer.writerows(records)
+        return len(records)
+    
+    def toggle_capture(self):
+        if self.capture is None:
+            self.capture = cProfile.Profile()
+            self.capture_left = self.capture_frames
+            self.capture.enable()
+            print(f"cProfile 采样开始 (最多 {self.capture_frames} 帧)")
+        else:
+            self.stop_capture()
+    
+    def stop_capture(self):
+        self.capture.disable()
+        path = time.strftime('profile_%Y%m%d_%H%M%S.prof')
+        self.capture.dump_stats(path)
+        stats = pstats.Stats(self.capture)
+        stats.sort_stats('cumulative').print_stats(15)
+        self.capture = None
+        print(f"cProfile 采样已保存: {path}")
+    
+    def draw(self, surface, font, text_cache):
+        # 右上角的堆叠柱状图, 每列一帧, 16.7 ms 参考线
+        width, height = 300, 120
+        x0 = surface.get_width() - width - 5
+        y0 = 5
+        area = pygame.Rect(x0, y0, width, height + 20 + 15 * 5)
+        surface.fill((20, 20, 30), area)
+        scale = height / 33.3
+        frames = list(self.frames)[-width:]
+        for i, record in enumerate(frames):
+            y = y0 + height
+            for phase, color in self.PHASE_COLORS.items():
+                value = record.get(phase, 0.0)
+                if value <= 0:
+                    continue
+                bar = max(1, int(value * scale))
+                pygame.draw.line(surface, color, (x0 + i, y), (x0 + i, max(y0, y - bar)))
+                y -= bar
+                if y <= y0:
+                    break
+        budget_y = y0 + height - int(1000 / FPS * scale)
+        pygame.draw.line(surface, (255, 80, 80), (x0, budget_y), (x0 + width, budget_y))
+        
+        if frames:
+            last = frames[-1]
+            summary = f"{last['total']:.1f} ms  实体 {last.get('n_entities', 0)}  粒子 {last.get('n_particles', 0)}"
+            surface.blit(text_cache.render(font, summary, WHITE), (x0 + 4, y0 + height + 2))
+        top = sorted(self.averages().items(), key=lambda item: -item[1])[:5]
+        for i, (phase, value) in enumerate(top):
+            label = text_cache.render(font, f'{phase}: {value:.2f} ms', self.PHASE_COLORS[phase])
+            surface.blit(label, (x0 + 4, y0 + height + 20 + i * 15))
+        return area
+
+class ClipRecorder:
+    # 即时回放: 最近 seconds 秒的画面 (按 fps 抽帧、缩小 scale 倍) 以原始 32 位像素存在预先分配的环形缓冲区里,
+    # 每帧只做一次内存拷贝, 不分配像素内存。导出 (F8) 在后台线程中进行, 不阻塞游戏循环; 每个槽位记录帧序号,
+    # 导出途中被新画面覆盖的帧会被跳过并计数。压缩格式对相邻帧做异或差分后 zlib 压缩
+    MAGIC = b'KCLP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHHIBBBBdII')
+    FRAME = struct.Struct('<QdI')
+    
+    def __init__(self, screen, seconds=10, fps=30, scale=2, compress=True):
+        if screen.get_bytesize() != 4:
+            raise ValueError('即时回放只支持 32 位色深的画面')
+        if seconds <= 0 or fps <= 0 or scale < 1:
+            raise ValueError('即时回放的秒数、帧率必须大于 0, 缩小倍数至少为 1')
+        width, height = screen.get_size()
+        self.size = (max(1, width // scale), max(1, height // scale))
+        # 缩小时先缩放到固定的中间 Surface, 同样不分配内存
+        self.scaled = pygame.Surface(self.size, 0, screen) if scale > 1 else None
+        source = self.scaled or screen
+        self.pitch = source.get_pitch()
+        self.shifts = source.get_shifts()[:3]
+        self.fps = fps
+        self.interval = 1 / fps
+        self.compress = compress
+        self.capacity = max(1, round(seconds * fps))
+        self.frames = np.zeros((self.capacity, self.pitch * self.size[1]), np.uint8)
+        self.seqs = np.full(self.capacity, -1, np.int64)
+        self.times = np.zeros(self.capacity)
+        self.seq = 0
+        self.last = -math.inf
+        self.export_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='clip-export')
+        self.exporting = None
+    
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+    
+    def capture(self, surface, now):
+        if now - self.last < self.interval:
+            return False
+        self.last = now
+        if self.scaled is not None:
+            pygame.transform.scale(surface, self.size, self.scaled)
+            surface = self.scaled
+        slot = self.seq % self.capacity
+        # 写入期间序号为 -1, 导出线程据此判断读到的帧是否完整
+        self.seqs[slot] = -1
+        np.copyto(self.frames[slot], np.frombuffer(surface.get_buffer(), np.uint8))
+        self.times[slot] = now
+        self.seqs[slot] = self.seq
+        self.seq += 1
+        return True
+    
+    @property
+    def busy(self):
+        return self.exporting is not None and not self.exporting.done()
+    
+    def export(self, path):
+        # 导出当前缓冲区中的全部帧; 上一次导出还没完成时返回 None
+        if self.busy or self.seq == 0:
+            return None
+        first = max(0, self.seq - self.capacity)
+        self.exporting = self.export_pool.submit(self.write_clip, path, first, self.seq)
+        return self.exporting
+    
+    def write_clip(self, path, first, end):
+        frame = np.empty(self.frames.shape[1], np.uint8)
+        previous = np.zeros_like(frame)
+        written = skipped = 0
+        with open(path, 'wb') as f:
+            f.write(self.header(0, 0))
+            for seq in range(first, end):
+                slot = seq % self.capacity
+                if self.seqs[slot] != seq:
+                    skipped += 1
+                    continue
+                np.copyto(frame, self.frames[slot])
+                timestamp = self.times[slot]
+                if self.seqs[slot] != seq:
+                    # 拷贝途中被游戏循环覆盖
+                    skipped += 1
+                    continue
+                if self.compress:
+                    data = zlib.compress(np.bitwise_xor(frame, previous), 1)
+                    previous, frame = frame, previous
+                else:
+                    data = frame.data
+                f.write(self.FRAME.pack(seq, timestamp, len(data)))
+                f.write(data)
+                written += 1
+                # 每写一帧让出一次 GIL
+                time.sleep(0)
+            f.seek(0)
+            f.write(self.header(written, skipped))
+        return {'path': path, 'frames': written, 'skipped': skipped, 'bytes': os.path.getsize(path)}
+    
+    def header(self, count, skipped):
+        width, height = self.size
+        return self.HEADER.pack(self.MAGIC, self.VERSION, width, height, self.pitch, *self.shifts, self.compress,
+                                self.fps, count, skipped)
+    
+    @classmethod
+    def read(cls, path):
+        # 逐帧读出 (序号, 时间戳, RGB 数组 (高, 宽, 3))
+        with open(path, 'rb') as f:
+            head = f.read(cls.HEADER.size)
+            if len(head) < cls.HEADER.size:
+                raise ValueError(f'{path}: 回放片段不完整')
+            magic, version, width, height, pitch, r_shift, g_shift, b_shift, compressed, _, count, _ = \
+                cls.HEADER.unpack(head)
+            if magic != cls.MAGIC:
+                raise ValueError(f'{path}: 不是回放片段')
+            if version != cls.VERSION:
+                raise ValueError(f'{path}: 不支持的回放片段版本 {version}')
+            previous = np.zeros(pitch * height, np.uint8)
+            for _ in range(count):
+                entry = f.read(cls.FRAME.size)
+                if len(entry) < cls.FRAME.size:
+                    raise ValueError(f'{path}: 回放片段不完整')
+                seq, timestamp, size = cls.FRAME.unpack(entry)
+                data = f.read(size)
+                try:
+                    frame = np.frombuffer(zlib.decompress(data) if compressed else data, np.uint8)
+                except zlib.error as e:
+                    raise ValueError(f'{path}: 回放片段损坏 ({e})') from e
+                if frame.size != previous.size:
+                    raise ValueError(f'{path}: 回放片段损坏 (帧长度不符)')
+                if compressed:
+                    frame = previous = np.bitwise_xor(frame, previous)
+                pixels = frame.view(np.uint32).reshape(height, pitch // 4)[:, :width]
+                rgb = np.empty((height, width, 3), np.uint8)
+                for channel, shift in enumerate((r_shift, g_shift, b_shift)):
+                    rgb[:, :, channel] = pixels >> shift
+                yield seq, timestamp, rgb
+    
+    def close(self):
+        self.export_pool.shutdown(wait=True)
+
+class Hud:
+    # 界面层: 信息面板整体合成为一张 Surface, 仅在分数/生命/钥匙/关卡变化时重建, 每帧只需一次 blit
+    def __init__(self, game):
+        self.game = game
+        self.panel_state = None
+        self.panel_surface = None
+        self.game_over_state = None
+        self.game_over_surface = None
+        self.warning_surface = None
+    
+    def panel(self):
+        game = self.game
+        state = (game.score, tuple(player.lives for player in game.players), game.keys_collected, game.keys_total, game.key_obtained, game.current_level)
+        if state != self.panel_state:
+            self.panel_state = state
+            self.panel_surface = self.build_panel(*state)
+        return self.panel_surface
+    
+    def build_panel(self, score, lives, keys_collected, keys_total, key_obtained, level):
+        game = self.game
+        render = game.text_cache.render
+        texts = [
+            (render(game.small_font, f'分数: {score}', (255, 255, 100)), (10, 10)),
+            (render(game.small_font, f'生命: {" / ".join(map(str, lives))}', (255, 100, 100)), (10, 40)),
+        ]
+        if keys_total > 0:
+            key_label = f'钥匙: {min(keys_collected, keys_total)}/{keys_total}'
+        else:
+            key_label = '钥匙: -'
+        key_ready = key_obtained and keys_total > 0
+        key_color = (255, 230, 140) if key_ready else (200, 200, 200)
+        texts.append((render(game.small_font, key_label, key_color), (10, 70)))
+        texts.append((render(game.small_font, f'关卡: {level}', (100, 255, 100)), (10, 100)))
+        
+        width = max([240] + [pos[0] + text.get_width() for text, pos in texts])
+        height = max([130] + [pos[1] + text.get_height() for text, pos in texts])
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        pygame.draw.rect(panel, (0, 0, 0, 120), (0, 0, 240, 130), border_radius=10)
+        pygame.draw.rect(panel, (255, 255, 255, 100), (0, 0, 240, 130), 2, border_radius=10)
+        panel.blits(texts)
+        
+        icon_color = (255, 215, 80) if key_ready else (160, 160, 160)
+        highlight_color = (255, 255, 220) if key_ready else (210, 210, 210)
+        pygame.draw.circle(panel, icon_color, (165, 79), 8)
+        pygame.draw.circle(panel, highlight_color, (165, 79), 4)
+        pygame.draw.rect(panel, icon_color, (171, 77, 8, 4), border_radius=2)
+        pygame.draw.rect(panel, icon_color, (173, 81, 6, 3), border_radius=2)
+        return panel
+    
+    def glow(self, width, height):
+        return IMAGE_CACHE.get(('hud', 'glow', width, height), Hud.render_glow, width, height)
+    
+    @staticmethod
+    def render_glow(width, height):
+        glow_surf = pygame.Surface((width, height), pygame.SRCALPHA)
+        pygame.draw.ellipse(glow_surf, (255, 255, 100, 100), (0, 0, width, height))
+        return glow_surf
+    
+    def lock(self):
+        return IMAGE_CACHE.get(('hud', 'lock'), Hud.render_lock)
+    
+    @staticmethod
+    def render_lock():
+        lock_surface = pygame.Surface((26, 34), pygame.SRCALPHA)
+        pygame.draw.arc(lock_surface, (200, 170, 60), (4, 4, 18, 18), math.pi, math.pi * 2, 4)
+        pygame.draw.rect(lock_surface, (200, 170, 60), (6, 16, 14, 14), border_radius=4)
+        pygame.draw.rect(lock_surface, (120, 90, 30), (6, 16, 14, 14), 2, border_radius=4)
+        pygame.draw.circle(lock_surface, (120, 90, 30), (13, 23), 3, 1)
+        return lock_surface
+    
+    def warning(self, alpha):
+        # 提示文字的透明度每帧变化, 复用同一张 Surface 只修改整体 alpha
+        if self.warning_surface is None:
+            game = self.game
+            warning_text = game.text_cache.render(game.font, '需要先找到钥匙!', (255, 100, 100))
+            self.warning_surface = pygame.Surface(warning_text.get_size(), pygame.SRCALPHA)
+            self.warning_surface.blit(warning_text, (0, 0))
+        self.warning_surface.set_alpha(alpha)
+        return self.warning_surface
+    
+    def game_over(self):
+        game = self.game
+        if game.score != self.game_over_state:
+            self.game_over_state = game.score
+            self.game_over_surface = self.build_game_over(game.score)
+        return self.game_over_surface
+    
+    def build_game_over(self, score):
+        game = self.game
+        render = game.text_cache.render
+        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        pygame.draw.rect(overlay, (0, 0, 0, 150), (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+        
+        game_over_text = render(game.title_font, '游戏结束', (255, 100, 100))
+        game_over_shadow = render(game.title_font, '游戏结束', (100, 0, 0))
+        game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
+        overlay.blit(game_over_shadow, (game_over_rect.x + 3, game_over_rect.y + 3))
+        overlay.blit(game_over_text, game_over_rect)
+        
+        final_score_text = render(game.font, f'最终分数: {score}', WHITE)
+        overlay.blit(final_score_text, final_score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20)))
+        
+        restart_text = render(game.small_font, '按 R 键重新开始', (200, 255, 200))
+        overlay.blit(restart_text, restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60)))
+        return overlay
+
+class Game:
+    def __init__(self, headless=False, dirty_rects=False, level_dir=LEVEL_DIR, seed=None, verbose=True, coop=False):
+        # 只初始化用到的 pygame 模块 (不需要音频/手柄等)
+        init_start = time.perf_counter()
+        pygame.font.init()
+        if not headless:
+            pygame.display.init()
+        self.startup_times = {
+            'import': (init_start - STARTUP_BEGIN) * 1000,
+            'init': (time.perf_counter() - init_start) * 1000,
+        }
+        
+        self.headless = headless
+        self.dirty_rects = dirty_rects
+        self.level_files = list_level_files(level_dir)
+        if not self.level_files:
+            raise ValueError(f'{level_dir}: 没有找到关卡文件 (level_N.json)')
+        self.level_load_ms = 0.0
+        # 关卡初始状态缓存 (按文件路径) 和后台预建
+        self.level_templates = {}
+        self.prefetching = {}
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-prefetch')
+        window_start = time.perf_counter()
+        if headless:
+            # 无窗口模式: 只在内存中渲染, 不创建显示窗口
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Super Kitten Adventure - 超级小猫冒险")
+        self.startup_times['window'] = (time.perf_counter() - window_start) * 1000
+        self.input = ScriptedInput() if headless else KeyboardInput()
+        # 双人合作时 2P 的按键来源 (由 netplay.py 的回滚会话写入)
+        self.coop = coop
+        self.partner = None
+        self.partner_input = ScriptedInput()
+        self.recording = None
+        self.record_path = None
+        self.replay = None
+        self.checkpoint = None
+        self.clips = None
+        # 玩法随机数(敌人颜色、钥匙/道具浮动相位)和纯装饰随机数(粒子、星星)分开, 互不影响
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.rng = random.Random(self.seed)
+        self.fx_rng = random.Random(self.seed + 1)
         self.clock = pygame.time.Clock()
+        # 每次 update 推进的帧数: 窗口游戏和录像回放固定为 1; 无窗口/批量模拟可以调大来快进
+        self.time_step = 1
         self.running = True
         self.game_state = 'start'
         self.current_level = 1
@@ -540,467 +2393,128 @@ class Game:
         self.keys_total = 0
         self.key_warning_timer = 0
         
-        # 使用支持中文的字体
-        font_loaded = False
-        
-        # 尝试加载微软雅黑
-        try:
-            chinese_font = "C:/Windows/Fonts/msyh.ttc"
-            self.font = pygame.font.Font(chinese_font, 48)
-            self.small_font = pygame.font.Font(chinese_font, 28)
-            self.title_font = pygame.font.Font(chinese_font, 72)
-            font_loaded = True
-            print("成功加载微软雅黑字体")
-        except Exception as e:
-            print(f"微软雅黑加载失败: {e}")
-        
-        # 尝试加载黑体
-        if not font_loaded:
-            try:
-                chinese_font = "C:/Windows/Fonts/simhei.ttf"
-                self.font = pygame.font.Font(chinese_font, 48)
-                self.small_font = pygame.font.Font(chinese_font, 28)
-                self.title_font = pygame.font.Font(chinese_font, 72)
-                font_loaded = True
-                print("成功加载黑体字体")
-            except Exception as e:
-                print(f"黑体加载失败: {e}")
-        
-        # 尝试加载宋体
-        if not font_loaded:
-            try:
-                chinese_font = "C:/Windows/Fonts/simsun.ttc"
-                self.font = pygame.font.Font(chinese_font, 48)
-                self.small_font = pygame.font.Font(chinese_font, 28)
-                self.title_font = pygame.font.Font(chinese_font, 72)
-                font_loaded = True
-                print("成功加载宋体字体")
-            except Exception as e:
-                print(f"宋体加载失败: {e}")
-        
-        # 使用系统字体
-        if not font_loaded:
-            print("使用系统字体")
-            self.font = pygame.font.SysFont('simhei,microsoftyahei,simsun,microsoft yahei', 48)
-            self.small_font = pygame.font.SysFont('simhei,microsoftyahei,simsun,microsoft yahei', 28)
-            self.title_font = pygame.font.SysFont('simhei,microsoftyahei,simsun,microsoft yahei', 72)
-        
-        self.particles = pygame.sprite.Group()
+        font_start = time.perf_counter()
+        self.font_path, font_cached = resolve_font_path()
+        self.font = get_font(self.font_path, 48)
+        self.small_font = get_font(self.font_path, 28)
+        self.title_font = get_font(self.font_path, 72)
+        self.startup_times['fonts'] = (time.perf_counter() - font_start) * 1000
+        font_name = os.path.basename(self.font_path) if self.font_path else 'pygame 默认字体'
+        if verbose:
+            print(f"使用字体: {font_name}{' (缓存)' if font_cached else ''}")
+        
+        self.text_cache = TextCache()
+        self.hud = Hud(self)
+        self.profiler = FrameProfiler()
+        self.profiler_font = get_font(None, 18)
+        self.pacing = FramePacing()
+        self.max_fps = FPS
+        self.prev_positions = {}
+        self.prev_camera_x = 0
+        self.prev_level_version = 0
+        
+        # 静态背景层缓存, 仅在分辨率或主题变化时重建
+        self.sky_gradient = SKY_GRADIENT
+        self.start_gradient = START_GRADIENT
+        self.layer_cache = {}
+        
+        # 脏矩形渲染: 上一帧绘制过的区域, 以及是否需要整屏重绘
+        self.level_version = 0
+        self.dirty_prev = []
+        self.dirty_background = None
+        self.full_redraw = True
+        
+        self.particles = ParticleSystem(seed=self.seed + 2)
+        # 金币/敌人/道具的对象池, 跨关卡复用
+        self.pools = {
+            'coin': SpritePool(Coin, 2048),
+            'enemy': SpritePool(Enemy, 1024),
+            'powerup': SpritePool(PowerUp, 64),
+        }
+        self.streamer = None
         self.stars = []
         for _ in range(50):
-            self.stars.append([random.randint(0, SCREEN_WIDTH), random.randint(0, SCREEN_HEIGHT//2), random.randint(1, 3)])
+            self.stars.append([self.fx_rng.randint(0, SCREEN_WIDTH), self.fx_rng.randint(0, SCREEN_HEIGHT//2), self.fx_rng.randint(1, 3)])
         
+    def level_path(self, level):
+        if not 1 <= level <= len(self.level_files):
+            raise ValueError(f'关卡 {level} 不存在, 可选 1 到 {len(self.level_files)}')
+        return self.level_files[level - 1]
+    
+    def level_template(self, level):
+        # 已建好的关卡直接复用; 后台正在预建的关卡等它完成; 都没有时在主线程上建
+        path = self.level_path(level)
+        template = self.level_templates.get(path)
+        if template is None:
+            future = self.prefetching.pop(path, None)
+            template = future.result() if future is not None else LevelTemplate(path)
+            self.level_templates[path] = template
+        return template
+    
+    def prefetch_level(self, level):
+        # 在后台线程中解析、校验下一关并预渲染贴图
+        path = self.level_path(level)
+        if path not in self.level_templates and path not in self.prefetching:
+            self.prefetching[path] = self.prefetch_pool.submit(LevelTemplate.prepare, path)
+    
     def load_level(self, level):
+        start = time.perf_counter()
+        self.begin_level(self.level_template(level))
+        self.streamer.update(self.camera.view)
+        self.level_load_ms = (time.perf_counter() - start) * 1000
+        self.prefetch_level(level % len(self.level_files) + 1)
+    
+    def begin_level(self, template):
+        # 按关卡模板建立玩家、镜头和空的精灵组; 精灵随后由 streamer 按视野创建, 或由快照恢复
+        data = template.data
+        if self.streamer is not None:
+            self.streamer.recycle()
+        
         self.all_sprites = pygame.sprite.Group()
-        self.platforms = pygame.sprite.Group()
-        self.enemies = pygame.sprite.Group()
-        self.coins = pygame.sprite.Group()
-        self.powerups = pygame.sprite.Group()
-        self.keys = pygame.sprite.Group()
-        self.flags = pygame.sprite.Group()
-        self.particles.empty()
+        self.platforms = SpatialGroup(moving=False)
+        self.enemies = EnemyGroup()
+        self.coins = SpatialGroup(moving=False)
+        self.powerups = SpatialGroup()
+        self.keys = SpatialGroup()
+        self.flags = SpatialGroup(moving=False)
+        self.particles.clear()
+        self.level_version += 1
+        self.full_redraw = True
 
         self.key_obtained = False
         self.keys_collected = 0
         self.key_warning_timer = 0
 
-        self.player = Player(50, SCREEN_HEIGHT - 150)
-        self.all_sprites.add(self.player)
-
-        if level == 1:
-            self.create_level_1()
-        elif level == 2:
-            self.create_level_2()
-        elif level == 3:
-            self.create_level_3()
-        elif level == 4:
-            self.create_level_4()
-        elif level == 5:
-            self.create_level_5()
-        else:
-            self.create_level_6()
+        self.world_width = data['width']
+        self.camera = Camera(self.world_width)
+        self.player = Player(*data['player'])
+        self.players = [self.player]
+        if self.coop:
+            self.partner = Player(*data['player'], PARTNER_COLOR)
+            self.players.append(self.partner)
+        for player in self.players:
+            player.world_width = self.world_width
+            self.all_sprites.add(player)
+        self.follow_players()
+        self.streamer = LevelStreamer(self, template)
 
-        self.keys_total = len(self.keys.sprites())
+        self.keys_total = len(data['keys'])
         if self.keys_total == 0:
             self.key_obtained = True
     
-    def create_level_1(self):
-        ground = Platform(0, SCREEN_HEIGHT - 50, SCREEN_WIDTH, 50, GROUND_COLOR, 'ground')
-        self.platforms.add(ground)
-        self.all_sprites.add(ground)
-        
-        platforms_data = [
-            (200, 450, 100, 20, 'brick'),
-            (350, 400, 100, 20, 'brick'),
-            (500, 350, 100, 20, 'brick'),
-            (300, 300, 40, 40, 'mystery'),
-            (600, 450, 80, 20, 'brick'),
-        ]
-        
-        for x, y, w, h, ptype in platforms_data:
-            platform = Platform(x, y, w, h, BRICK_COLOR, ptype)
-            self.platforms.add(platform)
-            self.all_sprites.add(platform)
-        
-        coins_positions = [
-            (220, 420), (250, 420), (280, 420),
-            (370, 370), (400, 370), (430, 370),
-            (520, 320), (550, 320), (580, 320),
-        ]
-        
-        for x, y in coins_positions:
-            coin = Coin(x, y)
-            self.coins.add(coin)
-            self.all_sprites.add(coin)
-        
-        key = Key(520, 260)
-        self.keys.add(key)
-        self.all_sprites.add(key)
-        
-        enemies_data = [
-            (300, SCREEN_HEIGHT - 100, 'goomba'),
-            (500, SCREEN_HEIGHT - 100, 'koopa'),
-            (650, SCREEN_HEIGHT - 100, 'goomba'),
-        ]
-        
-        for x, y, etype in enemies_data:
-            enemy = Enemy(x, y, etype)
-            self.enemies.add(enemy)
-            self.all_sprites.add(enemy)
-        
-        powerup = PowerUp(320, 250, 'life')
-        self.powerups.add(powerup)
-        self.all_sprites.add(powerup)
-        
-        flag = Flag(720, SCREEN_HEIGHT - 250)
-        self.flags.add(flag)
-        self.all_sprites.add(flag)
-    
-    def create_level_2(self):
-        ground = Platform(0, SCREEN_HEIGHT - 50, SCREEN_WIDTH, 50, GROUND_COLOR, 'ground')
-        self.platforms.add(ground)
-        self.all_sprites.add(ground)
-        
-        platforms_data = [
-            (100, 480, 80, 20, 'brick'),
-            (200, 430, 80, 20, 'brick'),
-            (300, 380, 80, 20, 'brick'),
-            (400, 330, 80, 20, 'brick'),
-            (500, 280, 80, 20, 'brick'),
-            (600, 330, 80, 20, 'brick'),
-            (250, 250, 40, 40, 'mystery'),
-            (450, 200, 40, 40, 'mystery'),
-            (150, 350, 60, 20, 'brick'),
-        ]
-        
-        for x, y, w, h, ptype in platforms_data:
-            platform = Platform(x, y, w, h, BRICK_COLOR, ptype)
-            self.platforms.add(platform)
-            self.all_sprites.add(platform)
-        
-        coins_positions = [
-            (120, 450), (150, 450),
-            (220, 400), (250, 400),
-            (320, 350), (350, 350),
-            (420, 300), (450, 300),
-            (520, 250), (550, 250),
-            (620, 300), (650, 300),
-        ]
-        
-        for x, y in coins_positions:
-            coin = Coin(x, y)
-            self.coins.add(coin)
-            self.all_sprites.add(coin)
-        
-        key = Key(470, 140)
-        self.keys.add(key)
-        self.all_sprites.add(key)
-        
-        enemies_data = [
-            (250, SCREEN_HEIGHT - 100, 'goomba'),
-            (400, SCREEN_HEIGHT - 100, 'koopa'),
-            (550, SCREEN_HEIGHT - 100, 'goomba'),
-            (300, 350, 'koopa'),
-        ]
-        
-        for x, y, etype in enemies_data:
-            enemy = Enemy(x, y, etype)
-            self.enemies.add(enemy)
-            self.all_sprites.add(enemy)
-        
-        powerup = PowerUp(270, 200, 'star')
-        self.powerups.add(powerup)
-        self.all_sprites.add(powerup)
-        
-        flag = Flag(720, SCREEN_HEIGHT - 250)
-        self.flags.add(flag)
-        self.all_sprites.add(flag)
-    
-    def create_level_3(self):
-        platforms_data = [
-            (0, SCREEN_HEIGHT - 50, 250, 50, 'ground'),
-            (350, SCREEN_HEIGHT - 50, 450, 50, 'ground'),
-            (100, 450, 100, 20, 'brick'),
-            (250, 400, 100, 20, 'brick'),
-            (450, 450, 100, 20, 'brick'),
-            (600, 400, 100, 20, 'brick'),
-            (150, 320, 80, 20, 'brick'),
-            (350, 300, 80, 20, 'brick'),
-            (550, 320, 80, 20, 'brick'),
-            (300, 250, 40, 40, 'mystery'),
-            (500, 250, 40, 40, 'mystery'),
-        ]
-        
-        for x, y, w, h, ptype in platforms_data:
-            platform = Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
-            self.platforms.add(platform)
-            self.all_sprites.add(platform)
-        
-        coins_positions = [
-            (120, 420), (150, 420), (180, 420),
-            (270, 370), (300, 370), (330, 370),
-            (470, 420), (500, 420), (530, 420),
-            (620, 370), (650, 370), (680, 370),
-            (170, 290), (370, 270), (570, 290),
-        ]
-        
-        for x, y in coins_positions:
-            coin = Coin(x, y)
-            self.coins.add(coin)
-            self.all_sprites.add(coin)
-        
-        key = Key(360, 240)
-        self.keys.add(key)
-        self.all_sprites.add(key)
-        
-        enemies_data = [
-            (200, SCREEN_HEIGHT - 100, 'goomba'),
-            (500, SCREEN_HEIGHT - 100, 'koopa'),
-            (650, SCREEN_HEIGHT - 100, 'goomba'),
-            (280, 370, 'koopa'),
-            (480, 420, 'goomba'),
-        ]
-        
-        for x, y, etype in enemies_data:
-            enemy = Enemy(x, y, etype)
-            self.enemies.add(enemy)
-            self.all_sprites.add(enemy)
-        
-        powerup1 = PowerUp(320, 200, 'life')
-        powerup2 = PowerUp(520, 200, 'star')
-        self.powerups.add(powerup1, powerup2)
-        self.all_sprites.add(powerup1, powerup2)
-        
-        flag = Flag(720, SCREEN_HEIGHT - 250)
-        self.flags.add(flag)
-        self.all_sprites.add(flag)
-    
-    def create_level_4(self):
-        platforms_data = [
-            (0, SCREEN_HEIGHT - 50, SCREEN_WIDTH, 50, 'ground'),
-            (80, 480, 60, 20, 'brick'),
-            (160, 430, 60, 20, 'brick'),
-            (240, 380, 60, 20, 'brick'),
-            (320, 330, 60, 20, 'brick'),
-            (400, 280, 60, 20, 'brick'),
-            (480, 330, 60, 20, 'brick'),
-            (560, 380, 60, 20, 'brick'),
-            (640, 430, 60, 20, 'brick'),
-            (200, 250, 40, 40, 'mystery'),
-            (400, 200, 40, 40, 'mystery'),
-            (600, 250, 40, 40, 'mystery'),
-            (100, 350, 80, 20, 'brick'),
-            (300, 200, 80, 20, 'brick'),
-            (500, 200, 80, 20, 'brick'),
-        ]
-        
-        for x, y, w, h, ptype in platforms_data:
-            platform = Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
-            self.platforms.add(platform)
-            self.all_sprites.add(platform)
-        
-        coins_positions = [
-            (100, 450), (180, 400), (260, 350), 
-            (340, 300), (420, 250), (500, 300),
-            (580, 350), (660, 400),
-            (320, 170), (350, 170), (520, 170), (550, 170),
-        ]
-        
-        for x, y in coins_positions:
-            coin = Coin(x, y)
-            self.coins.add(coin)
-            self.all_sprites.add(coin)
-        
-        key = Key(420, 160)
-        self.keys.add(key)
-        self.all_sprites.add(key)
-        
-        enemies_data = [
-            (150, SCREEN_HEIGHT - 100, 'koopa'),
-            (300, SCREEN_HEIGHT - 100, 'goomba'),
-            (450, SCREEN_HEIGHT - 100, 'koopa'),
-            (600, SCREEN_HEIGHT - 100, 'goomba'),
-            (700, SCREEN_HEIGHT - 100, 'koopa'),
-            (250, 350, 'goomba'),
-        ]
-        
-        for x, y, etype in enemies_data:
-            enemy = Enemy(x, y, etype)
-            self.enemies.add(enemy)
-            self.all_sprites.add(enemy)
-        
-        powerup1 = PowerUp(220, 200, 'star')
-        powerup2 = PowerUp(420, 150, 'life')
-        powerup3 = PowerUp(620, 200, 'star')
-        self.powerups.add(powerup1, powerup2, powerup3)
-        self.all_sprites.add(powerup1, powerup2, powerup3)
-        
-        flag = Flag(720, SCREEN_HEIGHT - 250)
-        self.flags.add(flag)
-        self.all_sprites.add(flag)
-    
-    def create_level_5(self):
-        platforms_data = [
-            (0, SCREEN_HEIGHT - 50, 150, 50, 'ground'),
-            (250, SCREEN_HEIGHT - 50, 100, 50, 'ground'),
-            (450, SCREEN_HEIGHT - 50, 100, 50, 'ground'),
-            (650, SCREEN_HEIGHT - 50, 150, 50, 'ground'),
-            (120, 460, 60, 20, 'brick'),
-            (220, 400, 60, 20, 'brick'),
-            (320, 340, 60, 20, 'brick'),
-            (420, 280, 60, 20, 'brick'),
-            (520, 340, 60, 20, 'brick'),
-            (620, 400, 60, 20, 'brick'),
-            (280, 240, 40, 40, 'mystery'),
-            (480, 240, 40, 40, 'mystery'),
-            (150, 330, 80, 20, 'brick'),
-            (400, 200, 100, 20, 'brick'),
-            (600, 320, 80, 20, 'brick'),
-        ]
-        
-        for x, y, w, h, ptype in platforms_data:
-            platform = Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
-            self.platforms.add(platform)
-            self.all_sprites.add(platform)
-        
-        coins_positions = [
-            (140, 430), (240, 370), (340, 310),
-            (440, 250), (540, 310), (640, 370),
-            (420, 170), (450, 170), (480, 170),
-            (170, 300), (620, 290),
-        ]
-        
-        for x, y in coins_positions:
-            coin = Coin(x, y)
-            self.coins.add(coin)
-            self.all_sprites.add(coin)
-        
-        key = Key(440, 140)
-        self.keys.add(key)
-        self.all_sprites.add(key)
-        
-        enemies_data = [
-            (80, SCREEN_HEIGHT - 100, 'goomba'),
-            (290, SCREEN_HEIGHT - 100, 'koopa'),
-            (490, SCREEN_HEIGHT - 100, 'goomba'),
-            (700, SCREEN_HEIGHT - 100, 'koopa'),
-            (240, 370, 'goomba'),
-            (340, 310, 'koopa'),
-        ]
-        
-        for x, y, etype in enemies_data:
-            enemy = Enemy(x, y, etype)
-            self.enemies.add(enemy)
-            self.all_sprites.add(enemy)
-        
-        powerup1 = PowerUp(300, 190, 'life')
-        powerup2 = PowerUp(500, 190, 'star')
-        self.powerups.add(powerup1, powerup2)
-        self.all_sprites.add(powerup1, powerup2)
-        
-        flag = Flag(720, SCREEN_HEIGHT - 250)
-        self.flags.add(flag)
-        self.all_sprites.add(flag)
-    
-    def create_level_6(self):
-        platforms_data = [
-            (0, SCREEN_HEIGHT - 50, SCREEN_WIDTH, 50, 'ground'),
-            (50, 490, 50, 20, 'brick'),
-            (120, 450, 50, 20, 'brick'),
-            (190, 410, 50, 20, 'brick'),
-            (260, 370, 50, 20, 'brick'),
-            (330, 330, 50, 20, 'brick'),
-            (400, 290, 50, 20, 'brick'),
-            (470, 250, 50, 20, 'brick'),
-            (540, 290, 50, 20, 'brick'),
-            (610, 330, 50, 20, 'brick'),
-            (680, 370, 50, 20, 'brick'),
-            (200, 300, 40, 40, 'mystery'),
-            (400, 220, 40, 40, 'mystery'),
-            (600, 260, 40, 40, 'mystery'),
-            (100, 360, 70, 20, 'brick'),
-            (350, 200, 100, 20, 'brick'),
-            (550, 180, 100, 20, 'brick'),
-        ]
-        
-        for x, y, w, h, ptype in platforms_data:
-            platform = Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
-            self.platforms.add(platform)
-            self.all_sprites.add(platform)
-        
-        coins_positions = [
-            (70, 460), (140, 420), (210, 380),
-            (280, 340), (350, 300), (420, 260),
-            (490, 220), (560, 260), (630, 300),
-            (700, 340),
-            (370, 170), (400, 170), (430, 170),
-            (570, 150), (600, 150), (630, 150),
-        ]
-        
-        for x, y in coins_positions:
-            coin = Coin(x, y)
-            self.coins.add(coin)
-            self.all_sprites.add(coin)
-        
-        key = Key(400, 160)
-        self.keys.add(key)
-        self.all_sprites.add(key)
-        
-        enemies_data = [
-            (100, SCREEN_HEIGHT - 100, 'koopa'),
-            (200, SCREEN_HEIGHT - 100, 'goomba'),
-            (300, SCREEN_HEIGHT - 100, 'koopa'),
-            (400, SCREEN_HEIGHT - 100, 'goomba'),
-            (500, SCREEN_HEIGHT - 100, 'koopa'),
-            (600, SCREEN_HEIGHT - 100, 'goomba'),
-            (700, SCREEN_HEIGHT - 100, 'koopa'),
-            (140, 420, 'goomba'),
-            (350, 300, 'koopa'),
-            (490, 220, 'goomba'),
-        ]
-        
-        for x, y, etype in enemies_data:
-            enemy = Enemy(x, y, etype)
-            self.enemies.add(enemy)
-            self.all_sprites.add(enemy)
-        
-        powerup1 = PowerUp(220, 250, 'star')
-        powerup2 = PowerUp(420, 170, 'life')
-        powerup3 = PowerUp(620, 210, 'star')
-        self.powerups.add(powerup1, powerup2, powerup3)
-        self.all_sprites.add(powerup1, powerup2, powerup3)
-        
-        flag = Flag(720, SCREEN_HEIGHT - 250)
-        self.flags.add(flag)
-        self.all_sprites.add(flag)
+    def follow_players(self):
+        # 双人时镜头对准两只小猫的中点, 并把两只小猫限制在画面内, 远离镜头的区块不会被释放到脚下
+        if self.partner is None:
+            self.camera.follow(self.player.rect)
+            return
+        self.camera.follow(self.player.rect.union(self.partner.rect))
+        view = self.camera.view
+        for player in self.players:
+            player.rect.left = max(player.rect.left, view.left)
+            player.rect.right = min(player.rect.right, view.right)
     
     def draw_start_screen(self):
-        for i in range(SCREEN_HEIGHT):
-            ratio = i / SCREEN_HEIGHT
-            r = int(20 + (135 - 20) * ratio)
-            g = int(20 + (206 - 20) * ratio)
-            b = int(50 + (235 - 50) * ratio)
-            pygame.draw.line(self.screen, (r, g, b), (0, i), (SCREEN_WIDTH, i))
+        self.screen.blit(self.get_static_layer('start'), (0, 0))
         
         for star in self.stars:
             size = star[2]
@@ -1009,13 +2523,13 @@ class Game:
             pygame.draw.circle(star_surf, (255, 255, 255, alpha), (size, size), size)
             self.screen.blit(star_surf, (star[0], star[1]))
         
-        title_text = self.title_font.render('超级小猫', True, (255, 200, 100))
-        title_shadow = self.title_font.render('超级小猫', True, (100, 50, 0))
+        title_text = self.text_cache.render(self.title_font, '超级小猫', (255, 200, 100))
+        title_shadow = self.text_cache.render(self.title_font, '超级小猫', (100, 50, 0))
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 150))
         self.screen.blit(title_shadow, (title_rect.x + 3, title_rect.y + 3))
         self.screen.blit(title_text, title_rect)
         
-        subtitle_text = self.font.render('冒险之旅', True, (255, 220, 150))
+        subtitle_text = self.text_cache.render(self.font, '冒险之旅', (255, 220, 150))
         subtitle_rect = subtitle_text.get_rect(center=(SCREEN_WIDTH // 2, 210))
         self.screen.blit(subtitle_text, subtitle_rect)
         
@@ -1026,17 +2540,15 @@ class Game:
         self.screen.blit(kitten.image, (SCREEN_WIDTH // 2 - 22, 280))
         
         for _ in range(3):
-            if random.random() < 0.05:
-                self.particles.add(Particle(
-                    SCREEN_WIDTH // 2 + random.randint(-30, 30),
-                    300 + random.randint(-10, 20),
-                    random.choice([(255, 200, 200), (200, 200, 255), (255, 255, 200)])
-                ))
+            if self.fx_rng.random() < 0.05:
+                self.particles.emit(SCREEN_WIDTH // 2, 305,
+                                    [(255, 200, 200), (200, 200, 255), (255, 255, 200)],
+                                    spread_x=30, spread_y=15)
         
         self.particles.update()
         self.particles.draw(self.screen)
         
-        controls_title = self.small_font.render('操作说明:', True, WHITE)
+        controls_title = self.text_cache.render(self.small_font, '操作说明:', WHITE)
         self.screen.blit(controls_title, (SCREEN_WIDTH // 2 - 50, 380))
         
         controls = [
@@ -1048,62 +2560,313 @@ class Game:
         
         y_offset = 420
         for control in controls:
-            control_text = self.small_font.render(control, True, (200, 255, 200))
+            control_text = self.text_cache.render(self.small_font, control, (200, 255, 200))
             control_rect = control_text.get_rect(center=(SCREEN_WIDTH // 2, y_offset))
             self.screen.blit(control_text, control_rect)
             y_offset += 30
         
-        start_text = self.font.render('按空格键开始', True, (255, 255, 100))
-        start_rect = start_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60))
-        
         pulse = abs(math.sin(pygame.time.get_ticks() / 500))
-        scaled_size = int(48 + pulse * 10)
-        
-        # 使用中文字体创建脉冲效果
-        try:
-            # 尝试使用相同的中文字体
-            if hasattr(self, 'font') and self.font.get_height() > 0:
-                # 获取当前使用的字体文件
-                chinese_font = "C:/Windows/Fonts/msyh.ttc"
-                pulse_font = pygame.font.Font(chinese_font, scaled_size)
-            else:
-                pulse_font = pygame.font.SysFont('simhei,microsoftyahei,simsun', scaled_size)
-        except:
-            pulse_font = pygame.font.SysFont('simhei,microsoftyahei,simsun', scaled_size)
-            
-        start_text_pulse = pulse_font.render('按空格键开始', True, (255, 255, 100))
+        scaled_size = int(self.font.get_height() * (1 + pulse * 10 / 48))
+        start_text_pulse = self.text_cache.render(self.font, '按空格键开始', (255, 255, 100), scaled_size)
         start_rect_pulse = start_text_pulse.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60))
         self.screen.blit(start_text_pulse, start_rect_pulse)
         
     def draw_background(self):
-        for i in range(SCREEN_HEIGHT):
-            ratio = i / SCREEN_HEIGHT
-            r = int(135 + (200 - 135) * ratio)
-            g = int(206 + (220 - 206) * ratio)
-            b = int(235 + (255 - 235) * ratio)
-            pygame.draw.line(self.screen, (r, g, b), (0, i), (SCREEN_WIDTH, i))
-        
-        clouds = [
-            (100, 80, 60, 30),
-            (300, 100, 80, 40),
-            (550, 70, 70, 35),
-            (650, 120, 65, 32),
-        ]
-        for x, y, w, h in clouds:
-            pygame.draw.ellipse(self.screen, (255, 255, 255, 200), (x, y, w, h))
-            pygame.draw.ellipse(self.screen, (255, 255, 255, 200), (x + 20, y - 10, w - 20, h))
-            pygame.draw.ellipse(self.screen, (255, 255, 255, 200), (x + 10, y + 5, w - 20, h - 10))
+        self.screen.blit(self.get_static_layer('sky'), (0, 0))
+    
+    def get_static_layer(self, kind):
+        size = self.screen.get_size()
+        gradient = self.sky_gradient if kind == 'sky' else self.start_gradient
+        cache_key = (size, gradient)
+        cached = self.layer_cache.get(kind)
+        if cached is None or cached[0] != cache_key:
+            cached = (cache_key, self.build_static_layer(kind, size, gradient))
+            self.layer_cache[kind] = cached
+        return cached[1]
+    
+    def sprite_layers(self):
+        # 由下到上的绘制顺序, 整屏重绘和局部重绘共用: 平台和旗帜在最下面 (局部重绘时烘焙进关卡层), 小猫在最上面
+        return [self.platforms, self.flags], [self.coins, self.keys, self.enemies, self.powerups, self.players]
+    
+    def get_level_layer(self):
+        # 天空 + 平台 + 旗帜, 关卡加载或神秘方块被顶开时重建
+        cache_key = (self.screen.get_size(), self.sky_gradient, self.level_version,
+                     sum(player.blocks_hit for player in self.players),
+                     self.camera.x, len(self.platforms))
+        cached = self.layer_cache.get('level')
+        if cached is None or cached[0] != cache_key:
+            layer = self.get_static_layer('sky').copy()
+            view = self.camera.view
+            layer.blits([
+                (sprite.image, self.camera.apply(sprite.rect))
+                for group in self.sprite_layers()[0] for sprite in group
+                if view.colliderect(sprite.rect)
+            ])
+            cached = (cache_key, layer)
+            self.layer_cache['level'] = cached
+        return cached[1]
+    
+    def build_static_layer(self, kind, size, gradient):
+        width, height = size
+        layer = pygame.Surface(size)
+        (r1, g1, b1), (r2, g2, b2) = gradient
+        for i in range(height):
+            ratio = i / height
+            r = int(r1 + (r2 - r1) * ratio)
+            g = int(g1 + (g2 - g1) * ratio)
+            b = int(b1 + (b2 - b1) * ratio)
+            pygame.draw.line(layer, (r, g, b), (0, i), (width, i))
+        
+        if kind == 'sky':
+            for x, y, w, h in CLOUDS:
+                pygame.draw.ellipse(layer, (255, 255, 255, 200), (x, y, w, h))
+                pygame.draw.ellipse(layer, (255, 255, 255, 200), (x + 20, y - 10, w - 20, h))
+                pygame.draw.ellipse(layer, (255, 255, 255, 200), (x + 10, y + 5, w - 20, h - 10))
+        
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert()
+        return layer
     
     def run(self):
+        first_frame = True
+        profiler = self.profiler
+        accumulator = 0.0
+        last = time.perf_counter()
         while self.running:
-            self.clock.tick(FPS)
+            profiler.begin_frame()
+            self.clock.tick(self.max_fps)
+            now = time.perf_counter()
+            interval = now - last
+            last = now
+            accumulator += interval
+            profiler.mark('idle')
             self.handle_events()
-            self.update()
+            profiler.mark('events')
+            
+            steps = 0
+            while accumulator >= SIM_STEP and steps < MAX_SIM_STEPS:
+                if self.replay is not None and self.replay.finished:
+                    break
+                self.capture_positions()
+                self.update()
+                accumulator -= SIM_STEP
+                steps += 1
+            dropped = 0.0
+            if accumulator >= SIM_STEP:
+                dropped = accumulator - accumulator % SIM_STEP
+                accumulator %= SIM_STEP
+            self.pacing.record(interval * 1000, steps, dropped * 1000)
+            
+            moved = self.interpolate(accumulator / SIM_STEP)
             self.draw()
+            self.restore_positions(moved)
+            counts = self.profile_counts()
+            counts['interval'] = interval * 1000
+            counts['steps'] = steps
+            profiler.end_frame(counts)
+            if first_frame:
+                first_frame = False
+                self.startup_times['total'] = (time.perf_counter() - STARTUP_BEGIN) * 1000
+                self.report_startup()
+            if self.replay is not None and self.replay.finished:
+                self.report_replay()
+                self.running = False
         
+        self.pacing.report()
+        if self.recording is not None and self.recording.frames:
+            self.recording.checksum = self.state_checksum()
+            self.recording.save(self.record_path)
+            print(f"录像已保存: {self.record_path} ({len(self.recording.frames)} 帧)")
         pygame.quit()
         sys.exit()
     
+    def capture_positions(self):
+        # 模拟前记下会移动的精灵和镜头的位置, 绘制时在上一步和当前步之间插值
+        if self.game_state != 'playing':
+            self.prev_positions = {}
+            return
+        positions = {sprite: sprite.rect.topleft for group in (self.enemies, self.keys, self.powerups) for sprite in group}
+        for player in self.players:
+            positions[player] = player.rect.topleft
+        self.prev_positions = positions
+        self.prev_camera_x = self.camera.x
+        self.prev_level_version = self.level_version
+    
+    def interpolate(self, alpha):
+        # 把精灵和镜头临时移到插值位置, 返回原位置供 restore_positions 恢复
+        if self.game_state != 'playing' or self.prev_level_version != self.level_version or alpha <= 0:
+            return []
+        moved = []
+        for sprite, (x0, y0) in self.prev_positions.items():
+            rect = sprite.rect
+            x1, y1 = rect.topleft
+            if (x0, y0) == (x1, y1) or abs(x1 - x0) > TELEPORT_DISTANCE or abs(y1 - y0) > TELEPORT_DISTANCE:
+                continue
+            moved.append((rect, x1, y1))
+            rect.topleft = (round(x0 + (x1 - x0) * alpha), round(y0 + (y1 - y0) * alpha))
+        camera = self.camera
+        if camera.x != self.prev_camera_x and abs(camera.x - self.prev_camera_x) <= TELEPORT_DISTANCE:
+            moved.append((camera, camera.x, 0))
+            camera.x = round(self.prev_camera_x + (camera.x - self.prev_camera_x) * alpha)
+            camera.view.x = camera.x
+        return moved
+    
+    def restore_positions(self, moved):
+        for target, x, y in moved:
+            if target is self.camera:
+                target.x = target.view.x = x
+            else:
+                target.topleft = (x, y)
+    
+    def profile_counts(self):
+        # 计数字段加 n_ 前缀, 避免和同名阶段的耗时列冲突
+        if self.game_state == 'start':
+            return {'n_particles': len(self.particles)}
+        return {
+            'n_entities': len(self.all_sprites),
+            'n_enemies': len(self.enemies),
+            'n_coins': len(self.coins),
+            'n_particles': len(self.particles),
+        }
+    
+    def start_run(self, level):
+        self.current_level = level
+        self.score = 0
+        self.game_state = 'playing'
+        self.load_level(self.current_level)
+    
+    def start_recording(self, path):
+        # 录制从开局开始: 重置玩法随机数, 保证回放时从同一状态出发
+        self.rng.seed(self.seed)
+        self.recording = InputLog(self.seed, self.current_level)
+        self.record_path = path
+        self.start_run(self.current_level)
+    
+    def start_replay(self, log):
+        self.seed = log.seed
+        self.rng.seed(log.seed)
+        self.replay = ReplayInput(log)
+        self.input = self.replay
+        self.start_run(log.level)
+    
+    def state_checksum(self):
+        # 对影响玩法的状态做 CRC32, 回放结束后与录像中的值比较
+        player = self.player
+        state = struct.pack('<4i3d4i', self.current_level, self.score, self.keys_collected, player.lives,
+                            player.vel_x, player.vel_y, float(player.invincible_timer),
+                            *player.rect)
+        for group in (self.enemies, self.coins, self.keys, self.powerups):
+            # 按位置排序, 与精灵的创建顺序无关
+            state += struct.pack('<i', len(group))
+            for rect in sorted(tuple(sprite.rect) for sprite in group):
+                state += struct.pack('<4i', *rect)
+        if self.partner is not None:
+            partner = self.partner
+            state += struct.pack('<i3d4i', partner.lives, partner.vel_x, partner.vel_y,
+                                 float(partner.invincible_timer), *partner.rect)
+        return zlib.crc32(state)
+    
+    def snapshot(self):
+        return Snapshot.capture(self)
+    
+    def enable_clips(self, seconds=10, fps=30, scale=2, compress=True):
+        self.clips = ClipRecorder(self.screen, seconds, fps, scale, compress)
+        return self.clips
+    
+    def save_clip(self, path=None):
+        # 在后台线程中导出最近的画面, 完成后打印结果
+        path = path or time.strftime('clip_%Y%m%d_%H%M%S.kclip')
+        future = self.clips.export(path)
+        if future is None:
+            print("上一个回放片段还在导出" if self.clips.busy else "还没有可导出的画面")
+            return None
+        future.add_done_callback(self.report_clip)
+        return future
+    
+    def report_clip(self, future):
+        if future.exception() is not None:
+            print(f"导出回放片段失败: {future.exception()}")
+            return
+        result = future.result()
+        print(f"已导出回放片段: {result['path']} ({result['frames']} 帧, 跳过被覆盖的 {result['skipped']} 帧, "
+              f"{result['bytes'] / 1024 / 1024:.1f} MB)")
+    
+    def restore(self, blob):
+        Snapshot.restore(self, blob)
+    
+    def report_replay(self):
+        checksum = self.state_checksum()
+        status = '一致' if checksum == self.replay.log.checksum else '不一致'
+        print(f"回放结束: {len(self.replay.log.frames)} 帧  校验值 {checksum:08x} (录像 {self.replay.log.checksum:08x}, {status})")
+        return checksum == self.replay.log.checksum
+    
+    def run_replay(self, log, render_every=0):
+        # 快进回放: 不限帧率, 逐帧喂入录像中的按键
+        self.start_replay(log)
+        rendered = 0
+        frame = 0
+        start = time.perf_counter()
+        while not self.replay.finished:
+            frame += 1
+            self.update()
+            if render_every and frame % render_every == 0:
+                self.draw()
+                rendered += 1
+        elapsed = time.perf_counter() - start
+        return {
+            'frames': frame,
+            'rendered': rendered,
+            'seconds': elapsed,
+            'fps': frame / elapsed if elapsed > 0 else float('inf'),
+            'checksum': self.state_checksum(),
+            'matched': self.state_checksum() == log.checksum,
+        }
+    
+    def report_startup(self):
+        labels = [('import', '导入模块'), ('init', '初始化'), ('window', '窗口'), ('fonts', '字体'), ('total', '首帧合计')]
+        parts = [f'{label} {self.startup_times[key]:.0f} ms' for key, label in labels if key in self.startup_times]
+        print('启动耗时: ' + ' | '.join(parts))
+    
+    def run_headless(self, frames, level=1, render_every=0, time_step=1):
+        # time_step > 1 时每次 update 推进 time_step 帧, 共 frames // time_step 步
+        self.time_step = time_step
+        self.start_run(level)
+        
+        steps = frames // time_step
+        rendered = 0
+        restarts = 0
+        level_loads = [self.level_load_ms]
+        start = time.perf_counter()
+        profiler = self.profiler
+        for frame in range(1, steps + 1):
+            profiler.begin_frame()
+            level_version = self.level_version
+            self.update()
+            if self.level_version != level_version:
+                level_loads.append(self.level_load_ms)
+            if self.game_state == 'game_over':
+                restarts += 1
+                self.start_run(level)
+                level_loads.append(self.level_load_ms)
+            if render_every and frame % render_every == 0:
+                self.draw()
+                rendered += 1
+            profiler.end_frame(self.profile_counts())
+        elapsed = time.perf_counter() - start
+        frames = steps * time_step
+        
+        return {
+            'frames': frames,
+            'steps': steps,
+            'rendered': rendered,
+            'restarts': restarts,
+            'seconds': elapsed,
+            'fps': frames / elapsed if elapsed > 0 else float('inf'),
+            'level_loads': len(level_loads),
+            'level_load_ms': sum(level_loads) / len(level_loads),
+            'pools': {kind: pool.stats() for kind, pool in self.pools.items()},
+        }
+    
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -1112,63 +2875,103 @@ class Game:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False
                 elif event.key == pygame.K_SPACE and self.game_state == 'start':
-                    self.game_state = 'playing'
-                    self.load_level(self.current_level)
-                elif event.key == pygame.K_r and self.game_state == 'game_over':
-                    self.current_level = 1
-                    self.score = 0
-                    self.game_state = 'playing'
-                    self.load_level(self.current_level)
+                    if self.recording is not None:
+                        self.start_recording(self.record_path)
+                    else:
+                        self.start_run(self.current_level)
+                elif event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                    self.full_redraw = True
+                elif event.key == pygame.K_F4 and self.profiler.frames:
+                    path = time.strftime('frames_%Y%m%d_%H%M%S.csv')
+                    count = self.profiler.export(path)
+                    print(f"已导出 {count} 帧计时数据: {path}")
+                elif event.key == pygame.K_F5:
+                    self.profiler.toggle_capture()
+                elif event.key == pygame.K_F6 and self.game_state != 'start':
+                    self.checkpoint = self.snapshot()
+                    print(f"已保存存档点 ({len(self.checkpoint)} 字节)")
+                elif event.key == pygame.K_F7 and self.checkpoint is not None:
+                    # 录像/回放只记录按键, 读档会让录像失效
+                    if self.recording is not None or self.replay is not None:
+                        print("录像或回放中不能读取存档点")
+                    else:
+                        self.restore(self.checkpoint)
+                elif event.key == pygame.K_F8 and self.clips is not None:
+                    self.save_clip()
+                elif event.key == pygame.K_r and self.game_state == 'game_over' and self.replay is None:
+                    if self.recording is not None:
+                        self.recording.mark_restart()
+                    self.start_run(1)
     
     def update(self):
+        if self.replay is not None and self.game_state == 'game_over' and self.replay.take_restart():
+            self.start_run(1)
         if self.game_state != 'playing':
             return
             
-        if self.player.lives <= 0:
+        if any(player.lives <= 0 for player in self.players):
             self.game_state = 'game_over'
             return
         
+        profiler = self.profiler
+        dt = self.time_step
+        keys = self.input.poll()
+        if self.recording is not None:
+            self.recording.record(keys)
         coins_collected = self.player.update(
             self.platforms, 
             self.enemies, 
             self.coins, 
             self.powerups,
-            self.particles
+            self.particles,
+            keys,
+            dt
         )
+        if self.partner is not None:
+            coins_collected += self.partner.update(self.platforms, self.enemies, self.coins, self.powerups,
+                                                   self.particles, self.partner_input.poll(), dt)
         self.score += coins_collected * 10
-        
-        self.enemies.update(self.platforms)
-        self.coins.update()
-        self.powerups.update()
-        self.keys.update()
-        self.particles.update()
-        
-        key_hits = pygame.sprite.spritecollide(self.player, self.keys, True)
+        profiler.mark('player')
+        
+        self.follow_players()
+        self.streamer.update(self.camera.view)
+        profiler.mark('streaming')
+        
+        self.enemies.update(self.platforms, self.world_width, dt)
+        profiler.mark('enemies')
+        self.coins.update(dt)
+        profiler.mark('coins')
+        self.powerups.update(dt)
+        profiler.mark('powerups')
+        self.keys.update(dt)
+        profiler.mark('keys')
+        self.particles.update(dt)
+        profiler.mark('particles')
+        
+        key_hits = []
+        for player in self.players:
+            for rect in player.path:
+                for key in self.keys.query(rect):
+                    key.kill()
+                    key_hits.append(key)
         for key in key_hits:
             self.keys_collected += 1
             if self.keys_total == 0 or self.keys_collected >= self.keys_total:
                 self.key_obtained = True
-            for _ in range(30):
-                self.particles.add(Particle(
-                    key.rect.centerx + random.randint(-10, 10),
-                    key.rect.centery + random.randint(-10, 10),
-                    random.choice([(255, 220, 120), (255, 245, 200), (245, 190, 60)])
-                ))
+            self.particles.emit(key.rect.centerx, key.rect.centery,
+                                [(255, 220, 120), (255, 245, 200), (245, 190, 60)], 30, spread_x=10, spread_y=10)
         
         if self.key_warning_timer > 0:
-            self.key_warning_timer -= 1
+            self.key_warning_timer = max(0, self.key_warning_timer - dt)
         
-        flag_hit = pygame.sprite.spritecollide(self.player, self.flags, False)
+        flag_hit = [flag for player in self.players for rect in player.path for flag in self.flags.query(rect)]
         if flag_hit and self.key_obtained:
             # 有钥匙,可以通过关卡
-            for _ in range(50):
-                self.particles.add(Particle(
-                    flag_hit[0].rect.centerx + random.randint(-20, 20),
-                    flag_hit[0].rect.centery + random.randint(-40, 40),
-                    random.choice([GREEN, (100, 255, 100), (200, 255, 200), COIN_COLOR])
-                ))
+            self.particles.emit(flag_hit[0].rect.centerx, flag_hit[0].rect.centery,
+                                [GREEN, (100, 255, 100), (200, 255, 200), COIN_COLOR], 50, spread_x=20, spread_y=40)
             self.current_level += 1
-            if self.current_level > 6:
+            if self.current_level > len(self.level_files):
                 self.current_level = 1
             self.load_level(self.current_level)
         elif flag_hit and not self.key_obtained:
@@ -1176,105 +2979,376 @@ class Game:
             if self.key_warning_timer == 0:
                 self.key_warning_timer = 120
                 # 只生成一次粒子效果
-                for _ in range(10):
-                    self.particles.add(Particle(
-                        flag_hit[0].rect.centerx + random.randint(-15, 15),
-                        flag_hit[0].rect.centery + random.randint(-40, 40),
-                        random.choice([(255, 180, 80), (255, 100, 100), (255, 220, 120)])
-                    ))
+                self.particles.emit(flag_hit[0].rect.centerx, flag_hit[0].rect.centery,
+                                    [(255, 180, 80), (255, 100, 100), (255, 220, 120)], 10, spread_x=15, spread_y=40)
+        profiler.mark('pickups')
     
     def draw(self):
+        profiler = self.profiler
         if self.game_state == 'start':
             self.draw_start_screen()
+        elif self.dirty_rects and self.game_state == 'playing':
+            self.draw_dirty()
+            return
         else:
             self.draw_background()
+            profiler.mark('background')
             
-            self.all_sprites.draw(self.screen)
-            self.particles.draw(self.screen)
-            
-            if self.player.invincible and self.player.invincible_timer % 10 < 5:
-                glow_surf = pygame.Surface((self.player.width + 20, self.player.height + 20), pygame.SRCALPHA)
-                pygame.draw.ellipse(glow_surf, (255, 255, 100, 100), (0, 0, self.player.width + 20, self.player.height + 20))
-                self.screen.blit(glow_surf, (self.player.rect.x - 10, self.player.rect.y - 10))
-            
-            panel_surf = pygame.Surface((240, 130), pygame.SRCALPHA)
-            pygame.draw.rect(panel_surf, (0, 0, 0, 120), (0, 0, 240, 130), border_radius=10)
-            pygame.draw.rect(panel_surf, (255, 255, 255, 100), (0, 0, 240, 130), 2, border_radius=10)
-            self.screen.blit(panel_surf, (5, 5))
-            
-            score_text = self.small_font.render(f'分数: {self.score}', True, (255, 255, 100))
-            self.screen.blit(score_text, (15, 15))
-            
-            lives_text = self.small_font.render(f'生命: {self.player.lives}', True, (255, 100, 100))
-            self.screen.blit(lives_text, (15, 45))
-            
-            if self.keys_total > 0:
-                key_label = f'钥匙: {min(self.keys_collected, self.keys_total)}/{self.keys_total}'
-            else:
-                key_label = '钥匙: -'
-            key_color = (255, 230, 140) if self.key_obtained and self.keys_total > 0 else (200, 200, 200)
-            key_text = self.small_font.render(key_label, True, key_color)
-            self.screen.blit(key_text, (15, 75))
-            
-            key_icon = pygame.Surface((26, 26), pygame.SRCALPHA)
-            key_ready = self.key_obtained and self.keys_total > 0
-            icon_color = (255, 215, 80) if key_ready else (160, 160, 160)
-            highlight_color = (255, 255, 220) if key_ready else (210, 210, 210)
-            pygame.draw.circle(key_icon, icon_color, (10, 12), 8)
-            pygame.draw.circle(key_icon, highlight_color, (10, 12), 4)
-            pygame.draw.rect(key_icon, icon_color, (16, 10, 8, 4), border_radius=2)
-            pygame.draw.rect(key_icon, icon_color, (18, 14, 6, 3), border_radius=2)
-            self.screen.blit(key_icon, (160, 72))
-            
-            level_text = self.small_font.render(f'关卡: {self.current_level}', True, (100, 255, 100))
-            self.screen.blit(level_text, (15, 105))
-            
-            if not self.key_obtained:
-                for flag in self.flags:
-                    lock_surface = pygame.Surface((26, 34), pygame.SRCALPHA)
-                    pygame.draw.arc(lock_surface, (200, 170, 60), (4, 4, 18, 18), math.pi, math.pi * 2, 4)
-                    pygame.draw.rect(lock_surface, (200, 170, 60), (6, 16, 14, 14), border_radius=4)
-                    pygame.draw.rect(lock_surface, (120, 90, 30), (6, 16, 14, 14), 2, border_radius=4)
-                    pygame.draw.circle(lock_surface, (120, 90, 30), (13, 23), 3, 1)
-                    self.screen.blit(lock_surface, (flag.rect.x + 18, flag.rect.y + 38))
-            
-            if self.player.invincible:
-                invincible_text = self.font.render('无敌状态!', True, (255, 215, 0))
-                invincible_shadow = self.font.render('无敌状态!', True, (100, 100, 0))
-                self.screen.blit(invincible_shadow, (SCREEN_WIDTH // 2 - 98, 12))
-                self.screen.blit(invincible_text, (SCREEN_WIDTH // 2 - 100, 10))
-            
-            if self.key_warning_timer > 0:
-                pulse = abs(math.sin(pygame.time.get_ticks() / 200))
-                warning_alpha = int(180 + pulse * 75)
-                warning_text = self.font.render('需要先找到钥匙!', True, (255, 100, 100))
-                text_surface = pygame.Surface(warning_text.get_size(), pygame.SRCALPHA)
-                text_surface.blit(warning_text, (0, 0))
-                text_surface.set_alpha(warning_alpha)
-                warning_rect = text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 80))
-                self.screen.blit(text_surface, warning_rect)
+            level, moving = self.sprite_layers()
+            self.draw_sprites(level + moving)
+            profiler.mark('sprites')
+            self.particles.draw(self.screen, self.camera.x)
+            profiler.mark('particles_draw')
+            self.draw_hud()
             
             if self.game_state == 'game_over':
-                overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                pygame.draw.rect(overlay, (0, 0, 0, 150), (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
-                self.screen.blit(overlay, (0, 0))
-                
-                game_over_text = self.title_font.render('游戏结束', True, (255, 100, 100))
-                game_over_shadow = self.title_font.render('游戏结束', True, (100, 0, 0))
-                game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
-                self.screen.blit(game_over_shadow, (game_over_rect.x + 3, game_over_rect.y + 3))
-                self.screen.blit(game_over_text, game_over_rect)
-                
-                final_score_text = self.font.render(f'最终分数: {self.score}', True, WHITE)
-                final_score_rect = final_score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
-                self.screen.blit(final_score_text, final_score_rect)
-                
-                restart_text = self.small_font.render('按 R 键重新开始', True, (200, 255, 200))
-                restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60))
-                self.screen.blit(restart_text, restart_rect)
-        
-        pygame.display.flip()
+                self.draw_game_over()
+            profiler.mark('hud')
+        
+        if profiler.enabled:
+            profiler.draw(self.screen, self.profiler_font, self.text_cache)
+        if self.clips is not None:
+            self.clips.capture(self.screen, time.perf_counter())
+            profiler.mark('capture')
+        self.full_redraw = True
+        if not self.headless:
+            pygame.display.flip()
+        profiler.mark('flip')
+    
+    def draw_sprites(self, groups):
+        # 只绘制与视野相交的精灵
+        view = self.camera.view
+        offset = -self.camera.x
+        return self.screen.blits([
+            (sprite.image, sprite.rect.move(offset, 0))
+            for group in groups for sprite in group
+            if view.colliderect(sprite.rect)
+        ])
+    
+    def draw_dirty(self):
+        profiler = self.profiler
+        background = self.get_level_layer()
+        if background is not self.dirty_background:
+            # 关卡层重建 (换关/顶开方块/镜头移动) 后需要整屏重绘
+            self.dirty_background = background
+            self.full_redraw = True
+        if self.full_redraw:
+            self.screen.blit(background, (0, 0))
+        else:
+            for rect in self.dirty_prev:
+                self.screen.blit(background, rect, rect)
+        profiler.mark('background')
+        
+        drawn = self.draw_sprites(self.sprite_layers()[1])
+        profiler.mark('sprites')
+        drawn.extend(self.particles.draw(self.screen, self.camera.x))
+        profiler.mark('particles_draw')
+        drawn.extend(self.draw_hud())
+        profiler.mark('hud')
+        if profiler.enabled:
+            drawn.append(profiler.draw(self.screen, self.profiler_font, self.text_cache))
+        if self.clips is not None:
+            self.clips.capture(self.screen, time.perf_counter())
+            profiler.mark('capture')
+        
+        if not self.headless:
+            if self.full_redraw:
+                pygame.display.flip()
+            else:
+                pygame.display.update(self.dirty_prev + drawn)
+        self.full_redraw = False
+        self.dirty_prev = drawn
+        profiler.mark('flip')
+    
+    def draw_hud(self):
+        hud = self.hud
+        drawn = []
+        for player in self.players:
+            if player.invincible and player.invincible_timer % 10 < 5:
+                glow = hud.glow(player.width + 20, player.height + 20)
+                drawn.append(self.screen.blit(glow, (player.rect.x - self.camera.x - 10, player.rect.y - 10)))
+        
+        drawn.append(self.screen.blit(hud.panel(), (5, 5)))
+        
+        if not self.key_obtained:
+            lock = hud.lock()
+            for flag in self.flags:
+                drawn.append(self.screen.blit(lock, (flag.rect.x - self.camera.x + 18, flag.rect.y + 38)))
+        
+        if any(player.invincible for player in self.players):
+            invincible_text = self.text_cache.render(self.font, '无敌状态!', (255, 215, 0))
+            invincible_shadow = self.text_cache.render(self.font, '无敌状态!', (100, 100, 0))
+            drawn.append(self.screen.blit(invincible_shadow, (SCREEN_WIDTH // 2 - 98, 12)))
+            drawn.append(self.screen.blit(invincible_text, (SCREEN_WIDTH // 2 - 100, 10)))
+        
+        if self.key_warning_timer > 0:
+            pulse = abs(math.sin(pygame.time.get_ticks() / 200))
+            warning = hud.warning(int(180 + pulse * 75))
+            warning_rect = warning.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 80))
+            drawn.append(self.screen.blit(warning, warning_rect))
+        
+        return drawn
+    
+    def draw_game_over(self):
+        self.screen.blit(self.hud.game_over(), (0, 0))
 
-if __name__ == '__main__':
-    game = Game()
+def jump_course(dt, frames=256):
+    # 按住右+跳在地面上连跳, 途经一排地面金币、一排空中金币和两个静止的敌人 (一个被踩扁, 一个撞掉一条命);
+    # 返回每步结束时小猫的状态
+    particles = ParticleSystem(capacity=1024, seed=0)
+    ground = Platform(0, 500, SCREEN_WIDTH, 20)
+    platforms = SpatialGroup(ground, moving=False)
+    coins = SpatialGroup(*[Coin(x, y) for x in range(120, SCREEN_WIDTH - 40, 40) for y in (465, 380)], moving=False)
+    stomped, blocker = [Enemy(x, ground.rect.top - ENEMY_TYPES['goomba'][1], rng=random.Random(0)) for x in (400, 560)]
+    enemies = EnemyGroup(stomped, blocker)
+    stomped.vel_x = blocker.vel_x = 0
+    player = Player(50, ground.rect.top - 50)
+    keys = ScriptedInput()
+    keys.keys[pygame.K_RIGHT] = keys.keys[pygame.K_UP] = True
+    collected = 0
+    trace = []
+    for _ in range(frames // dt):
+        collected += player.update(platforms, enemies, coins, SpatialGroup(), particles, keys.poll(), dt)
+        enemies.update(platforms, SCREEN_WIDTH, dt)
+        trace.append((player.rect.topleft, player.vel_y, player.lives, player.invincible_timer, collected,
+                      stomped.alive(), blocker.alive()))
+    return trace
+
+def check_tunneling(time_steps=(1, 2, 4, 8, 16, 32, 64)):
+    # 大步长自检: 以最大下落速度从高处落向 20 像素厚的砖块, 以及向右跑向一堵墙,
+    # 每种步长下小猫和敌人都应停在砖块/墙面上而不是穿过去; 连跳吃金币、撞敌人时每步结束的位置 (跳跃高度)、
+    # 得分和生命都应与逐帧模拟的同一帧相同。返回失败说明的列表
+    failures = []
+    particles = ParticleSystem(capacity=256, seed=0)
+    empty = SpatialGroup()
+    reference = jump_course(1)
+    for dt in time_steps:
+        trace = jump_course(dt)
+        expected = reference[dt - 1::dt]
+        for step, (state, frame_state) in enumerate(zip(trace, expected), 1):
+            if state != frame_state:
+                failures.append(f'步长 {dt}: 连跳第 {step * dt} 帧与逐帧模拟不同 ({state} != {frame_state})')
+                break
+        
+
+        brick = Platform(300, 400, 80, 20, platform_type='brick')
+        platforms = SpatialGroup(brick, moving=False)
+        player = Player(310, 0)
+        player.vel_y = 15
+        enemy = Enemy(320, 0, rng=random.Random(0))
+        enemies = EnemyGroup(enemy)
+        enemy.vel_x = 0
+        enemy.vel_y = 15
+        for _ in range(1000 // dt):
+            player.update(platforms, empty, empty, empty, particles, ScriptedInput().poll(), dt)
+            enemies.update(platforms, SCREEN_WIDTH, dt)
+        if player.lives != 3 or player.rect.bottom != brick.rect.top:
+            failures.append(f'步长 {dt}: 小猫穿过了砖块 (底边 {player.rect.bottom}, 砖块顶边 {brick.rect.top})')
+        if not enemy.alive() or enemy.rect.bottom != brick.rect.top:
+            failures.append(f'步长 {dt}: 敌人穿过了砖块 (底边 {enemy.rect.bottom}, 砖块顶边 {brick.rect.top})')
+        
+        ground = Platform(0, 500, SCREEN_WIDTH, 20)
+        wall = Platform(500, 300, 20, 200, platform_type='brick')
+        platforms = SpatialGroup(ground, wall, moving=False)
+        player = Player(100, ground.rect.top - 50)
+        player.world_width = SCREEN_WIDTH
+        keys = ScriptedInput()
+        keys.keys[pygame.K_RIGHT] = True
+        for _ in range(1000 // dt):
+            player.update(platforms, empty, empty, empty, particles, keys.poll(), dt)
+        if player.rect.right != wall.rect.left:
+            failures.append(f'步长 {dt}: 小猫穿过了墙 (右边 {player.rect.right}, 墙左边 {wall.rect.left})')
+    return failures
+
+def input_trace(level, level_dir=LEVEL_DIR, frames=1500, seed=0):
+    # 用固定种子生成的随机按键 (每 12 帧换一次) 玩一个关卡, 返回每帧的状态校验值
+    game = Game(headless=True, level_dir=level_dir, seed=seed, verbose=False)
+    game.start_run(level)
+    rng = random.Random(seed)
+    keys = game.input.keys
+    checksums = []
+    for frame in range(frames):
+        if frame % 12 == 0:
+            keys[pygame.K_LEFT] = rng.random() < 0.5
+            keys[pygame.K_RIGHT] = rng.random() < 0.5
+            keys[pygame.K_UP] = rng.random() < 0.5
+        game.update()
+        if game.game_state == 'game_over':
+            game.start_run(level)
+        checksums.append(game.state_checksum())
+    return checksums
+
+def compare_traces(owner, switch, value, level_dir=LEVEL_DIR, frames=1500, seeds=(0, 1, 2)):
+    # 差分检查: 每个关卡分别在 owner.switch = value (对照做法) 和默认做法下玩同几段随机按键,
+    # 每帧的状态校验值都应相同。返回失败说明的列表
+    failures = []
+    default = getattr(owner, switch)
+    for level in range(1, len(list_level_files(level_dir)) + 1):
+        for seed in seeds:
+            try:
+                setattr(owner, switch, value)
+                expected = input_trace(level, level_dir, frames, seed)
+            finally:
+                setattr(owner, switch, default)
+            actual = input_trace(level, level_dir, frames, seed)
+            for frame, (checksum, reference) in enumerate(zip(actual, expected)):
+                if checksum != reference:
+                    failures.append(f'关卡 {level} 种子 {seed}: 第 {frame} 帧与对照结果不同 '
+                                    f'({checksum:08x} != {reference:08x})')
+                    break
+    return failures
+
+def check_broadphase(level_dir=LEVEL_DIR, frames=1500):
+    # 空间哈希查询对照逐个遍历整组 (建立空间哈希之前的做法)
+    return compare_traces(SpatialGroup, 'linear_scan', True, level_dir, frames)
+
+def check_enemy_batch(level_dir=LEVEL_DIR, frames=1500):
+    # 敌人批量推进对照逐个调用 Enemy.update
+    return compare_traces(EnemyGroup, 'vectorized', False, level_dir, frames)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Super Kitten Adventure - 超级小猫冒险')
+    parser.add_argument('--headless', action='store_true', help='无窗口快进模拟, 不限制帧率')
+    parser.add_argument('--frames', type=int, default=FPS * 60, help='无窗口模式下模拟的帧数')
+    parser.add_argument('--time-step', type=int, default=1,
+                        help='无窗口模式下每次更新推进的帧数 (大于 1 时快进; 小猫在步内逐帧推进, 跳跃和拾取与逐帧模拟相同)')
+    parser.add_argument('--check-tunneling', action='store_true', help='检查大步长下不会穿过平台, 跳跃和拾取与逐帧模拟相同')
+    parser.add_argument('--check-broadphase', action='store_true', help='检查空间哈希碰撞查询与逐个遍历的结果逐帧一致')
+    parser.add_argument('--check-enemy-batch', action='store_true', help='检查敌人批量推进与逐个调用 Enemy.update 的结果逐帧一致')
+    parser.add_argument('--render-every', type=int, default=0, help='每 N 帧渲染一次 (0 表示不渲染)')
+    parser.add_argument('--level', type=int, default=1, help='起始关卡 (窗口游戏按空格开局和无窗口模拟都从这一关开始)')
+    parser.add_argument('--fps', type=int, default=FPS, help='渲染帧率上限 (0 表示不限制); 游戏速度固定为每秒 60 步, 与渲染帧率无关')
+    parser.add_argument('--dirty-rects', action='store_true', help='只重绘变化区域 (适合软件渲染的显示器)')
+    parser.add_argument('--levels', default=LEVEL_DIR, help='关卡目录 (包含 level_N.json)')
+    parser.add_argument('--profile', action='store_true', help='启动时打开逐帧计时 (F3 切换)')
+    parser.add_argument('--profile-out', help='无窗口模式结束后把逐帧计时导出到 CSV/JSON 文件')
+    parser.add_argument('--seed', type=int, help='随机种子 (默认随机)')
+    parser.add_argument('--record', help='把本局按键录制到文件 (按空格开局时开始录制)')
+    parser.add_argument('--replay', help='回放录像文件; 配合 --headless 时快进回放')
+    parser.add_argument('--validate-levels', action='store_true', help='校验关卡目录中的所有关卡并报告加载耗时')
+    parser.add_argument('--clip-seconds', type=float, default=0, help='即时回放: 保留最近 N 秒的画面, 按 F8 导出 (0 表示关闭)')
+    parser.add_argument('--clip-fps', type=int, default=30, help='即时回放的帧率')
+    parser.add_argument('--clip-scale', type=int, default=2, help='即时回放画面缩小的倍数 (1 表示原尺寸)')
+    parser.add_argument('--clip-raw', action='store_true', help='即时回放导出为不压缩的原始帧')
+    parser.add_argument('--unpack-clip', nargs=2, metavar=('CLIP', 'DIR'), help='把导出的回放片段解成 PNG 图片')
+    args = parser.parse_args(argv)
+    if args.unpack_clip:
+        clip, directory = args.unpack_clip
+        os.makedirs(directory, exist_ok=True)
+        count = 0
+        try:
+            for seq, _, rgb in ClipRecorder.read(clip):
+                pygame.image.save(pygame.surfarray.make_surface(rgb.transpose(1, 0, 2)),
+                                  os.path.join(directory, f'frame_{seq:08d}.png'))
+                count += 1
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(f"已解出 {count} 帧: {directory}")
+        return
+    if args.record and (args.headless or args.replay):
+        parser.error('--record 只能用于窗口模式的正常游戏')
+    if args.time_step < 1:
+        parser.error('--time-step 必须是正整数')
+    level_count = len(list_level_files(args.levels))
+    if level_count and not 1 <= args.level <= level_count:
+        parser.error(f'--level 必须在 1 到 {level_count} 之间 ({args.levels} 中共 {level_count} 关)')
+    if args.time_step > 1 and (args.replay or not args.headless):
+        parser.error('--time-step 只能用于无窗口模式的模拟 (录像按单帧回放)')
+    if args.check_tunneling:
+        pygame.display.init()
+        failures = check_tunneling()
+        for failure in failures:
+            print(f"[错误] {failure}")
+        if not failures:
+            print('大步长碰撞检查通过')
+        pygame.quit()
+        sys.exit(1 if failures else 0)
+    if args.check_broadphase:
+        failures = check_broadphase(args.levels)
+        for failure in failures:
+            print(f"[错误] {failure}")
+        if not failures:
+            print(f"空间哈希对照检查通过: {len(list_level_files(args.levels))} 个关卡")
+        pygame.quit()
+        sys.exit(1 if failures else 0)
+    if args.check_enemy_batch:
+        failures = check_enemy_batch(args.levels)
+        for failure in failures:
+            print(f"[错误] {failure}")
+        if not failures:
+            print(f"敌人批量推进对照检查通过: {len(list_level_files(args.levels))} 个关卡")
+        pygame.quit()
+        sys.exit(1 if failures else 0)
+    log = None
+    if args.replay:
+        try:
+            log = InputLog.load(args.replay)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    
+    if args.validate_levels:
+        game = Game(headless=True, level_dir=args.levels)
+        failed = 0
+        for number, path in enumerate(game.level_files, 1):
+            try:
+                game.load_level(number)
+            except ValueError as e:
+                failed += 1
+                print(f"[错误] {e}")
+                continue
+            print(f"[通过] {os.path.basename(path)}: 平台 {len(game.platforms)}  金币 {len(game.coins)}  "
+                  f"敌人 {len(game.enemies)}  加载 {game.level_load_ms:.2f} ms")
+        pygame.quit()
+        sys.exit(1 if failed else 0)
+    
+    if args.headless and log is not None:
+        game = Game(headless=True, dirty_rects=args.dirty_rects, level_dir=args.levels)
+        stats = game.run_replay(log, args.render_every)
+        print(f"回放帧数: {stats['frames']}  耗时: {stats['seconds']:.2f} 秒  模拟帧率: {stats['fps']:.0f} FPS")
+        matched = game.report_replay()
+        pygame.quit()
+        sys.exit(0 if matched else 1)
+    
+    if args.headless:
+        game = Game(headless=True, dirty_rects=args.dirty_rects, level_dir=args.levels, seed=args.seed)
+        game.report_startup()
+        if args.profile or args.profile_out:
+            game.profiler = FrameProfiler(history=args.frames)
+            game.profiler.enabled = True
+        stats = game.run_headless(args.frames, args.level, args.render_every, args.time_step)
+        print(f"模拟帧数: {stats['frames']} ({stats['steps']} 步)  渲染帧数: {stats['rendered']}  重开次数: {stats['restarts']}")
+        print(f"耗时: {stats['seconds']:.2f} 秒  模拟帧率: {stats['fps']:.0f} FPS "
+              f"(实时的 {stats['fps'] / FPS:.1f} 倍)")
+        print(f"关卡加载: {stats['level_loads']} 次  平均 {stats['level_load_ms']:.2f} ms")
+        print('对象池: ' + '  '.join(f"{kind} 新建 {pool['created']} 复用 {pool['reused']} ({pool['reuse_rate']:.0%}) "
+                                     f"池中 {pool['free']}" for kind, pool in stats['pools'].items()))
+        if game.profiler.enabled:
+            averages = sorted(game.profiler.averages().items(), key=lambda item: -item[1])
+            print('各阶段平均耗时: ' + '  '.join(f'{phase} {value:.3f} ms' for phase, value in averages if value > 0))
+        if args.profile_out:
+            count = game.profiler.export(args.profile_out)
+            print(f"已导出 {count} 帧计时数据: {args.profile_out}")
+        pygame.quit()
+        return
+    
+    game = Game(dirty_rects=args.dirty_rects, level_dir=args.levels, seed=args.seed)
+    game.profiler.enabled = args.profile
+    game.max_fps = args.fps
+    # 按空格开局时从 --level 指定的关卡开始, 录像头部记下同一关卡
+    game.current_level = args.level
+    if args.clip_seconds > 0:
+        try:
+            clips = game.enable_clips(args.clip_seconds, args.clip_fps, args.clip_scale, not args.clip_raw)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"即时回放: 最近 {args.clip_seconds:g} 秒, {clips.size[0]}x{clips.size[1]} @ {args.clip_fps} FPS, "
+              f"缓冲区 {clips.nbytes / 1024 / 1024:.0f} MB (F8 导出)")
+    if args.record:
+        game.record_path = args.record
+        game.recording = InputLog(game.seed, game.current_level)
+    if log is not None:
+        game.start_replay(log)
     game.run()
+
+if __name__ == '__main__':
+    main()
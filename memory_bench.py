@@ -0,0 +1,131 @@
+import gc
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+import pygame
+
+from mario_game import (Coin, Enemy, PowerUp, Key, Platform, Flag, ParticleSystem, LevelTemplate,
+                        GROUND_COLOR, BRICK_COLOR, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# 内存压力测试: 分别创建 1k/10k/100k 个同类实体, 用 tracemalloc 统计每个实体占用的字节数。
+#
+# - 精灵: 在场上 (视野附近) 的实体对象, 贴图来自 IMAGE_CACHE, 不计入
+# - 模板: 关卡模板 (校验后的关卡数据、紧凑记录和区块索引), 视野外的实体只占这一部分
+# - 副本: 每次载入关卡时从模板复制出的记录和索引
+# - 粒子没有对象, 只统计结构数组
+#
+#   python memory_bench.py                          # 全部类型, 1000/10000/100000 个
+#   python memory_bench.py coin enemy --counts 1000 50000 --json memory.json
+
+COUNTS = (1000, 10000, 100000)
+GROUND_Y = SCREEN_HEIGHT - 50
+FIELDS = {'coin': 'coins', 'enemy': 'enemies', 'powerup': 'powerups', 'key': 'keys', 'platform': 'platforms', 'flag': 'flags'}
+
+def make_rows(kind, count, seed=0):
+    # 按每 20 像素一个实体铺开, 区块索引的规模和真实的超长关卡相当
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        x = i * 20
+        if kind == 'platform':
+            rows.append((x, rng.randrange(200, GROUND_Y, 10), 40, 20, rng.choice(['brick', 'mystery'])))
+        elif kind == 'enemy':
+            rows.append((x, GROUND_Y - 50, rng.choice(['goomba', 'koopa'])))
+        elif kind == 'powerup':
+            rows.append((x, rng.randrange(200, GROUND_Y), rng.choice(['life', 'star'])))
+        else:
+            rows.append((x, rng.randrange(200, GROUND_Y)))
+    return rows
+
+def make_sprite(kind, row, rng):
+    if kind == 'coin':
+        return Coin(*row)
+    if kind == 'enemy':
+        return Enemy(*row, rng=rng)
+    if kind == 'powerup':
+        return PowerUp(*row, rng=rng)
+    if kind == 'key':
+        return Key(*row, rng=rng)
+    if kind == 'flag':
+        return Flag(*row)
+    x, y, w, h, ptype = row
+    return Platform(x, y, w, h, GROUND_COLOR if ptype == 'ground' else BRICK_COLOR, ptype)
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = build()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return result, used
+
+def measure(kind, count, seed=0):
+    if kind == 'particle':
+        # 扣除与容量无关的固定开销
+        ParticleSystem(capacity=0)
+        _, empty = traced(lambda: ParticleSystem(capacity=0))
+        _, used = traced(lambda: ParticleSystem(capacity=count))
+        return {'sprite': (used - empty) / count}
+
+    rows = make_rows(kind, count, seed)
+    rng = random.Random(seed)
+    # 先建几个, 让各种贴图进入 IMAGE_CACHE
+    for row in rows[:50]:
+        make_sprite(kind, row, rng)
+
+    sprites, used = traced(lambda: [make_sprite(kind, row, rng) for row in rows])
+    sprite_bytes = (used - sys.getsizeof(sprites)) / count
+    del sprites
+
+    data = {field: [] for field in FIELDS.values()}
+    data[FIELDS[kind]] = [list(row) for row in rows]
+    data['width'] = max(SCREEN_WIDTH, count * 20)
+    if kind != 'flag':
+        data['flags'].append([data['width'] - 100, GROUND_Y - 150])
+    with tempfile.TemporaryDirectory() as level_dir:
+        path = os.path.join(level_dir, 'level_1.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        template, used = traced(lambda: LevelTemplate(path))
+    template_bytes = used / count
+    _, used = traced(template.clone)
+    return {'sprite': sprite_bytes, 'template': template_bytes, 'clone': used / count}
+
+def main(argv=None):
+    kinds = ('coin', 'enemy', 'powerup', 'key', 'platform', 'flag', 'particle')
+    parser = argparse.ArgumentParser(description='Super Kitten Adventure 实体内存占用测试')
+    parser.add_argument('kinds', nargs='*', help=f'要测试的类型 (默认全部): {", ".join(kinds)}')
+    parser.add_argument('--counts', type=int, nargs='+', default=list(COUNTS), help='实体数量 (默认 1000 10000 100000)')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    names = args.kinds or list(kinds)
+    unknown = [name for name in names if name not in kinds]
+    if unknown:
+        parser.error(f'未知类型: {", ".join(unknown)}')
+
+    pygame.font.init()
+    results = {}
+    print(f"{'类型':<10}{'数量':>8}{'精灵 B/个':>12}{'模板 B/个':>12}{'副本 B/个':>12}")
+    for kind in names:
+        results[kind] = {}
+        for count in args.counts:
+            result = measure(kind, count)
+            results[kind][count] = result
+            columns = ''.join(f"{result[key]:12.0f}" if key in result else f"{'-':>12}"
+                              for key in ('sprite', 'template', 'clone'))
+            print(f"{kind:<10}{count:>8}{columns}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.json}")
+    pygame.quit()
+
+if __name__ == '__main__':
+    main()
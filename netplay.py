@@ -0,0 +1,569 @@
+import sys
+import time
+import heapq
+import socket
+import select
+import struct
+import random
+import argparse
+import multiprocessing as mp
+import zlib
+
+import numpy as np
+import pygame
+
+from mario_game import Game, ParticleSystem, ScriptedInput, InputLog, LEVEL_DIR, FPS, SIM_STEP, list_level_files
+
+# 双人联机合作 (回滚网络同步): 两端运行同一个确定性的模拟, 只交换每帧的按键。
+#
+# - 本地按键延迟 input_delay 帧生效, 对端按键未到时沿用它最后一次确认的按键 (预测) 继续模拟
+# - 每帧模拟前保存一份完整快照 (mario_game.Snapshot); 对端真实按键到达后若与预测不同,
+#   恢复到出错的那一帧并重新模拟到当前帧, 一帧之内完成, 画面上只是轻微跳动
+# - 领先对端太多 (超过 max_rollback 帧) 时暂停一帧等待; 双方还交换"领先帧数", 领先的一方偶尔停一帧追平
+# - 每个数据包都带上对端尚未确认的全部本地按键, 丢包不需要重传
+# - 每 CHECK_INTERVAL 帧对双方都已确认的快照做 CRC32 并交换, 发现不同步立即报告
+# - 粒子不属于快照, 重新模拟时使用一个空的粒子系统, 画面上的粒子不受回滚影响
+#
+# 数据包经过一个本地 UDP 中转 (relay), 它可以模拟延迟、抖动和丢包:
+#
+#   python netplay.py relay --port 7000 --rtt 100 --loss 0.05     # 中转, 往返延迟 100 ms, 丢包 5%
+#   python netplay.py play --player 1 --relay 127.0.0.1:7000      # 1P 窗口
+#   python netplay.py play --player 2 --relay 127.0.0.1:7000      # 2P 窗口
+#   python netplay.py loopback --rtt 100 --loss 0.05 --frames 1800  # 两个无窗口实例 + 机器人按键, 检查同步
+#   python netplay.py bench --rollback 8                          # 重新模拟吞吐: 一帧预算内能回滚多少帧
+
+MAGIC = b'KNET'
+PROTOCOL = 1
+HEAD = struct.Struct('<4sB')
+HELLO = struct.Struct('<HBIH')
+INPUTS = struct.Struct('<IiIhIIB')
+HELLO_KIND, INPUTS_KIND = 0, 1
+NO_CHECK = 0xFFFFFFFF
+CHECK_INTERVAL = 30
+SYNC_INTERVAL = 6
+MAX_BATCH = 255
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'无法解析地址 {text!r}, 应为 主机:端口')
+    return host, int(port)
+
+class UdpTransport:
+    # 非阻塞 UDP 套接字, 所有数据包都发给中转
+    def __init__(self, relay):
+        self.relay = relay
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(('0.0.0.0', 0))
+
+    def send(self, data):
+        try:
+            self.sock.sendto(data, self.relay)
+        except OSError:
+            # 中转还没启动时 (ICMP 端口不可达) 当作丢包
+            pass
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, ConnectionError):
+                return packets
+            packets.append(data)
+
+    def close(self):
+        self.sock.close()
+
+def run_relay(port, rtt=0.0, jitter=0.0, loss=0.0, seed=None, host='127.0.0.1', verbose=True):
+    # 把一端的数据包转发给另一端: 单程延迟 rtt/2 加上 0~jitter 的随机抖动 (可能乱序), 按 loss 概率丢弃
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+    peers = []
+    queue = []
+    sequence = 0
+    forwarded = dropped = 0
+    if verbose:
+        print(f"中转已启动: {host}:{port}  往返延迟 {rtt:.0f} ms  抖动 {jitter:.0f} ms  丢包 {loss:.0%}")
+    try:
+        while True:
+            now = time.perf_counter()
+            while queue and queue[0][0] <= now:
+                _, _, data, address = heapq.heappop(queue)
+                sock.sendto(data, address)
+            timeout = max(0.0, queue[0][0] - now) if queue else 0.5
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                continue
+            try:
+                data, address = sock.recvfrom(2048)
+            except ConnectionError:
+                continue
+            if address not in peers:
+                if len(peers) == 2:
+                    continue
+                peers.append(address)
+                if verbose:
+                    print(f"{len(peers)}P 已连接: {address[0]}:{address[1]}")
+            if len(peers) < 2:
+                continue
+            if rng.random() < loss:
+                dropped += 1
+                continue
+            other = peers[1 - peers.index(address)]
+            due = time.perf_counter() + (rtt / 2 + rng.uniform(0, jitter)) / 1000
+            heapq.heappush(queue, (due, sequence, data, other))
+            sequence += 1
+            forwarded += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        if verbose:
+            print(f"中转结束: 转发 {forwarded} 个数据包, 丢弃 {dropped} 个")
+
+class RollbackSession:
+    # 一端的回滚会话: index 为 0 时本地控制 1P, 为 1 时控制 2P
+    def __init__(self, game, index, transport, input_delay=2, max_rollback=8):
+        if index not in (0, 1):
+            raise ValueError(f'玩家编号应为 0 或 1, 而不是 {index}')
+        if max_rollback < 1:
+            raise ValueError('max_rollback 至少为 1')
+        self.game = game
+        self.index = index
+        self.transport = transport
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        game.input = ScriptedInput()
+        game.partner_input = ScriptedInput()
+        self.muted = ParticleSystem(capacity=0)
+        # 下一个要模拟的帧; 本地按键 (前 input_delay 帧为空) 和对端已确认的按键, 都按帧号连续存放
+        self.frame = 0
+        self.local = bytearray(input_delay)
+        self.remote = bytearray()
+        self.predicted = {}
+        self.states = {}
+        self.rollback_to = None
+        self.local_acked = -1
+        self.remote_frame = -1
+        self.remote_advantage = 0
+        self.last_sync = 0
+        self.ticks = 0
+        self.checks = {}
+        self.remote_checks = {}
+        self.verified = -1
+        self.hello = None
+        self.connected = False
+        self.desync_frame = None
+        self.stats = {'frames': 0, 'stalls': 0, 'rollbacks': 0, 'resimulated': 0, 'max_depth': 0,
+                      'sent': 0, 'received': 0, 'verified': 0, 'rollback_ms': []}
+
+    def start(self, level, seed):
+        game = self.game
+        game.seed = seed
+        game.rng.seed(seed)
+        game.start_run(level)
+
+    def greet(self, level, seed):
+        self.hello = HEAD.pack(MAGIC, HELLO_KIND) + HELLO.pack(PROTOCOL, self.index, seed, level)
+        self.transport.send(self.hello)
+
+    def connect(self, level, seed, timeout=30.0):
+        # 反复发送握手包, 直到收到对端的握手或按键包; 双方的关卡和种子必须一致
+        deadline = time.perf_counter() + timeout
+        while not self.connected:
+            if time.perf_counter() > deadline:
+                raise ValueError(f'{timeout:.0f} 秒内没有连上对端')
+            self.greet(level, seed)
+            for data in self.transport.receive():
+                self.handle(data, level, seed)
+            if pygame.display.get_init():
+                pygame.event.pump()
+            time.sleep(0.05)
+        self.start(level, seed)
+
+    def handle(self, data, level=None, seed=None):
+        try:
+            magic, kind = HEAD.unpack_from(data)
+            if magic != MAGIC:
+                return
+            if kind == HELLO_KIND:
+                protocol, index, remote_seed, remote_level = HELLO.unpack_from(data, HEAD.size)
+                if protocol != PROTOCOL:
+                    raise ValueError(f'对端的协议版本 {protocol} 与本地 {PROTOCOL} 不同')
+                if index == self.index:
+                    raise ValueError(f'两端都是 {index + 1}P')
+                if level is not None and (remote_seed, remote_level) != (seed, level):
+                    raise ValueError(f'对端的关卡/种子 ({remote_level}, {remote_seed}) 与本地 ({level}, {seed}) 不同')
+                self.connected = True
+                # 对端可能还没收到我们的握手
+                if self.frame == 0 and self.hello is not None:
+                    self.transport.send(self.hello)
+            elif kind == INPUTS_KIND:
+                self.connected = True
+                self.receive_inputs(data)
+        except struct.error:
+            # 残缺的数据包当作丢包
+            return
+
+    def receive_inputs(self, data):
+        first, ack, frame, advantage, check_frame, check, count = INPUTS.unpack_from(data, HEAD.size)
+        masks = data[HEAD.size + INPUTS.size:HEAD.size + INPUTS.size + count]
+        if len(masks) != count:
+            raise struct.error('按键数据不完整')
+        self.stats['received'] += 1
+        self.local_acked = max(self.local_acked, ack)
+        if frame > self.remote_frame:
+            self.remote_frame = frame
+            self.remote_advantage = advantage
+        remote = self.remote
+        for offset in range(len(remote) - first, count):
+            if offset < 0:
+                # 中间缺了一段, 等下一个数据包
+                break
+            mask = masks[offset]
+            target = first + offset
+            remote.append(mask)
+            guess = self.predicted.pop(target, None)
+            if guess is not None and guess != mask:
+                self.rollback_to = target if self.rollback_to is None else min(self.rollback_to, target)
+        if check_frame != NO_CHECK and check_frame > self.verified:
+            self.remote_checks[check_frame] = check
+
+    def remote_input(self, frame):
+        if frame < len(self.remote):
+            return self.remote[frame], False
+        return (self.remote[-1] if self.remote else 0), True
+
+    def simulate(self, frame):
+        game = self.game
+        remote, guessed = self.remote_input(frame)
+        if guessed:
+            self.predicted[frame] = remote
+        local = self.local[frame]
+        p1, p2 = (local, remote) if self.index == 0 else (remote, local)
+        game.input.keys = InputLog.decode(p1)
+        game.partner_input.keys = InputLog.decode(p2)
+        game.update()
+
+    def rollback(self, target):
+        # 恢复到 target 帧开始时的快照, 用现在已知的按键重新模拟到当前帧; 返回耗时 (毫秒)
+        start = time.perf_counter()
+        game = self.game
+        particles = game.particles
+        game.particles = self.muted
+        try:
+            game.restore(self.states[target])
+            for frame in range(target, self.frame):
+                if frame != target:
+                    self.states[frame] = game.snapshot()
+                self.simulate(frame)
+        finally:
+            game.particles = particles
+        elapsed = (time.perf_counter() - start) * 1000
+        stats = self.stats
+        depth = self.frame - target
+        stats['rollbacks'] += 1
+        stats['resimulated'] += depth
+        stats['max_depth'] = max(stats['max_depth'], depth)
+        stats['rollback_ms'].append(elapsed)
+        return elapsed
+
+    def should_wait(self):
+        # 预测的帧数已到上限, 或比对端领先 (按双方各自报告的领先帧数之差的一半估算)
+        if self.frame - len(self.remote) >= self.max_rollback:
+            return True
+        if self.remote_frame < 0 or self.ticks - self.last_sync < SYNC_INTERVAL:
+            return False
+        if (self.frame - self.remote_frame) - self.remote_advantage >= 2:
+            self.last_sync = self.ticks
+            return True
+        return False
+
+    def advance(self, keys):
+        # 推进一帧: 记录本地按键 (input_delay 帧后生效), 保存快照, 模拟
+        self.local.append(InputLog.encode(keys))
+        self.states[self.frame] = self.game.snapshot()
+        self.simulate(self.frame)
+        self.frame += 1
+        self.stats['frames'] += 1
+
+    def tick(self, keys):
+        # 每个 60 Hz 步调用一次: 收包 -> 必要时回滚 -> 推进或等待 -> 发包 -> 校验
+        self.ticks += 1
+        if self.transport is not None:
+            for data in self.transport.receive():
+                self.handle(data)
+        if self.rollback_to is not None:
+            self.rollback(self.rollback_to)
+            self.rollback_to = None
+        if self.should_wait():
+            self.stats['stalls'] += 1
+        else:
+            self.advance(keys)
+        self.verify()
+        if self.transport is not None:
+            self.send()
+
+    def send(self):
+        first = self.local_acked + 1
+        masks = bytes(self.local[first:first + MAX_BATCH])
+        check_frame = max(self.checks, default=NO_CHECK)
+        check = self.checks.get(check_frame, 0)
+        advantage = max(-32768, min(32767, self.frame - self.remote_frame))
+        self.transport.send(HEAD.pack(MAGIC, INPUTS_KIND) +
+                            INPUTS.pack(first, len(self.remote) - 1, self.frame, advantage, check_frame, check, len(masks)) +
+                            masks)
+        self.stats['sent'] += 1
+
+    def verify(self):
+        # 对端按键已确认的帧, 快照不会再变: 定期做校验, 然后丢掉回滚用不到的快照
+        confirmed = len(self.remote)
+        for frame in [frame for frame in self.states if frame <= confirmed]:
+            if frame % CHECK_INTERVAL == 0 and frame not in self.checks:
+                self.checks[frame] = zlib.crc32(self.states[frame])
+        for frame, check in list(self.remote_checks.items()):
+            if frame in self.checks:
+                self.verified = max(self.verified, frame)
+                self.stats['verified'] += 1
+                if check != self.checks[frame] and self.desync_frame is None:
+                    self.desync_frame = frame
+                    print(f"[不同步] {self.index + 1}P: 第 {frame} 帧的状态与对端不同")
+                del self.remote_checks[frame]
+            elif frame < confirmed - CHECK_INTERVAL * 4:
+                # 本地的校验值已经丢弃, 无法再比对
+                del self.remote_checks[frame]
+        for frame in [frame for frame in self.checks if frame < confirmed - CHECK_INTERVAL * 4]:
+            del self.checks[frame]
+        keep = min(confirmed, self.frame - self.max_rollback)
+        for frame in [frame for frame in self.states if frame < keep]:
+            del self.states[frame]
+
+    def report(self):
+        stats = self.stats
+        times = np.array(stats['rollback_ms'] or [0.0])
+        return {
+            'frames': stats['frames'],
+            'stalls': stats['stalls'],
+            'rollbacks': stats['rollbacks'],
+            'resimulated': stats['resimulated'],
+            'max_depth': stats['max_depth'],
+            'rollback_mean_ms': float(times.mean()),
+            'rollback_p99_ms': float(np.percentile(times, 99)),
+            'rollback_max_ms': float(times.max()),
+            'sent': stats['sent'],
+            'received': stats['received'],
+            'verified': stats['verified'],
+            'desync_frame': self.desync_frame,
+        }
+
+    def summary(self):
+        r = self.report()
+        status = '同步' if r['desync_frame'] is None else f"第 {r['desync_frame']} 帧不同步"
+        return (f"{self.index + 1}P: {r['frames']} 帧  等待 {r['stalls']} 次  回滚 {r['rollbacks']} 次 "
+                f"(共重新模拟 {r['resimulated']} 帧, 最深 {r['max_depth']} 帧)  回滚耗时 平均 {r['rollback_mean_ms']:.2f} ms "
+                f"p99 {r['rollback_p99_ms']:.2f} ms 最长 {r['rollback_max_ms']:.2f} ms  "
+                f"收发 {r['received']}/{r['sent']} 包  校验 {r['verified']} 次 {status}")
+
+def bot_keys(index, frame):
+    # 测试用按键: 两只小猫都向右跑, 起跳节奏不同, 2P 每两秒后退一小段, 让预测经常出错
+    if index == 0:
+        mask = 0b010 | (0b100 if frame % 45 < 12 else 0)
+    else:
+        mask = (0b001 if frame % 120 >= 100 else 0b010) | (0b100 if frame % 37 < 8 else 0)
+    return InputLog.decode(mask)
+
+def run_loopback(frames, level, seed, rtt, jitter, loss, port, input_delay, max_rollback, level_dir):
+    # 启动一个中转子进程, 在当前进程里以 60 Hz 交替推进两个无窗口实例
+    context = mp.get_context('spawn')
+    relay = context.Process(target=run_relay, args=(port, rtt, jitter, loss, seed, '127.0.0.1', False), daemon=True)
+    relay.start()
+    sessions = []
+    try:
+        for index in (0, 1):
+            game = Game(headless=True, level_dir=level_dir, seed=seed, verbose=False, coop=True)
+            sessions.append(RollbackSession(game, index, UdpTransport(('127.0.0.1', port)), input_delay, max_rollback))
+        deadline = time.perf_counter() + 10
+        while not all(session.connected for session in sessions):
+            if time.perf_counter() > deadline:
+                raise ValueError('10 秒内没有连上中转')
+            for session in sessions:
+                session.greet(level, seed)
+            time.sleep(0.05)
+            for session in sessions:
+                for data in session.transport.receive():
+                    session.handle(data, level, seed)
+        for session in sessions:
+            session.start(level, seed)
+
+        start = next_tick = time.perf_counter()
+        while min(session.frame for session in sessions) < frames:
+            for session in sessions:
+                session.tick(bot_keys(session.index, session.frame))
+            next_tick += SIM_STEP
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        # 再跑一小段, 让最后的按键和校验值送达
+        for _ in range(int((rtt + jitter) / 1000 * FPS) + CHECK_INTERVAL * 2):
+            for session in sessions:
+                session.tick(bot_keys(session.index, session.frame))
+            time.sleep(SIM_STEP)
+        elapsed = time.perf_counter() - start
+    finally:
+        for session in sessions:
+            session.transport.close()
+        relay.terminate()
+        relay.join()
+
+    common = sorted(set(sessions[0].checks) & set(sessions[1].checks))
+    matched = all(sessions[0].checks[frame] == sessions[1].checks[frame] for frame in common)
+    return sessions, elapsed, common, matched
+
+def run_bench(level, depth, repeats, warmup, seed, level_dir):
+    # 在真实的回滚路径上计时: 对端按键全部已知, 每推进一帧就回滚 depth 帧重新模拟一次
+    game = Game(headless=True, level_dir=level_dir, seed=seed, verbose=False, coop=True)
+    session = RollbackSession(game, 0, None, input_delay=0, max_rollback=depth)
+    session.start(level, seed)
+    for frame in range(warmup):
+        session.remote.append(InputLog.encode(bot_keys(1, frame)))
+        session.tick(bot_keys(0, frame))
+
+    rollback_ms = []
+    restore_ms = []
+    advance_ms = []
+    for frame in range(warmup, warmup + repeats):
+        session.remote.append(InputLog.encode(bot_keys(1, frame)))
+        start = time.perf_counter()
+        session.tick(bot_keys(0, frame))
+        advance_ms.append((time.perf_counter() - start) * 1000)
+        target = session.frame - depth
+        start = time.perf_counter()
+        game.restore(session.states[target])
+        restore_ms.append((time.perf_counter() - start) * 1000)
+        rollback_ms.append(session.rollback(target))
+
+    rollback = np.array(rollback_ms)
+    restore = float(np.median(restore_ms))
+    per_frame = max(1e-6, (float(np.median(rollback)) - restore) / depth)
+    advance = float(np.median(advance_ms))
+    budget = 1000 / FPS
+    return {
+        'level': level,
+        'depth': depth,
+        'snapshot_bytes': len(session.states[session.frame - 1]),
+        'advance_ms': advance,
+        'restore_ms': restore,
+        'resim_frame_ms': per_frame,
+        'rollback_p50_ms': float(np.median(rollback)),
+        'rollback_p99_ms': float(np.percentile(rollback, 99)),
+        'rollback_max_ms': float(rollback.max()),
+        # 一帧预算扣掉正常推进的一帧和一次恢复后, 还能重新模拟的帧数
+        'budget_frames': int(max(0.0, budget - advance - restore) / per_frame),
+    }
+
+def play(args):
+    game = Game(level_dir=args.levels, seed=args.seed, verbose=False, coop=True)
+    index = args.player - 1
+    session = RollbackSession(game, index, UdpTransport(parse_address(args.relay)), args.input_delay, args.max_rollback)
+    caption = f"Super Kitten Adventure - 联机合作 {args.player}P"
+    pygame.display.set_caption(f"{caption} (等待对端...)")
+    session.connect(args.level, args.seed, args.timeout)
+    clock = pygame.time.Clock()
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                running = False
+        session.tick(pygame.key.get_pressed())
+        game.draw()
+        if session.ticks % FPS == 0:
+            stats = session.stats
+            pygame.display.set_caption(f"{caption}  领先 {session.frame - len(session.remote)} 帧  "
+                                       f"回滚 {stats['rollbacks']} 次  等待 {stats['stalls']} 次")
+        clock.tick(FPS)
+    session.transport.close()
+    print(session.summary())
+    pygame.quit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Super Kitten Adventure 双人联机合作 (回滚网络同步)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    relay = commands.add_parser('relay', help='启动本地 UDP 中转, 可模拟延迟和丢包')
+    relay.add_argument('--host', default='127.0.0.1')
+    relay.add_argument('--port', type=int, default=7000)
+
+    play_parser = commands.add_parser('play', help='连接中转, 开一个游戏窗口')
+    play_parser.add_argument('--player', type=int, choices=(1, 2), required=True, help='本地控制 1P 还是 2P')
+    play_parser.add_argument('--relay', default='127.0.0.1:7000', help='中转地址 (主机:端口)')
+    play_parser.add_argument('--timeout', type=float, default=60, help='等待对端的秒数')
+    play_parser.add_argument('--levels', default=LEVEL_DIR, help='关卡目录 (两端必须相同)')
+
+    loopback = commands.add_parser('loopback', help='两个无窗口实例经中转对打, 检查是否同步')
+    loopback.add_argument('--frames', type=int, default=FPS * 30)
+    loopback.add_argument('--port', type=int, default=7000)
+    loopback.add_argument('--levels', default=LEVEL_DIR, help='关卡目录')
+
+    for sub in (relay, loopback):
+        sub.add_argument('--rtt', type=float, default=100, help='往返延迟 (毫秒)')
+        sub.add_argument('--jitter', type=float, default=0, help='单程随机抖动上限 (毫秒, 会造成乱序)')
+        sub.add_argument('--loss', type=float, default=0.0, help='丢包率 (0~1)')
+    for sub in (play_parser, loopback):
+        sub.add_argument('--level', type=int, default=1)
+        sub.add_argument('--seed', type=int, default=0, help='随机种子 (两端必须相同)')
+        sub.add_argument('--input-delay', type=int, default=2, help='本地按键延迟生效的帧数')
+        sub.add_argument('--max-rollback', type=int, default=8, help='最多预测/回滚的帧数')
+
+    bench = commands.add_parser('bench', help='测量回滚重新模拟的吞吐')
+    bench.add_argument('--rollback', type=int, default=8, help='每次回滚的帧数')
+    bench.add_argument('--repeats', type=int, default=300, help='回滚次数')
+    bench.add_argument('--warmup', type=int, default=120, help='计时前先推进的帧数')
+    bench.add_argument('--level', type=int, nargs='*', help='关卡 (默认全部)')
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--levels', default=LEVEL_DIR, help='关卡目录')
+    args = parser.parse_args(argv)
+    if args.command != 'relay':
+        level_count = len(list_level_files(args.levels))
+        levels = args.level if isinstance(args.level, list) else [args.level]
+        for level in levels or ():
+            if not 1 <= level <= level_count:
+                parser.error(f'--level 必须在 1 到 {level_count} 之间 ({args.levels} 中共 {level_count} 关)')
+
+    if args.command == 'relay':
+        run_relay(args.port, args.rtt, args.jitter, args.loss, host=args.host)
+    elif args.command == 'play':
+        try:
+            play(args)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == 'loopback':
+        try:
+            sessions, elapsed, common, matched = run_loopback(
+                args.frames, args.level, args.seed, args.rtt, args.jitter, args.loss, args.port,
+                args.input_delay, args.max_rollback, args.levels)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"往返延迟 {args.rtt:.0f} ms  抖动 {args.jitter:.0f} ms  丢包 {args.loss:.0%}  "
+              f"按键延迟 {args.input_delay} 帧  耗时 {elapsed:.1f} 秒")
+        for session in sessions:
+            print(session.summary())
+        synced = matched and all(session.desync_frame is None for session in sessions)
+        print(f"共比对 {len(common)} 个校验点: {'两端一致' if synced else '两端不一致'}")
+        pygame.quit()
+        sys.exit(0 if synced and common else 1)
+    else:
+        levels = args.level or range(1, len(list_level_files(args.levels)) + 1)
+        print(f"{'关卡':<6}{'快照 B':>8}{'推进 ms':>9}{'恢复 ms':>9}{'每帧 ms':>9}"
+              f"{f'回滚{args.rollback}帧 p50':>14}{'p99':>8}{'最长':>8}{'预算内帧数':>12}")
+        for level in levels:
+            r = run_bench(level, args.rollback, args.repeats, args.warmup, args.seed, args.levels)
+            print(f"{level:<6}{r['snapshot_bytes']:>8}{r['advance_ms']:>9.3f}{r['restore_ms']:>9.3f}"
+                  f"{r['resim_frame_ms']:>9.3f}{r['rollback_p50_ms']:>14.3f}{r['rollback_p99_ms']:>8.3f}"
+                  f"{r['rollback_max_ms']:>8.3f}{r['budget_frames']:>12}")
+        pygame.quit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+import time
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+import pygame
+
+from mario_game import Game, InputLog, LEVEL_DIR, SCREEN_WIDTH, SCREEN_HEIGHT, list_level_files
+
+# 强化学习接口: 在无窗口的 Game 上提供 gym 风格的 reset/step。
+#
+#   env = KittenEnv(level=1)
+#   obs, info = env.reset(seed=0)
+#   obs, reward, terminated, truncated, info = env.step(RIGHT_JUMP)
+#
+# VectorKittenEnv 把多个独立实例打包成一组接口, 在当前进程里用 Python 循环逐个推进 (不是批量计算, 吞吐与实例数成反比);
+# 要并行就用 ProcessVectorEnv, 它把实例分到多个子进程。
+
+ACTIONS = (
+    (),
+    (pygame.K_LEFT,),
+    (pygame.K_RIGHT,),
+    (pygame.K_UP,),
+    (pygame.K_LEFT, pygame.K_UP),
+    (pygame.K_RIGHT, pygame.K_UP),
+)
+NOOP, LEFT, RIGHT, JUMP, LEFT_JUMP, RIGHT_JUMP = range(len(ACTIONS))
+ACTION_NAMES = ('noop', 'left', 'right', 'jump', 'left_jump', 'right_jump')
+
+# 奖励: 分数增量 (每枚金币 10 分) 之外的额外奖励
+KEY_REWARD = 50.0
+LEVEL_REWARD = 500.0
+LIFE_REWARD = 100.0
+
+# 符号观测: 玩家状态 + 钥匙/旗帜 + 最近的若干敌人、金币、平台 (相对玩家的位置, 按屏幕尺寸归一化)
+NEAREST = 4
+PLAYER_FEATURES = 8
+STATE_SIZE = PLAYER_FEATURES + 3 + 3 + NEAREST * 3 + NEAREST * 3 + NEAREST * 5
+
+class KittenEnv:
+    def __init__(self, level=1, observation='state', frame_size=(80, 60), grayscale=False, frame_skip=1,
+                 max_steps=3000, stop_on_level_complete=True, seed=None, level_dir=LEVEL_DIR, time_step=1):
+        if observation not in ('state', 'frame'):
+            raise ValueError(f'未知的观测类型 {observation!r}, 可选: state, frame')
+        if time_step < 1:
+            raise ValueError(f'time_step 必须是正整数: {time_step}')
+        if frame_skip < 1:
+            raise ValueError(f'frame_skip 必须是正整数: {frame_skip}')
+        self.level = level
+        self.observation = observation
+        self.frame_size = frame_size
+        self.grayscale = grayscale
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.stop_on_level_complete = stop_on_level_complete
+        self.game = Game(headless=True, level_dir=level_dir, seed=seed, verbose=False)
+        # 每次 game.update 推进的帧数; 大于 1 时模拟更快, 小猫的跳跃和拾取与逐帧模拟相同 (见 Player.update)
+        self.game.time_step = time_step
+        self.steps = 0
+
+    @property
+    def action_count(self):
+        return len(ACTIONS)
+
+    @property
+    def observation_shape(self):
+        if self.observation == 'state':
+            return (STATE_SIZE,)
+        width, height = self.frame_size
+        return (height, width) if self.grayscale else (height, width, 3)
+
+    def reset(self, seed=None):
+        game = self.game
+        if seed is not None:
+            game.seed = seed
+        game.rng.seed(game.seed)
+        game.start_run(self.level)
+        self.steps = 0
+        return self.observe(), self.info(level_completed=False)
+
+    def step(self, action):
+        game = self.game
+        keys = game.input.keys
+        pressed = ACTIONS[action]
+        for key in InputLog.KEYS:
+            keys[key] = key in pressed
+
+        reward = 0.0
+        level_completed = False
+        terminated = False
+        for _ in range(self.frame_skip):
+            score, lives, keys_collected = game.score, game.player.lives, game.keys_collected
+            level_version = game.level_version
+            game.update()
+            reward += game.score - score
+            if game.level_version != level_version:
+                # 过关后会载入新关卡并换一个新的玩家, 不计算生命变化
+                level_completed = True
+                reward += LEVEL_REWARD
+            else:
+                reward += KEY_REWARD * (game.keys_collected - keys_collected)
+                reward += LIFE_REWARD * (game.player.lives - lives)
+            if game.player.lives <= 0 or game.game_state == 'game_over':
+                terminated = True
+            if level_completed and self.stop_on_level_complete:
+                terminated = True
+            if terminated:
+                break
+        self.steps += 1
+        truncated = not terminated and self.steps >= self.max_steps
+        return self.observe(), reward, terminated, truncated, self.info(level_completed)
+
+    def info(self, level_completed):
+        game = self.game
+        return {
+            'score': game.score,
+            'lives': game.player.lives,
+            'keys_collected': game.keys_collected,
+            'keys_total': game.keys_total,
+            'key_obtained': game.key_obtained,
+            'level': game.current_level,
+            'level_completed': level_completed,
+            'steps': self.steps,
+        }
+
+    def observe(self):
+        if self.observation == 'frame':
+            return self.observe_frame()
+        return self.observe_state()
+
+    def observe_frame(self):
+        game = self.game
+        game.draw()
+        frame = pygame.transform.smoothscale(game.screen, self.frame_size)
+        pixels = pygame.surfarray.array3d(frame).transpose(1, 0, 2)
+        if self.grayscale:
+            return (pixels @ np.array([0.299, 0.587, 0.114])).astype(np.uint8)
+        return pixels
+
+    def observe_state(self):
+        game = self.game
+        player = game.player
+        px, py = player.rect.center
+        state = np.zeros(STATE_SIZE, np.float32)
+        state[:PLAYER_FEATURES] = (
+            px / game.world_width,
+            py / SCREEN_HEIGHT,
+            player.vel_x / player.speed,
+            player.vel_y / 15,
+            player.on_ground,
+            player.invincible,
+            player.lives,
+            game.key_obtained,
+        )
+        offset = PLAYER_FEATURES
+        for group, count, sized in ((game.keys, 1, False), (game.flags, 1, False), (game.enemies, NEAREST, False),
+                                    (game.coins, NEAREST, False), (game.platforms, NEAREST, True)):
+            width = 5 if sized else 3
+            rects = [sprite.rect for sprite in group]
+            if rects:
+                features = np.array([(r.centerx - px, r.centery - py, r.width, r.height) for r in rects], np.float32)
+                nearest = np.argsort(np.hypot(features[:, 0], features[:, 1]), kind='stable')[:count]
+                rows = features[nearest]
+                block = np.zeros((len(rows), width), np.float32)
+                block[:, 0] = rows[:, 0] / SCREEN_WIDTH
+                block[:, 1] = rows[:, 1] / SCREEN_HEIGHT
+                block[:, 2] = 1.0
+                if sized:
+                    block[:, 3] = rows[:, 2] / SCREEN_WIDTH
+                    block[:, 4] = rows[:, 3] / SCREEN_HEIGHT
+                state[offset:offset + block.size] = block.ravel()
+            offset += count * width
+        return state
+
+    def close(self):
+        pass
+
+class VectorKittenEnv:
+    # 多个独立实例的一组接口, step 在当前进程中依次推进每个实例; 某个实例结束时自动 reset,
+    # 结束时的观测放在 info['final_observation']。第 i 个实例首局的种子是 seed + i,
+    # 之后每次自动 reset 从它自己的 SeedSequence 取一个新种子, 每局的随机数各不相同且可复现
+    def __init__(self, num_envs, seed=0, **kwargs):
+        self.envs = [KittenEnv(**kwargs) for _ in range(num_envs)]
+        self.seed = seed
+        self.seed_sequences = [np.random.SeedSequence(seed + i) for i in range(num_envs)]
+
+    @property
+    def num_envs(self):
+        return len(self.envs)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        self.seed_sequences = [np.random.SeedSequence(self.seed + i) for i in range(self.num_envs)]
+        results = [env.reset(self.seed + i) for i, env in enumerate(self.envs)]
+        return np.stack([obs for obs, _ in results]), [info for _, info in results]
+
+    def step(self, actions):
+        observations, rewards, terminated, truncated, infos = [], [], [], [], []
+        for env, sequence, action in zip(self.envs, self.seed_sequences, actions):
+            obs, reward, done, cut, info = env.step(int(action))
+            if done or cut:
+                info['final_observation'] = obs
+                obs, _ = env.reset(int(sequence.spawn(1)[0].generate_state(1)[0]))
+            observations.append(obs)
+            rewards.append(reward)
+            terminated.append(done)
+            truncated.append(cut)
+            infos.append(info)
+        return (np.stack(observations), np.array(rewards, np.float32), np.array(terminated),
+                np.array(truncated), infos)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+def worker(conn, num_envs, seed, kwargs):
+    env = VectorKittenEnv(num_envs, seed, **kwargs)
+    try:
+        while True:
+            command, payload = conn.recv()
+            if command == 'step':
+                conn.send(env.step(payload))
+            elif command == 'reset':
+                conn.send(env.reset(payload))
+            elif command == 'close':
+                break
+    finally:
+        env.close()
+        conn.close()
+        pygame.quit()
+
+class ProcessVectorEnv:
+    # 把实例平均分到多个子进程并行推进, 每个子进程内部是一个 VectorKittenEnv; 实例的种子与单进程时相同
+    def __init__(self, num_envs, num_workers=None, seed=0, **kwargs):
+        num_workers = min(num_envs, num_workers or mp.cpu_count())
+        self.sizes = [num_envs // num_workers + (i < num_envs % num_workers) for i in range(num_workers)]
+        context = mp.get_context('spawn')
+        self.conns = []
+        self.processes = []
+        first = 0
+        for size in self.sizes:
+            parent, child = context.Pipe()
+            process = context.Process(target=worker, args=(child, size, seed + first, kwargs), daemon=True)
+            process.start()
+            child.close()
+            self.conns.append(parent)
+            self.processes.append(process)
+            first += size
+        self.seed = seed
+
+    @property
+    def num_envs(self):
+        return sum(self.sizes)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        first = 0
+        for conn, size in zip(self.conns, self.sizes):
+            conn.send(('reset', None if seed is None else seed + first))
+            first += size
+        results = [conn.recv() for conn in self.conns]
+        return np.concatenate([obs for obs, _ in results]), [info for _, infos in results for info in infos]
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        first = 0
+        for conn, size in zip(self.conns, self.sizes):
+            conn.send(('step', actions[first:first + size]))
+            first += size
+        results = [conn.recv() for conn in self.conns]
+        return (np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results]),
+                np.concatenate([r[2] for r in results]), np.concatenate([r[3] for r in results]),
+                [info for r in results for info in r[4]])
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(('close', None))
+            conn.close()
+        for process in self.processes:
+            process.join()
+
+def main(argv=None):
+    # 随机策略测速: python rl_env.py --envs 16 --workers 4
+    parser = argparse.ArgumentParser(description='Super Kitten Adventure 强化学习环境测速 (随机策略)')
+    parser.add_argument('--envs', type=int, default=8, help='实例数量')
+    parser.add_argument('--workers', type=int, default=0, help='子进程数量 (0 表示在当前进程中运行)')
+    parser.add_argument('--steps', type=int, default=1000, help='每个实例的步数')
+    parser.add_argument('--observation', choices=('state', 'frame'), default='state')
+    parser.add_argument('--frame-skip', type=int, default=1)
+    parser.add_argument('--time-step', type=int, default=1, help='每次更新推进的帧数')
+    parser.add_argument('--level', type=int, default=1)
+    args = parser.parse_args(argv)
+    level_count = len(list_level_files())
+    if not 1 <= args.level <= level_count:
+        parser.error(f'--level 必须在 1 到 {level_count} 之间')
+    if args.frame_skip < 1:
+        parser.error('--frame-skip 必须是正整数')
+    if args.time_step < 1:
+        parser.error('--time-step 必须是正整数')
+
+    options = dict(level=args.level, observation=args.observation, frame_skip=args.frame_skip, time_step=args.time_step)
+    if args.workers:
+        env = ProcessVectorEnv(args.envs, args.workers, **options)
+    else:
+        env = VectorKittenEnv(args.envs, **options)
+    rng = np.random.default_rng(0)
+    env.reset(0)
+    episodes = 0
+    total_reward = 0.0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        obs, reward, terminated, truncated, _ = env.step(rng.integers(len(ACTIONS), size=env.num_envs))
+        episodes += int(terminated.sum() + truncated.sum())
+        total_reward += float(reward.sum())
+    elapsed = time.perf_counter() - start
+    env.close()
+    steps = args.steps * env.num_envs
+    print(f"{env.num_envs} 个实例 x {args.steps} 步, 观测 {obs.shape[1:]}: {steps / elapsed:.0f} 步/秒  "
+          f"结束回合 {episodes}  总奖励 {total_reward:.0f}")
+
+if __name__ == '__main__':
+    main()